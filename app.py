@@ -1,49 +1,73 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_socketio import SocketIO, emit
-import asyncio
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
+from flask_socketio import SocketIO, emit, join_room
 import json
-import threading
 import uuid
+from background_loop import background_loop
+from llm.limiter import limiter_stats
+from llm.metrics import llm_trace, registry, traced
+from llm.routing import router
 from workflow import Workflow
+from speculation import BranchSpeculator, SPECULATIVE_BRANCHES
+from opening_pool import OpeningPool
+from session_store import GameSession, get_session_store
+from story_state import chapter_fields, chapter_index, chapter_label
 import os
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-socketio = SocketIO(app, cors_allowed_origins="*")
+# 多 worker 部署时需配置消息队列（如 redis://），使任一 worker 都能向客户端推送事件
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None)
 
 # 存储游戏会话
-game_sessions = {}
+game_sessions = get_session_store()
 
-# 定义游戏阶段顺序
-GAME_STAGES = ['loading', 'choice_a', 'choice_b', 'choice_c', 'ending']
+# 进程内的推测分支，不随会话持久化
+speculators = {}
 
-def get_navigation_info(game_id, current_stage):
+# 预生成开局池
+opening_pool = OpeningPool()
+
+def game_stages(story):
+    """本局游戏的页面顺序：加载页、每章一个选择页（choice_a、choice_b……）、结局页"""
+    return ['loading', *(f'choice_{label.lower()}' for label in story.labels()), 'ending']
+
+def stage_chapter(story, stage):
+    """选择页 stage（如 'choice_b'）对应的章节名 'B'，不是本局的选择页时返回 None"""
+    label = stage.removeprefix('choice_').upper()
+    return label if stage.startswith('choice_') and label in story.labels() else None
+
+def get_game_session():
+    """返回当前请求对应的游戏会话，不存在或已过期时返回 None"""
+    game_id = session.get('game_id')
+    if not game_id:
+        return None
+    return game_sessions.get(game_id)
+
+def get_navigation_info(game_session, current_stage):
     """获取导航信息"""
-    if not game_id or game_id not in game_sessions:
+    if game_session is None:
         return {'can_go_back': False, 'can_go_forward': False, 'prev_stage': None, 'next_stage': None}
     
-    game_session = game_sessions[game_id]
-    current_index = GAME_STAGES.index(current_stage) if current_stage in GAME_STAGES else 0
+    story = game_session.story
+    stages = game_stages(story)
+    current_index = stages.index(current_stage) if current_stage in stages else 0
     
     # 检查是否可以后退（总是允许后退，除了第一个阶段）
     can_go_back = current_index > 0
-    prev_stage = GAME_STAGES[current_index - 1] if can_go_back else None
+    prev_stage = stages[current_index - 1] if can_go_back else None
     
     # 检查是否可以前进（需要有内容才能前进）
     can_go_forward = False
     next_stage = None
     
-    if current_index < len(GAME_STAGES) - 1:
-        next_stage = GAME_STAGES[current_index + 1]
-        # 根据当前阶段检查是否有必要的内容
-        if current_stage == 'loading':
-            can_go_forward = 'situation_a' in game_session['data']
-        elif current_stage == 'choice_a':
-            can_go_forward = 'situation_b' in game_session['data']
-        elif current_stage == 'choice_b':
-            can_go_forward = 'situation_c' in game_session['data'] and 'situation_c_options' in game_session['data']
-        elif current_stage == 'choice_c':
-            can_go_forward = 'ending' in game_session['data']
+    if current_index < len(stages) - 1:
+        next_stage = stages[current_index + 1]
+        # 检查下一页的内容是否已全部生成：选择页需要情景与选项，结局页需要结局
+        if next_stage == 'ending':
+            can_go_forward = story.ending is not None
+        else:
+            chapter = story.chapters[current_index]
+            can_go_forward = chapter.situation is not None and chapter.options is not None
     
     return {
         'can_go_back': can_go_back,
@@ -55,6 +79,8 @@ def get_navigation_info(game_id, current_stage):
 @app.route('/')
 def index():
     """游戏主页"""
+    # 玩家浏览主页时即开始预热开局池
+    opening_pool.start()
     return render_template('index.html')
 
 @app.route('/start_game')
@@ -62,50 +88,55 @@ def start_game():
     """开始新游戏"""
     game_id = str(uuid.uuid4())
     session['game_id'] = game_id
-    game_sessions[game_id] = {
-        'workflow': Workflow(verbose=False),
-        'stage': 'initial',
-        'data': {}
-    }
+    opening_pool.start()
+    # 优先使用开局池中已生成好的开局，加载页会直接完成
+    workflow = (opening_pool.take() or Workflow(verbose=False)).attach(game_id)
+    game_sessions.save(GameSession(game_id, workflow=workflow))
     return redirect(url_for('game_stage', stage='loading'))
 
 @app.route('/game/<stage>')
 def game_stage(stage):
     """游戏各阶段页面"""
-    game_id = session.get('game_id')
-    if not game_id or game_id not in game_sessions:
+    game_session = get_game_session()
+    if game_session is None:
         return redirect(url_for('index'))
     
-    game_session = game_sessions[game_id]
-    navigation = get_navigation_info(game_id, stage)
+    navigation = get_navigation_info(game_session, stage)
+    story = game_session.story
+    
+    label = stage_chapter(story, stage)
     
     if stage == 'loading':
         return render_template('loading.html', navigation=navigation)
-    elif stage == 'choice_a':
-        return render_template('choice.html', 
-                             stage='A',
-                             situation=game_session['data'].get('situation_a'),
-                             options=game_session['data'].get('situation_a_options'),
-                             navigation=navigation)
-    elif stage == 'choice_b':
+    elif label is not None:
+        chapter = story.chapter(label)
         return render_template('choice.html', 
-                             stage='B',
-                             situation=game_session['data'].get('situation_b'),
-                             options=game_session['data'].get('situation_b_options'),
-                             navigation=navigation)
-    elif stage == 'choice_c':
-        return render_template('choice.html', 
-                             stage='C',
-                             situation=game_session['data'].get('situation_c'),
-                             options=game_session['data'].get('situation_c_options'),
+                             stage=label,
+                             chapters=story.labels(),
+                             situation=chapter.situation,
+                             options=chapter.options,
                              navigation=navigation)
     elif stage == 'ending':
         return render_template('ending.html', 
-                             data=game_session['data'],
+                             data=story,
                              navigation=navigation)
     else:
         return redirect(url_for('index'))
 
+@socketio.on('connect')
+def handle_connect():
+    """将连接加入其游戏会话对应的房间；进度、完成、错误与流式文本等事件只发送给该局游戏"""
+    game_id = session.get('game_id')
+    if game_id:
+        join_room(game_id)
+
+def emit_story_delta(game_id):
+    """返回把流式文本增量推送到该局游戏房间的回调"""
+    def on_delta(field, text, reset=False):
+        # reset: 重试生成了不同的文本，客户端清除该字段已显示的部分后显示 delta
+        socketio.emit('story_delta', {'field': field, 'delta': text, 'reset': reset}, to=game_id)
+    return on_delta
+
 @socketio.on('start_generation')
 def handle_start_generation():
     """开始生成游戏内容"""
@@ -113,63 +144,61 @@ def handle_start_generation():
     if not game_id or game_id not in game_sessions:
         emit('error', {'message': '游戏会话不存在'})
         return
+    # 连接建立后才开始的新游戏也要加入对应的房间
+    join_room(game_id)
     
-    # 在新线程中运行异步生成
-    def run_generation():
-        asyncio.run(generate_initial_content(game_id))
-    
-    thread = threading.Thread(target=run_generation)
-    thread.start()
+    # 提交到共享的后台事件循环中异步生成
+    background_loop.submit(generate_initial_content(game_id))
 
 async def generate_initial_content(game_id):
     """生成初始游戏内容"""
-    game_session = game_sessions[game_id]
-    workflow = game_session['workflow']
+    game_session = game_sessions.get(game_id)
+    if game_session is None:
+        socketio.emit('error', {'message': '游戏会话不存在或已过期'}, to=game_id)
+        return
+    workflow = game_session.workflow
     
     try:
-        # 发送进度更新
-        socketio.emit('progress_update', {'stage': '正在生成灵魂和主题...', 'progress': 10})
-        await workflow.generate_personality_and_theme()
-        
-        socketio.emit('progress_update', {'stage': '正在生成背景故事...', 'progress': 20})
-        await workflow.generate_background()
-        
-        socketio.emit('progress_update', {'stage': '正在生成角色...', 'progress': 30})
-        await workflow.generate_character()
-        
-        socketio.emit('progress_update', {'stage': '正在生成梦境...', 'progress': 40})
-        await workflow.generate_dreams()
-        
-        socketio.emit('progress_update', {'stage': '正在生成条件...', 'progress': 50})
-        await workflow.generate_conditions()
-        
-        socketio.emit('progress_update', {'stage': '正在生成第一个情景...', 'progress': 60})
-        await workflow.generate_situation()
-        
-        socketio.emit('progress_update', {'stage': '正在生成选项...', 'progress': 80})
-        await workflow.generate_situation_options()
+        socketio.emit('progress_update', {'stage': '正在编织故事的灵魂与主题...', 'progress': 5}, to=game_id)
+
+        def on_stage_complete(stage, completed, total):
+            # 按已完成阶段数推进进度条，留出最后 10% 给收尾
+            socketio.emit('progress_update', {
+                'stage': f'{stage.label}生成完成...',
+                'progress': 5 + int(85 * completed / total),
+            }, to=game_id)
+
+        with llm_trace(game_session.trace):
+            await workflow.generate_opening(on_stage_complete=on_stage_complete)
         
-        # 更新游戏数据
-        game_session['data'].update({
-            'personality': workflow.personality,
-            'theme': workflow.theme,
-            'background': workflow.background,
-            'character': workflow.character,
-            'dream_true': workflow.dream_true,
-            'dream_fake': workflow.dream_fake,
-            'condition_true': workflow.condition_true,
-            'condition_fake': workflow.condition_fake,
-            'situation_a': workflow.situation_a,
-            'situation_a_options': workflow.situation_a_options,
-        })
+        game_session.stage = 'choice_a'
+        game_sessions.save(game_session)
         
-        game_session['stage'] = 'choice_a'
+        start_speculation(game_session, 'A')
         
-        socketio.emit('progress_update', {'stage': '生成完成！', 'progress': 100})
-        socketio.emit('generation_complete', {'redirect': '/game/choice_a'})
+        socketio.emit('progress_update', {'stage': '生成完成！', 'progress': 100}, to=game_id)
+        socketio.emit('generation_complete', {'redirect': '/game/choice_a'}, to=game_id)
         
     except Exception as e:
-        socketio.emit('error', {'message': f'生成过程中出现错误: {str(e)}'})
+        socketio.emit('error', {'message': f'生成过程中出现错误: {str(e)}'}, to=game_id)
+
+def start_speculation(game_session, stage):
+    """玩家阅读情景 stage 时，在后台预生成各选项对应的分支"""
+    if SPECULATIVE_BRANCHES <= 0:
+        return
+    
+    speculator = BranchSpeculator(game_session.workflow, stage)
+    discard_speculation(game_session.game_id)
+    speculators[game_session.game_id] = speculator
+    
+    background_loop.submit(traced(speculator.run(), game_session.trace))
+
+def discard_speculation(game_id):
+    """取消该局游戏尚未采纳的推测分支"""
+    speculator = speculators.pop(game_id, None)
+    if speculator is not None:
+        speculator.discard()
+    return speculator
 
 @app.route('/make_choice', methods=['POST'])
 def make_choice():
@@ -184,76 +213,57 @@ def make_choice():
     if not choice or not stage:
         return jsonify({'error': '无效的选择'}), 400
     
-    # 在新线程中处理选择
-    def process_choice():
-        asyncio.run(handle_choice_async(game_id, choice, stage))
-    
-    thread = threading.Thread(target=process_choice)
-    thread.start()
+    # 提交到共享的后台事件循环中处理选择
+    background_loop.submit(handle_choice_async(game_id, choice, stage))
     
     return jsonify({'status': 'processing'})
 
 async def handle_choice_async(game_id, choice, stage):
     """异步处理玩家选择"""
-    game_session = game_sessions[game_id]
-    workflow = game_session['workflow']
+    game_session = game_sessions.get(game_id)
+    if game_session is None:
+        socketio.emit('error', {'message': '游戏会话不存在或已过期'}, to=game_id)
+        return
+    workflow = game_session.workflow
     
     try:
-        if stage == 'A':
-            await workflow.make_choice_for_situation(choice)
-            await workflow.generate_situation_b()
-            await workflow.generate_situation_b_options()
-            
-            game_session['data'].update({
-                'situation_a_options_choice': workflow.situation_a_options_choice,
-                'situation_a_result': workflow.situation_a_result,
-                'situation_b': workflow.situation_b,
-                'situation_b_options': workflow.situation_b_options,
-            })
-            
-            socketio.emit('choice_processed', {'redirect': '/game/choice_b'})
-            
-        elif stage == 'B':
-            await workflow.make_choice_for_situation_b(choice)
-            await workflow.generate_situation_c()
-            await workflow.generate_situation_c_options()
-            
-            game_session['data'].update({
-                'situation_b_options_choice': workflow.situation_b_options_choice,
-                'situation_b_result': workflow.situation_b_result,
-                'situation_c': workflow.situation_c,
-                'situation_c_options': workflow.situation_c_options,
-            })
-            
-            socketio.emit('choice_processed', {'redirect': '/game/choice_c'})
-            
-        elif stage == 'C':
-            await workflow.make_choice_for_situation_c(choice)
-            await workflow.generate_ending()
-            
-            game_session['data'].update({
-                'situation_c_options_choice': workflow.situation_c_options_choice,
-                'situation_c_result': workflow.situation_c_result,
-                'ending': workflow.ending,
-            })
+        # 优先采纳推测生成的分支，未命中时再常规生成
+        speculator = speculators.pop(game_id, None)
+        if speculator is not None and speculator.stage == stage and await speculator.commit(workflow, choice):
+            print(f"情景 {stage} 命中推测分支: {choice}")
+        else:
+            if speculator is not None:
+                speculator.discard()
+            with llm_trace(game_session.trace):
+                await workflow.advance(stage, choice, on_delta=emit_story_delta(game_id))
+        
+        game_sessions.save(game_session)
+        
+        # 还有下一章时预生成它的分支并跳转到它的选择页，最后一章之后跳转到结局
+        index = chapter_index(stage)
+        if index + 1 < len(game_session.story.chapters):
+            next_stage = chapter_label(index + 1)
+            start_speculation(game_session, next_stage)
             
-            socketio.emit('choice_processed', {'redirect': '/game/ending'})
+            socketio.emit('choice_processed', {'redirect': f'/game/choice_{next_stage.lower()}'}, to=game_id)
+        else:
+            socketio.emit('choice_processed', {'redirect': '/game/ending'}, to=game_id)
             
     except Exception as e:
-        socketio.emit('error', {'message': f'处理选择时出现错误: {str(e)}'})
+        socketio.emit('error', {'message': f'处理选择时出现错误: {str(e)}'}, to=game_id)
 
 @app.route('/navigate/<direction>')
 def navigate(direction):
     """处理前进后退导航"""
-    game_id = session.get('game_id')
-    if not game_id or game_id not in game_sessions:
+    game_session = get_game_session()
+    if game_session is None:
         return redirect(url_for('index'))
     
     current_stage = request.args.get('current_stage')
     if not current_stage:
         return redirect(url_for('index'))
     
-    navigation = get_navigation_info(game_id, current_stage)
+    navigation = get_navigation_info(game_session, current_stage)
     
     if direction == 'back' and navigation['can_go_back']:
         return redirect(url_for('game_stage', stage=navigation['prev_stage']) + '?navigated=true')
@@ -266,78 +276,113 @@ def navigate(direction):
 @app.route('/debug_session')
 def debug_session():
     """调试路由：查看当前游戏会话数据"""
-    game_id = session.get('game_id')
-    if not game_id or game_id not in game_sessions:
+    game_session = get_game_session()
+    if game_session is None:
         return jsonify({'error': '游戏会话不存在'})
     
-    game_session = game_sessions[game_id]
+    story = game_session.story
+    last = story.chapters[-1]
+    return jsonify({
+        'game_id': game_session.game_id,
+        'stage': game_session.stage,
+        'data_keys': [field for field, value in story.to_dict().items() if value is not None],
+        # 最后一章（默认为第 C 章）的情景与选项
+        'last_chapter': story.labels()[-1],
+        'has_last_situation': last.situation is not None,
+        'has_last_situation_options': last.options is not None,
+        'last_situation_content': last.situation or 'NOT_FOUND',
+        'last_situation_options': last.options or 'NOT_FOUND',
+        'llm_trace': game_session.trace,
+        'llm_wall_total': sum(call['wall'] for call in game_session.trace if not call['background']),
+        'llm_cost_total': sum(call['cost'] for call in game_session.trace),
+        # 输入 token 中命中服务端提示词缓存的比例
+        'llm_cached_ratio': (
+            sum(call['cached_tokens'] for call in game_session.trace)
+            / max(1, sum(call['prompt_tokens'] for call in game_session.trace))
+        ),
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 格式的 LLM 调用指标"""
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug_limiter')
+def debug_limiter():
+    """调试路由：查看各模型 LLM 调用的排队深度与等待时间"""
     return jsonify({
-        'game_id': game_id,
-        'stage': game_session['stage'],
-        'data_keys': list(game_session['data'].keys()),
-        'has_situation_c': 'situation_c' in game_session['data'],
-        'has_situation_c_options': 'situation_c_options' in game_session['data'],
-        'situation_c_content': game_session['data'].get('situation_c', 'NOT_FOUND'),
-        'situation_c_options': game_session['data'].get('situation_c_options', 'NOT_FOUND')
+        'models': limiter_stats(),
+        'background_loop': {
+            'pending': background_loop.pending,
+            'running': background_loop.running,
+        },
+    })
+
+@app.route('/debug_routes')
+def debug_routes():
+    """调试路由：查看按阶段的模型路由表，以及各路由的调用、降级、回退与耗时统计"""
+    return jsonify({
+        'routes': router.table(),
+        'stats': router.stats(),
     })
 
 @app.route('/force_generate_options/<stage>')
 def force_generate_options(stage):
     """强制生成指定阶段的选项"""
-    game_id = session.get('game_id')
-    if not game_id or game_id not in game_sessions:
+    game_session = get_game_session()
+    if game_session is None:
         return jsonify({'error': '游戏会话不存在'}), 400
     
-    game_session = game_sessions[game_id]
-    workflow = game_session['workflow']
-    
     try:
-        if stage == 'C':
-            # 对于第C章，我们需要确保有前面的数据
-            if 'situation_b_result' not in game_session['data']:
-                return jsonify({'error': '缺少第B章的选择结果，无法生成第C章选项'}), 400
-            
-            # 在新线程中生成
-            def run_generation():
-                asyncio.run(generate_stage_c_options(game_id))
-            
-            thread = threading.Thread(target=run_generation)
-            thread.start()
-            
-            return jsonify({'status': 'generating'})
-        else:
+        story = game_session.story
+        # 第一章的选项属于开局；之后的章节需要确保有上一章的选择结果
+        if stage not in story.labels()[1:]:
             return jsonify({'error': '不支持的阶段'}), 400
+        index = chapter_index(stage)
+        if story.chapters[index - 1].result is None:
+            return jsonify({'error': f'缺少第{chapter_label(index - 1)}章的选择结果，无法生成第{stage}章选项'}), 400
+        
+        # 提交到共享的后台事件循环中生成
+        background_loop.submit(generate_stage_options(game_session.game_id, stage))
+        
+        return jsonify({'status': 'generating'})
     except Exception as e:
         return jsonify({'error': f'生成失败: {str(e)}'}), 500
 
-async def generate_stage_c_options(game_id):
-    """生成第C章的选项"""
-    game_session = game_sessions[game_id]
-    workflow = game_session['workflow']
+async def generate_stage_options(game_id, stage):
+    """生成第 stage 章的情景（尚未生成时）与选项"""
+    game_session = game_sessions.get(game_id)
+    if game_session is None:
+        socketio.emit('error', {'message': '游戏会话不存在或已过期'}, to=game_id)
+        return
+    workflow = game_session.workflow
     
     try:
-        # 确保有第C章的情景
-        if 'situation_c' not in game_session['data']:
-            await workflow.generate_situation_c()
-            
-        await workflow.generate_situation_c_options()
+        index = chapter_index(stage)
+        situation_field, options_field = chapter_fields(index)[:2]
+        with llm_trace(game_session.trace):
+            # 确保有该章的情景
+            if workflow.state.chapters[index].situation is None:
+                await workflow.generate_situation(index)
+                workflow.checkpoint(situation_field)
+                
+            await workflow.generate_situation_options(index)
+            workflow.checkpoint(options_field)
         
-        game_session['data'].update({
-            'situation_c': workflow.situation_c,
-            'situation_c_options': workflow.situation_c_options,
-        })
+        game_sessions.save(game_session)
         
-        socketio.emit('options_generated', {'stage': 'C', 'redirect': '/game/choice_c'})
+        socketio.emit('options_generated', {'stage': stage, 'redirect': f'/game/choice_{stage.lower()}'}, to=game_id)
         
     except Exception as e:
-        socketio.emit('error', {'message': f'生成第C章选项时出现错误: {str(e)}'})
+        socketio.emit('error', {'message': f'生成第{stage}章选项时出现错误: {str(e)}'}, to=game_id)
 
 @app.route('/restart')
 def restart_game():
     """重新开始游戏"""
     game_id = session.get('game_id')
-    if game_id and game_id in game_sessions:
-        del game_sessions[game_id]
+    if game_id:
+        discard_speculation(game_id)
+        game_sessions.delete(game_id)
     session.pop('game_id', None)
     return redirect(url_for('index'))
 
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+
+import llm  # noqa: F401  加载 .env 中的配置
+
+
+# --- Configuration Constants ---
+# 同时执行的生成任务上限，超出的任务排队等待
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", 64))
+
+
+class BackgroundLoop:
+    """运行在独立守护线程中的常驻事件循环
+
+    Web 请求线程通过 submit() 把生成协程提交到这里执行，所有游戏共享同一个事件循环
+    （以及其上的 HTTP 连接池），而不是每个操作新建线程和事件循环。
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_GENERATIONS):
+        self.max_concurrency = max_concurrency
+        self.pending = 0
+        self.running = 0
+
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def start(self):
+        """启动事件循环线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._thread = threading.Thread(target=self._run_forever, name='background-loop', daemon=True)
+            self._thread.start()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coro, bounded: bool = True):
+        """提交协程，返回 concurrent.futures.Future
+
+        bounded 为 True 时受 max_concurrency 限制；常驻的后台任务（如开局池生产者）应传 False。
+        """
+        self.start()
+        if bounded:
+            coro = self._bounded(coro)
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        future.add_done_callback(self._report_exception)
+        return future
+
+    async def _bounded(self, coro):
+        self.pending += 1
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            # 排队期间被取消，协程从未开始执行
+            coro.close()
+            raise
+        finally:
+            self.pending -= 1
+
+        self.running += 1
+        try:
+            return await coro
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    @staticmethod
+    def _report_exception(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"后台任务出错: {future.exception()!r}")
+
+    def stop(self):
+        """停止事件循环"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+
+# 进程内共享的后台事件循环
+background_loop = BackgroundLoop()
@@ -0,0 +1,201 @@
+"""批量生成完整的游戏流程，用于离线构建内容池、评测集和缓存
+
+每局游戏按 --seed 与序号确定选择路径，结果写入 gzip 压缩的 JSONL：
+
+    python batch_generate.py --count 1000 --concurrency 32 --output-dir data/batch
+
+- 并发: 单个进程内最多同时进行 --concurrency 局，LLM 调用仍受准入控制（LLM_RPM / LLM_TPM 等）约束
+- 分片: --shards N --shard K 只生成序号 i % N == K 的局，可在多个进程/机器上分别运行；
+        --processes P 会在本机启动 P 个子进程分别处理 P 个分片
+- 续跑: 每次运行写入新的分片文件，启动时跳过输出目录中已完成的序号，中断后重新运行同一命令即可继续
+- 统计: 每次运行结束时写入同名的 .stats.json（完成数、耗时分位数、token 用量与费用、各阶段指标）
+- 章节: --chapters N 生成 N 章的故事（默认 3 章，最多 26 章）
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import zlib
+
+
+CHOICES = ['CHOICE_A', 'CHOICE_B', 'CHOICE_C']
+
+
+def shard_prefix(output_dir: str, shard: int, shards: int) -> str:
+    return os.path.join(output_dir, f'stories-{shard:03d}-of-{shards:03d}')
+
+
+def read_records(path: str):
+    """逐行读取 gzip JSONL；文件在写入途中被中断时，返回截断之前的完整记录"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+    except (EOFError, gzip.BadGzipFile, zlib.error):
+        return
+
+
+def completed_ids(output_dir: str, shard: int, shards: int) -> set:
+    ids = set()
+    for path in glob.glob(shard_prefix(output_dir, shard, shards) + '.*.jsonl.gz'):
+        ids.update(record['id'] for record in read_records(path))
+    return ids
+
+
+def choice_path(seed: int, index: int, chapters: int = 3) -> list:
+    rng = random.Random(f'{seed}:{index}')
+    return [rng.choice(CHOICES) for _ in range(chapters)]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+async def play_one(index: int, choices: list) -> dict:
+    """完整生成一局游戏，返回输出记录"""
+    from llm.metrics import llm_trace
+    from workflow import Workflow
+
+    trace = []
+    started = time.perf_counter()
+    with llm_trace(trace):
+        workflow = Workflow(chapters=len(choices))
+        await workflow.generate_opening()
+        for stage, choice in zip(workflow.state.labels(), choices):
+            await workflow.advance(stage, choice)
+    return {
+        'id': index,
+        'choices': choices,
+        'story': workflow.get_all_data(),
+        'wall': round(time.perf_counter() - started, 3),
+        'llm_calls': len(trace),
+        'prompt_tokens': sum(call['prompt_tokens'] for call in trace),
+        'completion_tokens': sum(call['completion_tokens'] for call in trace),
+        'cost': round(sum(call['cost'] for call in trace), 6),
+    }
+
+
+async def run_shard(args) -> dict:
+    from llm.metrics import registry
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    prefix = shard_prefix(args.output_dir, args.shard, args.shards)
+    done = completed_ids(args.output_dir, args.shard, args.shards)
+    todo = [i for i in range(args.count) if i % args.shards == args.shard and i not in done]
+    part = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    output_path = f'{prefix}.{part}.jsonl.gz'
+    print(f'分片 {args.shard}/{args.shards}: 共 {len(todo) + len(done)} 局，已完成 {len(done)}，本次生成 {len(todo)} → {output_path}',
+          file=sys.stderr)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    walls = []
+    errors = {}
+    started = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        out = stack.enter_context(gzip.open(output_path, 'wb'))
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+        async def worker(index):
+            async with semaphore:
+                try:
+                    record = await play_one(index, choice_path(args.seed, index, args.chapters))
+                except Exception as e:
+                    errors[index] = f'{type(e).__name__}: {e}'
+                    print(f'第 {index} 局生成失败: {errors[index]}', file=sys.stderr)
+                    return
+            out.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            # 每条记录后同步刷新，进程中断时已写入的记录仍可读取
+            out.flush(zlib.Z_SYNC_FLUSH)
+            walls.append(record['wall'])
+            if len(walls) % args.progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f'已完成 {len(walls)}/{len(todo)} 局, {len(walls) / elapsed:.2f} 局/秒', file=sys.stderr)
+
+        await asyncio.gather(*(worker(index) for index in todo))
+
+    if not walls:
+        os.remove(output_path)
+    elapsed = time.perf_counter() - started
+    summary = registry.summary()
+    stats = {
+        'shard': args.shard,
+        'shards': args.shards,
+        'output': output_path if walls else None,
+        'seed': args.seed,
+        'chapters': args.chapters,
+        'concurrency': args.concurrency,
+        'skipped': len(done),
+        'completed': len(walls),
+        'failed': len(errors),
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'games_per_second': round(len(walls) / elapsed, 3) if elapsed else None,
+        'game_wall': {f'p{p}': percentile(walls, p) for p in (50, 90, 99)},
+        'llm_calls': sum(row['calls'] for row in summary),
+        'prompt_tokens': sum(row['prompt_tokens'] for row in summary),
+        'completion_tokens': sum(row['completion_tokens'] for row in summary),
+        'cached_tokens': sum(row['cached_tokens'] for row in summary),
+        'cost': round(sum(row['cost'] for row in summary), 6),
+        'stages': summary,
+    }
+    with open(f'{prefix}.{part}.stats.json', 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
+
+
+def spawn_shards(args) -> int:
+    """在本机启动 --processes 个子进程，每个处理一个分片"""
+    commands = []
+    for shard in range(args.processes):
+        commands.append([
+            sys.executable, os.path.abspath(__file__),
+            '--count', str(args.count), '--concurrency', str(args.concurrency),
+            '--output-dir', args.output_dir, '--seed', str(args.seed), '--chapters', str(args.chapters),
+            '--shards', str(args.processes), '--shard', str(shard),
+            '--progress-every', str(args.progress_every),
+        ] + (['--verbose'] if args.verbose else []))
+    processes = [subprocess.Popen(command) for command in commands]
+    return max(process.wait() for process in processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量生成完整的游戏流程，输出 gzip 压缩的 JSONL')
+    parser.add_argument('--count', type=int, required=True, help='总局数（所有分片合计）')
+    parser.add_argument('--concurrency', type=int, default=16, help='单个进程内同时生成的局数')
+    parser.add_argument('--output-dir', default='data/batch', help='输出目录')
+    parser.add_argument('--seed', type=int, default=0, help='选择路径的随机种子')
+    parser.add_argument('--chapters', type=int, default=3, help='每局故事的章节数')
+    parser.add_argument('--shards', type=int, default=1, help='分片总数')
+    parser.add_argument('--shard', type=int, default=0, help='本进程处理的分片序号')
+    parser.add_argument('--processes', type=int, help='在本机启动多少个子进程（每个一个分片），覆盖 --shards/--shard')
+    parser.add_argument('--progress-every', type=int, default=10, help='每完成多少局打印一次进度')
+    parser.add_argument('--verbose', action='store_true', help='输出 Workflow 的生成日志')
+    args = parser.parse_args()
+
+    if args.processes:
+        sys.exit(spawn_shards(args))
+    if not 0 <= args.shard < args.shards:
+        parser.error('--shard 必须在 [0, --shards) 范围内')
+
+    stats = asyncio.run(run_shard(args))
+    print(json.dumps({k: v for k, v in stats.items() if k not in ('stages', 'errors')}, ensure_ascii=False, indent=2))
+    sys.exit(1 if stats['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
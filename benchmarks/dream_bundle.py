@@ -0,0 +1,154 @@
+"""愿望与条件生成基准：四次调用 vs DreamBundleLLM 一次调用
+
+每一轮先生成一份开局（灵魂、主题、背景、角色），再在它的两个分支上分别执行
+现有的四次调用（DreamLLM ×2 + ConditionLLM ×2，按依赖图并发）与一次 DreamBundleLLM 调用，
+比较端到端耗时、token 用量与费用，以及输出是否符合 schema（四个字段均为非空文本，不需要因解析失败而重试）。
+报告中的 critical_path 是依赖图上必须串行执行的阶段链，决定了并发执行时的最短耗时。
+默认使用离线的假模型；真实的延迟与质量对比需要 --backend openai：
+
+    python benchmarks/dream_bundle.py --rounds 10 --backend openai
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DREAM_FIELDS = ('dream_true', 'dream_fake', 'condition_true', 'condition_fake')
+
+PATHS = ('split', 'bundle')
+
+# 各方式调用的阶段（stage_name），用于从路由统计中取输出不符合 schema 的次数
+PATH_STAGES = {
+    'split': ('DreamTrue', 'DreamFake', 'ConditionTrue', 'ConditionFake'),
+    'bundle': ('DreamBundle',),
+}
+
+
+async def run_path(workflow, path: str) -> dict:
+    """在 workflow 上执行一种生成方式，返回耗时、调用记录与输出是否有效"""
+    from llm.metrics import llm_trace
+    from scheduler import StageScheduler
+    from workflow import DREAM_STAGES
+
+    trace = []
+    error = None
+    started = time.perf_counter()
+    try:
+        with llm_trace(trace):
+            if path == 'split':
+                await StageScheduler(DREAM_STAGES).run(workflow)
+            else:
+                await workflow.generate_dream_bundle()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    elapsed = time.perf_counter() - started
+
+    values = [workflow.state.get(field) for field in DREAM_FIELDS]
+    return {
+        'elapsed': elapsed,
+        'calls': len(trace),
+        'prompt_tokens': sum(call['prompt_tokens'] for call in trace),
+        'completion_tokens': sum(call['completion_tokens'] for call in trace),
+        'cost': sum(call['cost'] for call in trace),
+        'retries': sum(call['retries'] for call in trace),
+        'valid': error is None and all(isinstance(value, str) and value.strip() for value in values),
+        'error': error,
+    }
+
+
+def critical_paths() -> dict:
+    """各方式依赖图上的关键路径（串行执行的阶段名）"""
+    from scheduler import StageScheduler
+    from workflow import DREAM_BUNDLE_STAGES, DREAM_STAGES
+
+    stages = {'split': DREAM_STAGES, 'bundle': DREAM_BUNDLE_STAGES}
+    return {path: [stage.name for stage in StageScheduler(stages[path]).critical_path()] for path in PATHS}
+
+
+async def run(rounds: int) -> dict:
+    from llm.routing import router
+    from workflow import Workflow
+
+    results = {path: [] for path in PATHS}
+    for round_index in range(rounds):
+        opening = Workflow()
+        await opening.generate_personality_and_theme()
+        await opening.generate_background()
+        await opening.generate_character()
+        # 交替执行顺序，避免总是先执行的一方独占预热的连接
+        order = PATHS if round_index % 2 == 0 else tuple(reversed(PATHS))
+        for path in order:
+            results[path].append(await run_path(opening.fork(), path))
+        print(f"第 {round_index + 1}/{rounds} 轮: " + ', '.join(
+            f"{path} {results[path][-1]['elapsed']:.2f}s" for path in PATHS))
+
+    invalid = {path: 0 for path in PATHS}
+    for row in router.stats():
+        for path, stages in PATH_STAGES.items():
+            if row['stage'] in stages:
+                invalid[path] += row['invalid']
+
+    paths = critical_paths()
+    report = {'rounds': rounds, 'paths': {}}
+    for path, runs in results.items():
+        elapsed = [run['elapsed'] for run in runs]
+        report['paths'][path] = {
+            'latency_p50': round(statistics.median(elapsed), 3),
+            'latency_mean': round(statistics.mean(elapsed), 3),
+            'latency_max': round(max(elapsed), 3),
+            'calls': statistics.mean(run['calls'] for run in runs),
+            'critical_path': paths[path],
+            'prompt_tokens': round(statistics.mean(run['prompt_tokens'] for run in runs)),
+            'completion_tokens': round(statistics.mean(run['completion_tokens'] for run in runs)),
+            'cost': round(statistics.mean(run['cost'] for run in runs), 6),
+            'valid_rate': round(sum(run['valid'] for run in runs) / len(runs), 3),
+            'retries': sum(run['retries'] for run in runs),
+            # 输出不符合 schema（解析失败后重试）的请求数
+            'invalid_outputs': invalid[path],
+            'errors': sorted({run['error'] for run in runs if run['error']}),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['rounds']} 轮（每轮的两种方式使用同一份开局）")
+    columns = ('latency_p50', 'latency_mean', 'calls', 'prompt_tokens', 'completion_tokens', 'cost', 'valid_rate', 'invalid_outputs')
+    print(f"{'':<8}" + ''.join(f"{column:>18}" for column in columns))
+    for path, row in report['paths'].items():
+        print(f"{path:<8}" + ''.join(f"{str(row[column]):>18}" for column in columns))
+        print(f"  关键路径: {' → '.join(row['critical_path'])}")
+        for error in row['errors']:
+            print(f"  错误: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较四次调用与 DreamBundleLLM 一次调用生成愿望与条件')
+    parser.add_argument('--rounds', type=int, default=10, help='轮数')
+    parser.add_argument('--backend', default='mock', choices=['mock', 'openai'], help='模型后端')
+    parser.add_argument('--latency', type=float, help='假模型单次调用的中位耗时（秒），覆盖 MOCK_LLM_LATENCY')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    # 配置在模块导入时读取，需在导入 workflow 之前设置；关闭响应缓存与检查点，每次都真实调用
+    os.environ['LLM_BACKEND'] = args.backend
+    os.environ['LLM_CACHE'] = ''
+    os.environ['CHECKPOINT_STORE'] = 'none'
+    if args.latency is not None:
+        os.environ['MOCK_LLM_LATENCY'] = str(args.latency)
+    if args.backend == 'mock':
+        os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+    report = asyncio.run(run(args.rounds))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""冷启动导入耗时基准
+
+在全新的子进程中反复导入指定模块（默认 app，即 Web 服务启动时的导入），
+统计导入耗时的中位数与最小值，并用 python -X importtime 列出累计耗时最多的模块；
+--workflow 时额外统计创建 Workflow 的耗时，以及首次构造全部阶段 LLM（按需导入各 LLM 模块与 LangChain）的耗时：
+
+    python benchmarks/import_time.py --module app --repeat 5 --workflow
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = """
+import json
+import time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter() - started
+created = built = None
+if {workflow}:
+    from workflow import SharedLLM, Workflow
+    started = time.perf_counter()
+    workflow = Workflow()
+    created = time.perf_counter() - started
+    started = time.perf_counter()
+    for name, value in vars(Workflow).items():
+        if isinstance(value, SharedLLM):
+            getattr(workflow, name)
+    built = time.perf_counter() - started
+print(json.dumps([imported, created, built]))
+"""
+
+
+def measure(module: str, workflow: bool, importtime: bool = False):
+    """在新进程中导入一次，返回 (导入耗时, 创建 Workflow 耗时, 构造阶段 LLM 耗时, importtime 输出)"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', SNIPPET.format(module=module, workflow=workflow)]
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'import-time'))
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    imported, created, built = json.loads(result.stdout.strip().splitlines()[-1])
+    return imported, created, built, result.stderr
+
+
+def slowest_modules(importtime_output: str, top: int) -> list:
+    """解析 -X importtime 输出，返回累计耗时最多的导入"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # import time: self [us] | cumulative | imported package
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计冷启动导入耗时')
+    parser.add_argument('--module', default='app', help='要导入的模块')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（每次一个新进程）')
+    parser.add_argument('--top', type=int, default=15, help='列出累计耗时最多的模块数')
+    parser.add_argument('--workflow', action='store_true', help='同时统计创建 Workflow 与首次构造阶段 LLM 的耗时')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    # 第一次运行预热 .pyc，不计入统计
+    measure(args.module, args.workflow)
+    runs = [measure(args.module, args.workflow) for _ in range(args.repeat)]
+    imported = [run[0] for run in runs]
+    created = [run[1] for run in runs if run[1] is not None]
+    built = [run[2] for run in runs if run[2] is not None]
+    report = {
+        'module': args.module,
+        'repeat': args.repeat,
+        'import_median': round(statistics.median(imported), 4),
+        'import_min': round(min(imported), 4),
+        'workflow_median': round(statistics.median(created), 6) if created else None,
+        'stage_llms_median': round(statistics.median(built), 4) if built else None,
+        'slowest': slowest_modules(measure(args.module, False, importtime=True)[3], args.top),
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"import {report['module']}: 中位数 {report['import_median']}s, 最小 {report['import_min']}s ({args.repeat} 次)")
+    if report['workflow_median'] is not None:
+        print(f"创建 Workflow: 中位数 {report['workflow_median']}s")
+        print(f"首次构造全部阶段 LLM: 中位数 {report['stage_llms_median']}s")
+    print(f"\n{'累计耗时最多的导入':<50}{'ms':>10}")
+    for row in report['slowest']:
+        print(f"{row['module']:<50}{row['cumulative_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""梦境之旅压测脚本
+
+在进程内用 Flask / Socket.IO 测试客户端模拟 N 个玩家，完整走一遍
+/start_game → start_generation → /make_choice ×3，统计吞吐量与各步骤的延迟分位数。
+默认使用离线的假模型（LLM_BACKEND=mock），不需要 API Key：
+
+    python benchmarks/load_test.py --players 50 --concurrency 20 --latency 1.0
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+STEPS = [
+    # (步骤名, 完成事件, 完成后会话中应出现的数据)
+    ('opening', 'generation_complete', 'situation_a_options'),
+    ('choice_a', 'choice_processed', 'situation_b_options'),
+    ('choice_b', 'choice_processed', 'situation_c_options'),
+    ('choice_c', 'choice_processed', 'ending'),
+]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Player:
+    """一个模拟玩家，依次完成开局和三次选择并记录每一步的耗时"""
+
+    def __init__(self, app_module, timeout: float):
+        self.app_module = app_module
+        self.timeout = timeout
+        self.timings = {}
+        self.error = None
+
+        self.client = app_module.app.test_client()
+        self.socket = None
+
+    def wait_for(self, event: str, data_key: str):
+        """等待本局的完成事件（事件按游戏房间定向发送），并核对会话数据确认生成结果已保存"""
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            for message in self.socket.get_received():
+                if message['name'] == 'error':
+                    raise RuntimeError(message['args'][0].get('message'))
+                if message['name'] == event and data_key in self.client.get('/debug_session').get_json()['data_keys']:
+                    return
+            time.sleep(0.005)
+        raise TimeoutError(f'等待 {event} 超时')
+
+    def play(self):
+        try:
+            started = time.perf_counter()
+            self.client.get('/start_game')
+            self.socket = self.app_module.socketio.test_client(self.app_module.app, flask_test_client=self.client)
+
+            for step, event, data_key in STEPS:
+                step_started = time.perf_counter()
+                if step == 'opening':
+                    self.socket.emit('start_generation')
+                else:
+                    stage = step[-1].upper()
+                    choice = f'CHOICE_{random.choice("ABC")}'
+                    self.client.post('/make_choice', json={'choice': choice, 'stage': stage})
+                self.wait_for(event, data_key)
+                self.timings[step] = time.perf_counter() - step_started
+
+            self.timings['game'] = time.perf_counter() - started
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+        finally:
+            if self.socket is not None:
+                self.socket.disconnect()
+
+
+def run(players: int, concurrency: int, ramp: float, timeout: float):
+    import app as app_module
+    from llm.metrics import registry
+
+    semaphore = threading.Semaphore(concurrency)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        with semaphore:
+            player = Player(app_module, timeout)
+            player.play()
+        with lock:
+            results.append(player)
+
+    started = time.perf_counter()
+    threads = []
+    for i in range(players):
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp:
+            time.sleep(ramp / players)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    completed = [player for player in results if player.error is None]
+    summary = registry.summary()
+    prompt_tokens = sum(row['prompt_tokens'] for row in summary)
+    report = {
+        'players': players,
+        'concurrency': concurrency,
+        'completed': len(completed),
+        'failed': len(results) - len(completed),
+        'errors': sorted({player.error for player in results if player.error}),
+        'elapsed': round(elapsed, 3),
+        'games_per_second': round(len(completed) / elapsed, 3) if elapsed else None,
+        'llm_calls_per_second': round(sum(row['calls'] for row in summary) / elapsed, 3) if elapsed else None,
+        # 输入 token 中命中服务端提示词缓存的比例
+        'cached_ratio': round(sum(row['cached_tokens'] for row in summary) / prompt_tokens, 3) if prompt_tokens else None,
+        'latency': {},
+        'stages': summary[:5],
+    }
+    for step in [step for step, _, _ in STEPS] + ['game']:
+        values = [player.timings[step] for player in completed if step in player.timings]
+        report['latency'][step] = {
+            f'p{p}': round(percentile(values, p), 3) if values else None for p in (50, 90, 99)
+        }
+        report['latency'][step]['max'] = round(max(values), 3) if values else None
+    return report
+
+
+def print_report(report):
+    print(f"\n玩家: {report['players']}  并发: {report['concurrency']}  "
+          f"完成: {report['completed']}  失败: {report['failed']}  耗时: {report['elapsed']}s")
+    print(f"吞吐量: {report['games_per_second']} 局/秒, {report['llm_calls_per_second']} 次 LLM 调用/秒")
+    print(f"提示词缓存命中率: {report['cached_ratio']}")
+    for error in report['errors']:
+        print(f"  错误: {error}")
+
+    print(f"\n{'步骤':<10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for step, latency in report['latency'].items():
+        print(f"{step:<10}" + ''.join(f"{str(latency[key]):>10}" for key in ('p50', 'p90', 'p99', 'max')))
+
+    print(f"\n{'总耗时最多的阶段':<20}{'调用':>8}{'平均耗时':>10}{'总耗时':>10}")
+    for row in report['stages']:
+        print(f"{row['stage']:<20}{row['calls']:>8}{row['wall_avg']:>10.3f}{row['wall_total']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟多个玩家并发游玩，统计吞吐量与延迟分位数')
+    parser.add_argument('--players', type=int, default=20, help='模拟玩家总数')
+    parser.add_argument('--concurrency', type=int, default=10, help='同时在玩的玩家数')
+    parser.add_argument('--ramp', type=float, default=0.0, help='在多少秒内逐步启动全部玩家')
+    parser.add_argument('--timeout', type=float, default=120.0, help='单个步骤的超时时间（秒）')
+    parser.add_argument('--backend', default='mock', choices=['mock', 'openai'], help='模型后端')
+    parser.add_argument('--latency', type=float, help='假模型单次调用的中位耗时（秒），覆盖 MOCK_LLM_LATENCY')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    # 配置在模块导入时读取，需在导入 app 之前设置
+    os.environ['LLM_BACKEND'] = args.backend
+    if args.latency is not None:
+        os.environ['MOCK_LLM_LATENCY'] = str(args.latency)
+    if args.backend == 'mock':
+        os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+    report = run(args.players, args.concurrency, args.ramp, args.timeout)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Socket.IO 事件扇出基准
+
+在进程内用 Flask / Socket.IO 测试客户端模拟 N 个同时在线的玩家，每人完整生成一次开局
+（假模型，不需要 API Key），统计服务端发出的事件数与各客户端实际收到的事件数：
+
+- 按游戏房间定向发送时，每个事件只送达该局的客户端，送达总数 ≈ 发出总数（O(玩家数)）；
+- --broadcast 模拟旧的广播行为（忽略 to=game_id），每个事件送达所有客户端（O(玩家数²)）。
+
+    python benchmarks/socket_fanout.py --players 50
+    python benchmarks/socket_fanout.py --players 50 --broadcast
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 玩家的开局完成事件
+DONE_EVENTS = ('generation_complete', 'error')
+
+
+def run(players: int, broadcast: bool, timeout: float) -> dict:
+    import app as app_module
+
+    emitted = Counter()
+    lock = threading.Lock()
+    emit = app_module.socketio.emit
+
+    def counting_emit(event, *args, **kwargs):
+        with lock:
+            emitted[event] += 1
+        if broadcast:
+            kwargs.pop('to', None)
+            kwargs.pop('room', None)
+        return emit(event, *args, **kwargs)
+
+    app_module.socketio.emit = counting_emit
+
+    clients = []
+    for _ in range(players):
+        client = app_module.app.test_client()
+        client.get('/start_game')
+        clients.append((client, app_module.socketio.test_client(app_module.app, flask_test_client=client)))
+
+    started = time.perf_counter()
+    for _, socket in clients:
+        socket.emit('start_generation')
+
+    # 各客户端收到的事件；每人收到自己的完成事件后结束
+    received = [Counter() for _ in clients]
+    sizes = [0] * len(clients)
+    done = [False] * len(clients)
+    deadline = time.perf_counter() + timeout
+    while not all(done) and time.perf_counter() < deadline:
+        for i, (_, socket) in enumerate(clients):
+            for message in socket.get_received():
+                received[i][message['name']] += 1
+                sizes[i] += len(json.dumps(message['args'], ensure_ascii=False).encode('utf-8'))
+                if message['name'] in DONE_EVENTS:
+                    done[i] = True
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+
+    # 广播时他人的完成事件也会让 done 提前成立，最后再收取一次剩余事件
+    time.sleep(0.2)
+    for i, (_, socket) in enumerate(clients):
+        for message in socket.get_received():
+            received[i][message['name']] += 1
+            sizes[i] += len(json.dumps(message['args'], ensure_ascii=False).encode('utf-8'))
+    for _, socket in clients:
+        socket.disconnect()
+    app_module.socketio.emit = emit
+
+    delivered = sum(sum(counter.values()) for counter in received)
+    total_emitted = sum(emitted.values())
+    return {
+        'players': players,
+        'broadcast': broadcast,
+        'elapsed': round(elapsed, 3),
+        'completed': sum(done),
+        'emitted': total_emitted,
+        'delivered': delivered,
+        # 每个发出的事件平均送达的客户端数：定向发送为 1，广播为玩家数
+        'fanout': round(delivered / total_emitted, 2) if total_emitted else None,
+        'delivered_per_player': round(delivered / players, 1),
+        'egress_bytes': sum(sizes),
+        'completion_events_per_player': round(
+            sum(counter['generation_complete'] for counter in received) / players, 2),
+        'events': dict(emitted),
+    }
+
+
+def print_report(report):
+    mode = '广播' if report['broadcast'] else '按游戏房间定向发送'
+    print(f"\n玩家: {report['players']}  方式: {mode}  完成: {report['completed']}  耗时: {report['elapsed']}s")
+    print(f"发出事件: {report['emitted']}  送达: {report['delivered']}  扇出: {report['fanout']}")
+    print(f"每个玩家收到: {report['delivered_per_player']} 个事件，其中开局完成事件 {report['completion_events_per_player']} 个")
+    print(f"推送字节数: {report['egress_bytes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计 Socket.IO 事件的发出数与送达数')
+    parser.add_argument('--players', type=int, default=20, help='同时在线的玩家数')
+    parser.add_argument('--broadcast', action='store_true', help='模拟旧的广播行为作对比')
+    parser.add_argument('--latency', type=float, default=0.01, help='假模型单次调用的中位耗时（秒）')
+    parser.add_argument('--timeout', type=float, default=120.0, help='等待全部开局完成的超时时间（秒）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    # 配置在模块导入时读取，需在导入 app 之前设置
+    os.environ['LLM_BACKEND'] = 'mock'
+    os.environ['MOCK_LLM_LATENCY'] = str(args.latency)
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+    report = run(args.players, args.broadcast, args.timeout)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
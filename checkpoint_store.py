@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import llm  # noqa: F401  加载 .env 中的配置
+
+
+# --- Configuration Constants ---
+# 阶段检查点存储后端: sqlite / redis，none 表示不保存检查点
+CHECKPOINT_STORE = os.getenv("CHECKPOINT_STORE", "sqlite").lower()
+CHECKPOINT_STORE_PATH = os.getenv("CHECKPOINT_STORE_PATH", ".cache/checkpoints.sqlite3")
+CHECKPOINT_STORE_URL = os.getenv("CHECKPOINT_STORE_URL", os.getenv("SESSION_STORE_URL", "redis://localhost:6379/0"))
+# 检查点在最后一次写入后的保留时间（秒）
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", os.getenv("SESSION_TTL", 24 * 3600)))
+
+
+class CheckpointStore:
+    """按局保存 Workflow 各字段的检查点
+
+    每个阶段完成时只写入该阶段产生的字段，进程重启后由 load() 取回已完成的部分。
+    """
+
+    def __init__(self, ttl: float = CHECKPOINT_TTL):
+        self.ttl = ttl
+
+    def load(self, game_id: str) -> dict:
+        """返回该局已保存的全部字段，没有检查点时返回空字典"""
+        raise NotImplementedError
+
+    def save(self, game_id: str, fields: dict):
+        """写入（覆盖）若干字段并刷新过期时间"""
+        raise NotImplementedError
+
+    def delete(self, game_id: str):
+        raise NotImplementedError
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """SQLite 存储，每个字段一行，写入一个阶段只涉及该阶段的几行"""
+
+    def __init__(self, path: str = CHECKPOINT_STORE_PATH, ttl: float = CHECKPOINT_TTL):
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # WAL 模式下 NORMAL 已能保证进程崩溃后数据不丢失，只有断电可能丢失最后的事务
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'game_id TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, updated REAL NOT NULL, '
+            'PRIMARY KEY (game_id, field))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated)')
+        self._conn.commit()
+
+    def load(self, game_id):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT field, value, updated FROM checkpoints WHERE game_id = ?', (game_id,)
+            ).fetchall()
+        if self.ttl and rows and time.time() > max(updated for _, _, updated in rows) + self.ttl:
+            self.delete(game_id)
+            return {}
+        return {field: json.loads(value) for field, value, _ in rows}
+
+    def save(self, game_id, fields):
+        if not fields:
+            return
+        now = time.time()
+        rows = [(game_id, field, json.dumps(value, ensure_ascii=False), now) for field, value in fields.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO checkpoints (game_id, field, value, updated) VALUES (?, ?, ?, ?)', rows
+            )
+            # 同一局的其他字段一并续期
+            self._conn.execute('UPDATE checkpoints SET updated = ? WHERE game_id = ?', (now, game_id))
+            self._writes += 1
+            # 每 100 次写入清理一次过期检查点
+            if self.ttl and self._writes % 100 == 0:
+                self._conn.execute('DELETE FROM checkpoints WHERE updated < ?', (now - self.ttl,))
+            self._conn.commit()
+
+    def delete(self, game_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoints WHERE game_id = ?', (game_id,))
+            self._conn.commit()
+
+
+class RedisCheckpointStore(CheckpointStore):
+    """Redis 存储，每局一个 hash，过期由服务端负责
+
+    需要安装可选依赖 redis (pip install redis)。
+    """
+
+    KEY_PREFIX = 'dream_game:checkpoint:'
+
+    def __init__(self, url: str = CHECKPOINT_STORE_URL, ttl: float = CHECKPOINT_TTL, client=None):
+        super().__init__(ttl)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError('CHECKPOINT_STORE=redis 需要安装 redis: pip install redis') from e
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def load(self, game_id):
+        values = self._client.hgetall(self.KEY_PREFIX + game_id)
+        return {
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in values.items()
+        }
+
+    def save(self, game_id, fields):
+        if not fields:
+            return
+        key = self.KEY_PREFIX + game_id
+        pipeline = self._client.pipeline()
+        pipeline.hset(key, mapping={field: json.dumps(value, ensure_ascii=False) for field, value in fields.items()})
+        if self.ttl:
+            pipeline.expire(key, int(self.ttl))
+        pipeline.execute()
+
+    def delete(self, game_id):
+        self._client.delete(self.KEY_PREFIX + game_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store(backend: str = CHECKPOINT_STORE):
+    """进程内共享的检查点存储，CHECKPOINT_STORE=none 时返回 None"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if backend == 'none':
+                return None
+            if backend == 'sqlite':
+                _store = SQLiteCheckpointStore()
+            elif backend == 'redis':
+                _store = RedisCheckpointStore()
+            else:
+                raise ValueError(f"Invalid CHECKPOINT_STORE: {backend}")
+        return _store
@@ -0,0 +1,216 @@
+from langchain_core.exceptions import OutputParserException
+from llm.cache import cacheable, get_response_cache, make_cache_key
+from llm.client import get_chat_model
+from llm.limiter import estimate_tokens, get_limiter
+from llm.metrics import CallRecord, registry
+from llm.prompting import LLM_PROMPT_CACHE_KEY, prefix_key
+from llm.resilience import LLMCallError, resilience_policy
+from llm.routing import router
+from llm.streaming import DeltaForwarder, JsonFieldStream
+
+import asyncio
+import os
+import time
+
+
+# --- Configuration Constants ---
+DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-mini")
+DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
+
+
+class BaseStoryLLM:
+    """所有故事生成 LLM 封装的基类
+
+    子类实现 get_output_parser() 与 get_prompt()，并通过 model_name / temperature
+    选择模型。model_name 是默认的主模型，每次调用实际使用的模型由 llm/routing.py 的路由表按阶段决定，
+    调用时才从 get_chat_model() 取用该模型的 ChatOpenAI（同一 (模型, temperature) 进程内共享一个及其连接池）。
+    设置了 stream_field 的子类支持流式输出该字段。
+    """
+
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+    stream_field = None
+
+    def __init__(self, system_prompt: str = None):
+        self.system_prompt = system_prompt
+
+        self.output_parser = self.get_output_parser()
+        self.prompt = self.get_prompt()
+
+    def get_output_parser(self):
+        raise NotImplementedError
+
+    def get_prompt(self):
+        raise NotImplementedError
+
+    def cache_key(self, prompt_value, model: str = None):
+        return make_cache_key(model or self.model_name, self.temperature, prompt_value.to_messages())
+
+    def request_kwargs(self, prompt_value) -> dict:
+        """附加到模型请求上的参数：结构化输出的 response_format 与可选的 prompt_cache_key"""
+        kwargs = {}
+        response_format = getattr(self.output_parser, 'response_format', None)
+        if response_format is not None:
+            response_format = response_format(self.stage_name)
+        if response_format is not None:
+            kwargs['response_format'] = response_format
+        if LLM_PROMPT_CACHE_KEY:
+            kwargs['extra_body'] = {'prompt_cache_key': prefix_key(prompt_value.to_messages())}
+        return kwargs
+
+    @property
+    def stage_name(self):
+        """指标与 trace 中的阶段名，默认为去掉 LLM 后缀的类名"""
+        return type(self).__name__.removesuffix('LLM')
+
+    def invoke(self, inputs: dict, prompt=None):
+        """同步调用：失败时按 resilience_policy 重试，仍失败时回退到路由的备用模型，最终失败时抛出 LLMCallError"""
+        route = router.route(self.stage_name, self.model_name)
+        model = router.select(route)
+        try:
+            return self._invoke(model, inputs, prompt)
+        except LLMCallError:
+            if route.fallback in (None, model):
+                raise
+            print(f"{self.stage_name}: {model} 调用失败，改用备用模型 {route.fallback}")
+            return self._invoke(route.fallback, inputs, prompt, fallback=True)
+
+    def _invoke(self, model: str, inputs: dict, prompt=None, fallback: bool = False):
+        cache = get_response_cache() if cacheable(self.temperature) else None
+        call = CallRecord(self.stage_name, model)
+        error = None
+        try:
+            prompt_value = (prompt or self.prompt).invoke(inputs)
+            key = self.cache_key(prompt_value, model) if cache is not None else None
+            result = cache.get(key) if cache is not None else None
+            if result is not None:
+                call.cache_hit = True
+                return result
+
+            result = resilience_policy.run_sync(call, lambda: self._attempt_sync(prompt_value, call))
+            if cache is not None:
+                cache.set(key, result)
+            return result
+        except Exception as e:
+            error = e
+            print(f"Error: {e}")
+            raise
+        finally:
+            call.finish(error)
+            router.record(self.stage_name, model, error, fallback)
+
+    async def ainvoke(self, inputs: dict, prompt=None, on_delta=None):
+        """渲染提示词后依次查缓存、经准入控制调用模型并解析输出；设置了 on_delta 且支持流式时走流式路径
+
+        模型由路由表按阶段选择（主模型排队超过 SLO 时降级为备用模型）。请求在 resilience_policy 的时限内
+        按需重试与对冲，仍失败时用备用模型再调用一次，最终失败时抛出 LLMCallError。
+        """
+        forwarder = DeltaForwarder(on_delta) if on_delta is not None and self.stream_field else None
+        route = router.route(self.stage_name, self.model_name)
+        model = router.select(route)
+        try:
+            return await self._ainvoke(model, inputs, prompt, forwarder)
+        except LLMCallError:
+            if route.fallback in (None, model):
+                raise
+            print(f"{self.stage_name}: {model} 调用失败，改用备用模型 {route.fallback}")
+            # 备用模型从头生成，先让调用方清空主模型已输出的部分文本
+            if forwarder is not None:
+                forwarder.restart()
+            return await self._ainvoke(route.fallback, inputs, prompt, forwarder, fallback=True)
+
+    async def _ainvoke(self, model: str, inputs: dict, prompt=None, forwarder=None, fallback: bool = False):
+        cache = get_response_cache() if cacheable(self.temperature) else None
+        call = CallRecord(self.stage_name, model)
+        error = None
+        try:
+            prompt_value = await (prompt or self.prompt).ainvoke(inputs)
+            key = self.cache_key(prompt_value, model) if cache is not None else None
+            result = cache.get(key) if cache is not None else None
+            if result is not None:
+                call.cache_hit = True
+                if forwarder is not None:
+                    forwarder.forward(result.get(self.stream_field, ''))
+                return result
+
+            result = await resilience_policy.run(
+                call,
+                lambda race: self._attempt(prompt_value, call, race, forwarder),
+                streaming=forwarder is not None,
+            )
+            if cache is not None:
+                cache.set(key, result)
+            return result
+        except asyncio.CancelledError as e:
+            error = e
+            raise
+        except Exception as e:
+            error = e
+            print(f"Error: {e}")
+            raise
+        finally:
+            call.finish(error)
+            router.record(self.stage_name, model, error, fallback)
+
+    async def astream(self, inputs: dict, on_delta, prompt=None):
+        """流式生成：每收到新 token 就以 stream_field 字段的新增文本调用 on_delta(text)；
+        重试等请求生成了与已发送内容不同的文本时调用 on_delta(text, reset=True)，text 为该字段的完整新文本。
+        结束后返回与 ainvoke 相同的解析结果"""
+        return await self.ainvoke(inputs, prompt=prompt, on_delta=on_delta)
+
+    def _parse(self, message, call):
+        """解析模型输出；不符合 schema 时记入该路由的统计后抛出（由 resilience_policy 重试）"""
+        try:
+            return self.output_parser.invoke(message)
+        except OutputParserException:
+            router.record_invalid(self.stage_name, call.model)
+            raise
+
+    def _attempt_sync(self, prompt_value, call):
+        chat_model = get_chat_model(call.model, self.temperature)
+        message = chat_model.invoke(prompt_value, **self.request_kwargs(prompt_value))
+        call.first_token()
+        call.record_usage(message)
+        return self._parse(message, call)
+
+    async def _attempt(self, prompt_value, call, race, forwarder=None):
+        """一次完整的模型请求：准入、调用（或流式调用）、记录用量并解析输出"""
+        chat_model = get_chat_model(call.model, self.temperature)
+        limiter = get_limiter(call.model)
+        async with limiter.admit(estimate_tokens(prompt_value.to_messages())) as grant:
+            call.admitted()
+            race.admitted()
+            started = time.perf_counter()
+            if forwarder is not None:
+                message, first_token = await self._astream(chat_model, prompt_value, call, race, forwarder)
+            else:
+                message = await chat_model.ainvoke(prompt_value, **self.request_kwargs(prompt_value))
+                call.first_token()
+                first_token = None
+            grant.record(message)
+        call.record_usage(message)
+        result = self._parse(message, call)
+        registry.observe_latency(self.stage_name, call.model, time.perf_counter() - started, first_token)
+        return result
+
+    async def _astream(self, chat_model, prompt_value, call, race, forwarder):
+        field_stream = JsonFieldStream(self.stream_field)
+        kwargs = self.request_kwargs(prompt_value)
+        if 'response_format' in kwargs:
+            # 带 response_format 的流在最后一个块中已附带完整用量，再请求 stream_options 会重复计数
+            kwargs['stream_usage'] = False
+        started = time.perf_counter()
+        first_token = None
+        leader = False
+        message = None
+        async for chunk in chat_model.astream(prompt_value, **kwargs):
+            if chunk.content and first_token is None:
+                first_token = time.perf_counter() - started
+                call.first_token()
+                # 对冲时只有最先产生 token 的请求向调用方输出
+                leader = race.claim()
+            message = chunk if message is None else message + chunk
+            field_stream.feed(chunk.content)
+            if leader:
+                forwarder.forward(field_stream.value)
+        return message, first_token
@@ -0,0 +1,61 @@
+"""梦境之旅的 LLM 封装
+
+导入 llm 包（或其任一子模块）时加载一次 .env。各阶段的 LLM 类按需导入：
+首次访问 llm.ChapterLLM 等属性时才导入对应模块以及 LangChain，
+只用到 llm.limiter、llm.metrics 等轻量模块的进程（如 Web 服务启动时）不必为此付出导入时间。
+"""
+from dotenv import load_dotenv, find_dotenv
+import importlib
+import threading
+
+load_dotenv(find_dotenv())
+
+
+# 类名 → 所在模块
+_LAZY_CLASSES = {
+    'BaseStoryLLM': 'llm.Base',
+    'PersonalityLLM': 'llm.role.Personality',
+    'CharacLLM': 'llm.role.Charac',
+    'ThemeLLM': 'llm.story.Theme',
+    'BackgroundLLM': 'llm.story.Background',
+    'DreamLLM': 'llm.story.Dream',
+    'DreamBundleLLM': 'llm.story.DreamBundle',
+    'ConditionLLM': 'llm.story.Condition',
+    'EndingLLM': 'llm.story.Ending',
+    'MemoryLLM': 'llm.story.Memory',
+    'ChapterLLM': 'llm.scene.Chapter',
+}
+
+__all__ = list(_LAZY_CLASSES) + ['shared_llm']
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def __getattr__(name):
+    module = _LAZY_CLASSES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    # 缓存到模块命名空间，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def shared_llm(class_name: str, **kwargs):
+    """按 (类名, 构造参数) 返回进程内共享的 LLM 封装实例，首次调用时才构造
+
+    封装构造后不再修改（提示词与解析器都是只读的），可以被多个 Workflow 并发使用。
+    """
+    key = (class_name, tuple(sorted(kwargs.items())))
+    instance = _instances.get(key)
+    if instance is None:
+        cls = globals()[class_name] if class_name in globals() else __getattr__(class_name)
+        instance = cls(**kwargs)
+        with _instances_lock:
+            instance = _instances.setdefault(key, instance)
+    return instance
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,229 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# --- Configuration Constants ---
+# 缓存后端: 空为关闭, memory 为进程内 LRU, sqlite 为 LRU + 磁盘两级缓存
+LLM_CACHE = os.getenv("LLM_CACHE", "").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+# 过期时间（秒），0 表示永不过期
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", 1024))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 100000))
+# 回放种子：温度大于 0 的调用只在设置了种子时缓存，种子计入缓存键
+LLM_CACHE_SEED = os.getenv("LLM_CACHE_SEED", "")
+
+# 修改后可使全部已有缓存失效
+CACHE_KEY_VERSION = 2
+
+
+def cacheable(temperature: float, seed: str = LLM_CACHE_SEED) -> bool:
+    """调用结果是否可以缓存
+
+    温度大于 0 的调用每次都应得到不同的输出：提示词相同（如不依赖输入的灵魂）时缓存会让每局游戏得到相同的内容，
+    因此只有设置了回放种子时才缓存。
+    """
+    return temperature == 0 or bool(seed)
+
+
+def make_cache_key(model: str, temperature: float, messages, seed: str = LLM_CACHE_SEED) -> str:
+    """由模型、温度、回放种子和渲染后的完整提示词计算内容寻址的缓存键"""
+    payload = json.dumps(
+        {
+            'version': CACHE_KEY_VERSION,
+            'model': model,
+            'temperature': temperature,
+            'seed': seed,
+            'messages': [(message.type, message.content) for message in messages],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LLM 解析结果缓存的接口，值为可 JSON 序列化的 dict"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryLRUCache(ResponseCache):
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_size: int = LLM_CACHE_MEMORY_SIZE, ttl: float = LLM_CACHE_TTL):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(ResponseCache):
+    """磁盘缓存，超过 max_entries 时淘汰最久未访问的条目"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)')
+        self._conn.commit()
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE llm_cache SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._writes += 1
+            # 每 100 次写入检查一次过期与容量
+            if self._writes % 100 == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute('DELETE FROM llm_cache WHERE created < ?', (now - self.ttl,))
+        overflow = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                'DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)',
+                (overflow,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM llm_cache')
+            self._conn.commit()
+
+
+class TieredCache(ResponseCache):
+    """多级缓存：依次查找各级，命中后回填到更快的层级"""
+
+    def __init__(self, *tiers):
+        super().__init__()
+        self.tiers = tiers
+
+    def _get(self, key):
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+
+_response_cache = None
+_configured = False
+_lock = threading.Lock()
+
+
+def get_response_cache():
+    """返回按 LLM_CACHE 配置的进程内缓存，未开启时返回 None"""
+    global _response_cache, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                if LLM_CACHE == 'memory':
+                    _response_cache = MemoryLRUCache()
+                elif LLM_CACHE == 'sqlite':
+                    _response_cache = TieredCache(MemoryLRUCache(), SQLiteCache())
+                elif LLM_CACHE:
+                    raise ValueError(f"Invalid LLM_CACHE: {LLM_CACHE}")
+                if _response_cache is not None and LLM_CACHE_SEED:
+                    print(f"LLM_CACHE_SEED={LLM_CACHE_SEED}: 温度大于 0 的调用也会缓存，相同输入的每局游戏将得到相同的内容，"
+                          f"只应用于回放与测试，不要在为玩家提供服务时开启")
+                _configured = True
+    return _response_cache
+
+
+def set_response_cache(cache: ResponseCache = None):
+    """替换进程内缓存（传入 None 关闭缓存）"""
+    global _response_cache, _configured
+    with _lock:
+        _response_cache = cache
+        _configured = True
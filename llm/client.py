@@ -0,0 +1,109 @@
+import asyncio
+import httpx
+import importlib.util
+import os
+import threading
+
+
+# --- Configuration Constants ---
+# 模型后端: openai 为真实 API，mock 为离线的确定性假模型（见 llm/mock.py）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+# 流式调用时请求服务端在最后一个块中返回 token 用量（部分兼容 OpenAI 的服务不支持）
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+# HTTP/2 由依赖 httpx[http2] 安装的 h2 提供；环境中缺少 h2 时（如未按 pyproject 安装依赖）退回 HTTP/1.1
+LLM_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """按事件循环划分的异步连接池
+
+    httpx 的连接绑定在创建它的事件循环上，进程内可能同时存在多个事件循环，
+    因此每个循环持有独立的连接池，同一循环内的所有调用共享 keep-alive 连接。
+    """
+
+    def __init__(self, **transport_kwargs):
+        self._transport_kwargs = transport_kwargs
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # 丢弃已关闭事件循环上的连接池
+            for closed in [l for l in self._pools if l.is_closed()]:
+                del self._pools[closed]
+            pool = self._pools.get(loop)
+            if pool is None:
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+            return pool
+
+    async def handle_async_request(self, request):
+        return await self._get_pool().handle_async_request(request)
+
+    async def aclose(self):
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+
+_http_client = None
+_http_async_client = None
+_chat_models = {}
+_lock = threading.Lock()
+
+
+def get_http_clients():
+    """进程内共享的同步/异步 HTTP 客户端"""
+    global _http_client, _http_async_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(http2=LLM_HTTP2, limits=_limits())
+            _http_async_client = httpx.AsyncClient(
+                transport=LoopLocalTransport(http2=LLM_HTTP2, limits=_limits()),
+            )
+        return _http_client, _http_async_client
+
+
+def _create_chat_model(model: str, temperature: float):
+    if LLM_BACKEND == 'mock':
+        from llm.mock import MockChatModel
+        return MockChatModel(model_name=model, temperature=temperature)
+    if LLM_BACKEND != 'openai':
+        raise ValueError(f"Invalid LLM_BACKEND: {LLM_BACKEND}")
+
+    # langchain_openai（及 openai SDK）导入较慢，首次创建模型时才导入
+    from langchain_openai import ChatOpenAI
+
+    http_client, http_async_client = get_http_clients()
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        stream_usage=LLM_STREAM_USAGE,
+        # 重试由 llm/resilience.py 统一负责，避免与 openai 客户端内置的重试叠加
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+def get_chat_model(model: str, temperature: float):
+    """按 (model, temperature) 返回进程内共享的 ChatOpenAI 实例（LLM_BACKEND=mock 时为 MockChatModel）"""
+    key = (model, temperature)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        chat_model = _create_chat_model(model, temperature)
+        with _lock:
+            chat_model = _chat_models.setdefault(key, chat_model)
+    return chat_model
@@ -0,0 +1,274 @@
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+
+# --- Configuration Constants ---
+# 每个模型的默认预算，0 表示不限制
+LLM_RPM = int(os.getenv("LLM_RPM", 0))
+LLM_TPM = int(os.getenv("LLM_TPM", 0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 0))
+# 按模型覆盖默认预算，如 {"gpt-4.1": {"rpm": 500, "tpm": 30000, "concurrency": 16}}
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}") or "{}")
+# 估算 token 数：提示词按每 token 约 2 个字符（中英混合）计，另加预计的输出长度
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", 2))
+LLM_EST_COMPLETION_TOKENS = int(os.getenv("LLM_EST_COMPLETION_TOKENS", 600))
+
+RATE_WINDOW = 60.0
+
+# 优先级：数值越小越先被放行
+INTERACTIVE = 0
+BACKGROUND = 10
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+_priority = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """在该上下文（及其中创建的 asyncio 任务）内发起的 LLM 调用使用指定优先级"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def text_tokens(text: str) -> int:
+    """粗略估算一段文本的 token 数"""
+    return int(len(text) / LLM_CHARS_PER_TOKEN)
+
+
+def estimate_tokens(messages) -> int:
+    """粗略估算一次调用的 token 开销（提示词 + 预计输出）"""
+    return text_tokens(''.join(message.content for message in messages)) + LLM_EST_COMPLETION_TOKENS
+
+
+class _Ticket:
+    """排队中的一次调用"""
+
+    __slots__ = ('priority', 'seq', 'tokens', 'loop', 'event', 'enqueued', 'cancelled')
+
+    def __init__(self, priority, seq, tokens):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        if not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.event.set)
+            except RuntimeError:
+                pass
+
+
+class Grant:
+    """已放行的调用，结束前可用 record() 以实际用量修正 token 预算"""
+
+    __slots__ = ('time', 'tokens', 'used', 'expired')
+
+    def __init__(self, tokens):
+        self.time = time.monotonic()
+        self.tokens = tokens
+        self.used = None
+        self.expired = False
+
+    def record(self, message):
+        usage = getattr(message, 'usage_metadata', None)
+        if usage and usage.get('total_tokens'):
+            self.used = usage['total_tokens']
+
+
+class AdmissionController:
+    """单个模型的准入控制器
+
+    按 RPM / TPM（60 秒滑动窗口）和并发数放行调用，预算不足时调用按优先级排队，
+    同一优先级先到先得；交互请求（玩家等待的结果）总是排在后台预生成之前。
+    可以被多个事件循环同时使用。
+    """
+
+    def __init__(self, model: str, rpm: int = 0, tpm: int = 0, max_concurrency: int = 0):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.waiting = Counter()
+        self.wait_total = Counter()
+        self.wait_max = Counter()
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._window = deque()
+        self._window_tokens = 0
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def admit(self, tokens: int, priority: int = None):
+        """等待放行后进入上下文，退出时归还并发名额"""
+        grant = await self.acquire(tokens, current_priority() if priority is None else priority)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    async def acquire(self, tokens: int, priority: int = INTERACTIVE) -> Grant:
+        ticket = _Ticket(priority, next(self._seq), tokens)
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self.waiting[priority] += 1
+
+        try:
+            while True:
+                ticket.event.clear()
+                with self._lock:
+                    grant, delay = self._try_admit(ticket)
+                if grant is not None:
+                    return grant
+                if delay is None:
+                    await ticket.event.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(ticket.event.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+        except BaseException:
+            with self._lock:
+                if not ticket.cancelled and ticket in self._queue:
+                    ticket.cancelled = True
+                    self.waiting[priority] -= 1
+                    self._wake_head()
+            raise
+
+    def release(self, grant: Grant):
+        with self._lock:
+            self.in_flight -= 1
+            if grant.used is not None and not grant.expired:
+                # 以实际用量修正窗口内的 token 计数
+                self._window_tokens += grant.used - grant.tokens
+                grant.tokens = grant.used
+            self._wake_head()
+
+    def _try_admit(self, ticket):
+        """ticket 位于队首且预算充足时放行，否则返回 (None, 需要等待的秒数或 None)"""
+        self._pop_cancelled()
+        if self._queue[0] is not ticket:
+            return None, None
+
+        now = time.monotonic()
+        self._expire(now)
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None, None
+        if self.rpm and len(self._window) >= self.rpm:
+            return None, self._window[0].time + RATE_WINDOW - now
+        if self.tpm and self._window and self._window_tokens + ticket.tokens > self.tpm:
+            excess = self._window_tokens + ticket.tokens - self.tpm
+            for grant in self._window:
+                excess -= grant.tokens
+                if excess <= 0:
+                    return None, grant.time + RATE_WINDOW - now
+            return None, self._window[-1].time + RATE_WINDOW - now
+
+        heapq.heappop(self._queue)
+        grant = Grant(ticket.tokens)
+        self._window.append(grant)
+        self._window_tokens += grant.tokens
+        self.in_flight += 1
+
+        waited = now - ticket.enqueued
+        self.waiting[ticket.priority] -= 1
+        self.admitted[ticket.priority] += 1
+        self.wait_total[ticket.priority] += waited
+        self.wait_max[ticket.priority] = max(self.wait_max[ticket.priority], waited)
+
+        # 队首变化后唤醒下一个，使其也有机会在同一时刻被放行
+        self._wake_head()
+        return grant, 0
+
+    def queue_latency(self) -> float:
+        """当前的排队延迟：队首（等待最久的）调用已等待的秒数，没有排队时为 0"""
+        with self._lock:
+            self._pop_cancelled()
+            if not self._queue:
+                return 0.0
+            return time.monotonic() - min(ticket.enqueued for ticket in self._queue if not ticket.cancelled)
+
+    def _pop_cancelled(self):
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+
+    def _expire(self, now):
+        while self._window and now - self._window[0].time >= RATE_WINDOW:
+            grant = self._window.popleft()
+            grant.expired = True
+            self._window_tokens -= grant.tokens
+
+    def _wake_head(self):
+        self._pop_cancelled()
+        if self._queue:
+            self._queue[0].wake()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'model': self.model,
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'requests_in_window': len(self._window),
+                'tokens_in_window': self._window_tokens,
+                'queue_depth': {PRIORITY_NAMES.get(p, str(p)): n for p, n in self.waiting.items()},
+                'admitted': {PRIORITY_NAMES.get(p, str(p)): n for p, n in self.admitted.items()},
+                'avg_wait': {
+                    PRIORITY_NAMES.get(p, str(p)): self.wait_total[p] / n for p, n in self.admitted.items() if n
+                },
+                'max_wait': {PRIORITY_NAMES.get(p, str(p)): w for p, w in self.wait_max.items()},
+            }
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> AdmissionController:
+    """返回进程内该模型共享的准入控制器"""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                limits = LLM_RATE_LIMITS.get(model, {})
+                limiter = _limiters[model] = AdmissionController(
+                    model,
+                    rpm=limits.get('rpm', LLM_RPM),
+                    tpm=limits.get('tpm', LLM_TPM),
+                    max_concurrency=limits.get('concurrency', LLM_MAX_CONCURRENCY),
+                )
+    return limiter
+
+
+def limiter_stats() -> list:
+    """所有模型准入控制器的队列深度与等待时间"""
+    return [limiter.stats() for limiter in list(_limiters.values())]
@@ -0,0 +1,322 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+
+from llm.limiter import BACKGROUND, current_priority, limiter_stats
+
+
+# --- Configuration Constants ---
+# 每百万 token 的美元价格 [输入, 输出, 缓存命中的输入]，可按模型覆盖
+LLM_PRICES = {
+    'gpt-4.1': [2.0, 8.0, 0.5],
+    'gpt-4.1-mini': [0.4, 1.6, 0.1],
+    'gpt-4.1-nano': [0.1, 0.4, 0.025],
+    'gpt-4o': [2.5, 10.0, 1.25],
+    'gpt-4o-mini': [0.15, 0.6, 0.075],
+}
+LLM_PRICES.update(json.loads(os.getenv("LLM_PRICES", "{}") or "{}"))
+# 每局游戏 trace 保留的最近调用数
+LLM_TRACE_SIZE = int(os.getenv("LLM_TRACE_SIZE", 200))
+# 每个 (阶段, 模型) 保留的最近请求耗时样本数，用于计算对冲阈值等分位数
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", 500))
+
+# 耗时直方图的分桶上限（秒）
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+_trace = contextvars.ContextVar('llm_trace', default=None)
+
+
+@contextmanager
+def llm_trace(trace: list):
+    """在该上下文（及其中创建的 asyncio 任务）内发起的 LLM 调用记录追加到 trace"""
+    token = _trace.set(trace)
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+
+
+async def traced(coro, trace: list):
+    """在 llm_trace(trace) 中运行协程"""
+    with llm_trace(trace):
+        return await coro
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prices = LLM_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, output_price, cached_price = prices
+    return ((prompt_tokens - cached_tokens) * input_price
+            + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1e6
+
+
+class CallRecord:
+    """一次 LLM 封装调用的计时与用量，finish() 时写入指标注册表和当前 trace"""
+
+    __slots__ = (
+        'stage', 'model', 'priority', 'started', 'queue_wait', 'ttft', 'wall',
+        'prompt_tokens', 'completion_tokens', 'cached_tokens', 'retries', 'hedges', 'cache_hit', 'error',
+        '_start', '_trace',
+    )
+
+    def __init__(self, stage: str, model: str):
+        self.stage = stage
+        self.model = model
+        self.priority = current_priority()
+        self.started = time.time()
+        self.queue_wait = 0.0
+        self.ttft = None
+        self.wall = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.retries = 0
+        self.hedges = 0
+        self.cache_hit = False
+        self.error = None
+
+        self._start = time.perf_counter()
+        self._trace = _trace.get()
+
+    def admitted(self):
+        """首次通过准入控制时调用，记录排队时间"""
+        if not self.queue_wait:
+            self.queue_wait = time.perf_counter() - self._start
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+
+    def record_usage(self, message):
+        usage = getattr(message, 'usage_metadata', None)
+        if not usage:
+            return
+        self.prompt_tokens += usage.get('input_tokens', 0)
+        self.completion_tokens += usage.get('output_tokens', 0)
+        self.cached_tokens += (usage.get('input_token_details') or {}).get('cache_read', 0) or 0
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens, self.cached_tokens)
+
+    def finish(self, error: Exception = None):
+        self.wall = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+        registry.record(self)
+        if self._trace is not None:
+            self._trace.append(self.to_dict())
+            del self._trace[:-LLM_TRACE_SIZE]
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.stage,
+            'model': self.model,
+            'background': self.priority >= BACKGROUND,
+            'started': round(self.started, 3),
+            'wall': round(self.wall, 4),
+            'ttft': None if self.ttft is None else round(self.ttft, 4),
+            'queue_wait': round(self.queue_wait, 4),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cost': round(self.cost, 6),
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'cache_hit': self.cache_hit,
+            'error': self.error,
+        }
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(BUCKETS, value)
+        if index < len(BUCKETS):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _StageMetrics:
+    __slots__ = (
+        'calls', 'errors', 'cache_hits', 'retries', 'hedges', 'prompt_tokens', 'completion_tokens',
+        'cached_tokens', 'cost', 'wall', 'ttft', 'queue_wait', 'latencies', 'first_tokens',
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.hedges = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.wall = _Histogram()
+        self.ttft = _Histogram()
+        self.queue_wait = _Histogram()
+        # 单次请求从通过准入到完成 / 首个 token 的耗时
+        self.latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.first_tokens = deque(maxlen=LLM_LATENCY_WINDOW)
+
+
+class MetricsRegistry:
+    """按 (阶段, 模型) 汇总的 LLM 调用指标"""
+
+    def __init__(self):
+        self._stages = defaultdict(_StageMetrics)
+        self._lock = threading.Lock()
+
+    def record(self, call: CallRecord):
+        with self._lock:
+            metrics = self._stages[(call.stage, call.model)]
+            metrics.calls += 1
+            metrics.errors += call.error is not None
+            metrics.cache_hits += call.cache_hit
+            metrics.retries += call.retries
+            metrics.hedges += call.hedges
+            metrics.prompt_tokens += call.prompt_tokens
+            metrics.completion_tokens += call.completion_tokens
+            metrics.cached_tokens += call.cached_tokens
+            metrics.cost += call.cost
+            metrics.wall.observe(call.wall)
+            if call.ttft is not None:
+                metrics.ttft.observe(call.ttft)
+            if not call.cache_hit:
+                metrics.queue_wait.observe(call.queue_wait)
+
+    def observe_latency(self, stage: str, model: str, latency: float, first_token: float = None):
+        """记录一次成功请求的耗时（不含排队）"""
+        with self._lock:
+            metrics = self._stages[(stage, model)]
+            metrics.latencies.append(latency)
+            if first_token is not None:
+                metrics.first_tokens.append(first_token)
+
+    def latency_quantile(self, stage: str, model: str, q: float, first_token: bool = False, min_samples: int = 1):
+        """最近请求耗时（first_token 时为首 token 时间）的 q 分位数，样本不足时返回 None"""
+        with self._lock:
+            metrics = self._stages.get((stage, model))
+            if metrics is None:
+                return None
+            samples = sorted(metrics.first_tokens if first_token else metrics.latencies)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> list:
+        """各阶段的调用次数、平均耗时与用量，按总耗时降序"""
+        with self._lock:
+            rows = [
+                {
+                    'stage': stage,
+                    'model': model,
+                    'calls': m.calls,
+                    'errors': m.errors,
+                    'cache_hits': m.cache_hits,
+                    'retries': m.retries,
+                    'hedges': m.hedges,
+                    'wall_total': m.wall.sum,
+                    'wall_avg': m.wall.sum / m.wall.count if m.wall.count else 0.0,
+                    'ttft_avg': m.ttft.sum / m.ttft.count if m.ttft.count else None,
+                    'prompt_tokens': m.prompt_tokens,
+                    'completion_tokens': m.completion_tokens,
+                    'cached_tokens': m.cached_tokens,
+                    'cached_ratio': m.cached_tokens / m.prompt_tokens if m.prompt_tokens else None,
+                    'cost': m.cost,
+                }
+                for (stage, model), m in self._stages.items()
+            ]
+        return sorted(rows, key=lambda row: row['wall_total'], reverse=True)
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式的全部指标（包括准入控制器的队列状态）"""
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            stages = sorted(self._stages.items())
+
+            counters = [
+                ('dream_llm_calls_total', 'LLM wrapper calls.', lambda m: m.calls),
+                ('dream_llm_errors_total', 'LLM wrapper calls that failed.', lambda m: m.errors),
+                ('dream_llm_cache_hits_total', 'LLM wrapper calls served from the response cache.', lambda m: m.cache_hits),
+                ('dream_llm_retries_total', 'Retried LLM requests.', lambda m: m.retries),
+                ('dream_llm_hedges_total', 'Hedged duplicate LLM requests.', lambda m: m.hedges),
+                ('dream_llm_cost_usd_total', 'Estimated LLM spend in USD.', lambda m: m.cost),
+            ]
+            for name, help_text, value in counters:
+                metric(name, 'counter', help_text)
+                for (stage, model), m in stages:
+                    lines.append(f'{name}{_labels(stage=stage, model=model)} {_number(value(m))}')
+
+            metric('dream_llm_tokens_total', 'counter', 'LLM tokens by type; cached is the part of prompt read from the provider cache.')
+            for (stage, model), m in stages:
+                for kind, value in (('prompt', m.prompt_tokens), ('completion', m.completion_tokens), ('cached', m.cached_tokens)):
+                    lines.append(f'dream_llm_tokens_total{_labels(stage=stage, model=model, type=kind)} {value}')
+
+            histograms = [
+                ('dream_llm_duration_seconds', 'Wall time of LLM wrapper calls.', 'wall'),
+                ('dream_llm_ttft_seconds', 'Time to first token of LLM wrapper calls.', 'ttft'),
+                ('dream_llm_queue_wait_seconds', 'Time spent waiting for LLM admission.', 'queue_wait'),
+            ]
+            for name, help_text, attr in histograms:
+                metric(name, 'histogram', help_text)
+                for (stage, model), m in stages:
+                    histogram = getattr(m, attr)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(stage=stage, model=model, le=_number(bound))} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(stage=stage, model=model, le="+Inf")} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(stage=stage, model=model)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_labels(stage=stage, model=model)} {histogram.count}')
+
+        limiters = limiter_stats()
+        metric('dream_llm_in_flight', 'gauge', 'LLM requests currently admitted.')
+        for stats in limiters:
+            lines.append(f'dream_llm_in_flight{_labels(model=stats["model"])} {stats["in_flight"]}')
+        metric('dream_llm_queue_depth', 'gauge', 'LLM requests waiting for admission.')
+        for stats in limiters:
+            for priority, depth in stats['queue_depth'].items():
+                lines.append(f'dream_llm_queue_depth{_labels(model=stats["model"], priority=priority)} {depth}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels) -> str:
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# 进程内共享的指标注册表
+registry = MetricsRegistry()
@@ -0,0 +1,185 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from llm.prompting import shared_prefix
+
+
+# --- Configuration Constants ---
+# 单次调用的总耗时分布: fixed / uniform / lognormal
+MOCK_LLM_LATENCY = float(os.getenv("MOCK_LLM_LATENCY", 1.0))
+MOCK_LLM_LATENCY_DISTRIBUTION = os.getenv("MOCK_LLM_LATENCY_DISTRIBUTION", "lognormal").lower()
+# uniform 时为 ±比例，lognormal 时为 sigma
+MOCK_LLM_LATENCY_JITTER = float(os.getenv("MOCK_LLM_LATENCY_JITTER", 0.3))
+# 首个 token 到达时间占总耗时的比例
+MOCK_LLM_TTFT_RATIO = float(os.getenv("MOCK_LLM_TTFT_RATIO", 0.2))
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", 0))
+# 请求以连接错误失败的概率，用于演练重试
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", 0))
+
+# 格式说明中的字段行，如 "CHOICE_A": string  // One sentence description of the choice a
+FIELD_PATTERN = re.compile(r'"(\w+)":\s*([\w\[\]]+)\s*//\s*([^\n]*)')
+
+PHRASES = [
+    '月光洒在古老的石阶上', '远处传来若有若无的钟声', '他握紧了手中褪色的信', '风里带着潮湿的雨意',
+    '街角的灯忽明忽暗', '记忆像潮水一样涌来', '她停下脚步回头张望', '一扇从未打开过的门虚掩着',
+    '墙上的时钟停在了午夜', '陌生人递来一枚铜钥匙', '梦与现实的边界渐渐模糊', '心底的愿望再次被唤醒',
+    '人群中有人低声叫出他的名字', '窗外的树影轻轻摇晃', '旧照片里的笑容依然清晰', '前方的道路分成了三条',
+]
+
+_latency_rng = random.Random(MOCK_LLM_SEED)
+_latency_lock = threading.Lock()
+
+# 模拟服务端提示词缓存：前缀至少 1024 token 且之前出现过时，按 128 token 的整数倍命中
+_seen_prefixes = set()
+_seen_lock = threading.Lock()
+
+
+def cached_prefix_tokens(messages) -> int:
+    prefix = shared_prefix(messages)
+    tokens = len(prefix) // 2
+    if tokens < 1024:
+        return 0
+    key = hashlib.sha256(prefix.encode('utf-8')).digest()
+    with _seen_lock:
+        seen = key in _seen_prefixes
+        _seen_prefixes.add(key)
+    return tokens // 128 * 128 if seen else 0
+
+
+def sample_latency() -> float:
+    """按配置的分布采样一次调用的总耗时（秒）"""
+    with _latency_lock:
+        if MOCK_LLM_LATENCY_DISTRIBUTION == 'fixed':
+            latency = MOCK_LLM_LATENCY
+        elif MOCK_LLM_LATENCY_DISTRIBUTION == 'uniform':
+            latency = MOCK_LLM_LATENCY * _latency_rng.uniform(1 - MOCK_LLM_LATENCY_JITTER, 1 + MOCK_LLM_LATENCY_JITTER)
+        elif MOCK_LLM_LATENCY_DISTRIBUTION == 'lognormal':
+            # 中位数为 MOCK_LLM_LATENCY 的长尾分布
+            latency = MOCK_LLM_LATENCY * _latency_rng.lognormvariate(0, MOCK_LLM_LATENCY_JITTER)
+        else:
+            raise ValueError(f"Invalid MOCK_LLM_LATENCY_DISTRIBUTION: {MOCK_LLM_LATENCY_DISTRIBUTION}")
+    return max(0.0, latency)
+
+
+def maybe_fail():
+    """按 MOCK_LLM_ERROR_RATE 的概率模拟一次连接错误"""
+    with _latency_lock:
+        failed = _latency_rng.random() < MOCK_LLM_ERROR_RATE
+    if failed:
+        raise ConnectionError("模拟的连接错误")
+
+
+def mock_value(rng: random.Random, kind: str, description: str):
+    """按字段类型与描述生成一个看起来合理的值"""
+    if kind in ('integer', 'int'):
+        return rng.randint(1, 100)
+    if kind in ('number', 'float'):
+        return round(rng.uniform(0, 100), 2)
+    if kind in ('boolean', 'bool'):
+        return rng.random() < 0.5
+    # 描述为段落的字段生成一段话，其余生成一句话
+    count = rng.randint(6, 10) if 'paragra' in description.lower() else rng.randint(2, 3)
+    return '，'.join(rng.choice(PHRASES) for _ in range(count)) + '。'
+
+
+def mock_response(messages, model: str, response_format: dict = None) -> str:
+    """生成符合 schema 的 JSON；相同的提示词总是得到相同的输出
+
+    请求带有 json_schema 类型的 response_format 时按其中的字段生成纯 JSON，
+    否则按提示词中的格式说明生成 ```json 代码块。
+    """
+    prompt = '\n'.join(str(message.content) for message in messages)
+    seed = hashlib.sha256(f'{MOCK_LLM_SEED}:{model}:{prompt}'.encode('utf-8')).digest()
+    rng = random.Random(seed)
+
+    if response_format and response_format.get('type') == 'json_schema':
+        properties = response_format['json_schema']['schema']['properties']
+        fields = {
+            name: mock_value(rng, field.get('type', 'string'), field.get('description', ''))
+            for name, field in properties.items()
+        }
+        return json.dumps(fields, ensure_ascii=False)
+
+    fields = {}
+    for name, kind, description in FIELD_PATTERN.findall(prompt):
+        fields.setdefault(name, mock_value(rng, kind, description))
+    return '```json\n' + json.dumps(fields, ensure_ascii=False, indent=4) + '\n```'
+
+
+class MockChatModel(BaseChatModel):
+    """离线的确定性聊天模型，用于在没有 API Key 的情况下运行、压测整个游戏
+
+    输出为 response_format 或提示词格式说明所要求字段的 JSON，耗时按 MOCK_LLM_* 配置的分布采样，
+    流式输出时先等待首个 token 的时间，再把剩余时间均匀分摊到各个块上。
+    """
+
+    model_name: str = 'mock'
+    temperature: float = 0.0
+    chunk_size: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return 'mock'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'model_name': self.model_name, 'temperature': self.temperature}
+
+    def _usage(self, messages, text: str) -> dict:
+        # 与 limiter.estimate_tokens 一致，按每 token 约 2 个字符估算
+        input_tokens = sum(len(str(message.content)) for message in messages) // 2
+        output_tokens = len(text) // 2
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+            'input_token_details': {'cache_read': cached_prefix_tokens(messages)},
+        }
+
+    def _chunks(self, text: str):
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = mock_response(messages, self.model_name, kwargs.get('response_format'))
+        time.sleep(sample_latency())
+        maybe_fail()
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = mock_response(messages, self.model_name, kwargs.get('response_format'))
+        await asyncio.sleep(sample_latency())
+        maybe_fail()
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = mock_response(messages, self.model_name, kwargs.get('response_format'))
+        chunks = self._chunks(text)
+        latency = sample_latency()
+        time.sleep(latency * MOCK_LLM_TTFT_RATIO)
+        maybe_fail()
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            time.sleep(latency * (1 - MOCK_LLM_TTFT_RATIO) / len(chunks))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages, text)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = mock_response(messages, self.model_name, kwargs.get('response_format'))
+        chunks = self._chunks(text)
+        latency = sample_latency()
+        await asyncio.sleep(latency * MOCK_LLM_TTFT_RATIO)
+        maybe_fail()
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            await asyncio.sleep(latency * (1 - MOCK_LLM_TTFT_RATIO) / len(chunks))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=self._usage(messages, text)))
@@ -0,0 +1,84 @@
+from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain_core.runnables import RunnableLambda
+import hashlib
+import json
+import os
+import textwrap
+
+
+# --- Configuration Constants ---
+# 在请求中附带 prompt_cache_key（共享前缀的哈希），帮助 OpenAI 把相同前缀的请求路由到同一缓存；
+# 部分兼容 OpenAI 的服务不接受未知参数，因此默认关闭
+LLM_PROMPT_CACHE_KEY = os.getenv("LLM_PROMPT_CACHE_KEY", "false").lower() in ("1", "true", "yes")
+
+# 同一局游戏内不变的故事设定，固定顺序与格式，作为所有情景提示词的共同前缀
+GAME_INFORMATION_FIELDS = (
+    'theme', 'background', 'personality', 'character',
+    'dream_true', 'dream_fake', 'condition_true', 'condition_fake',
+)
+
+GAME_INFORMATION = """<game_information description="游戏信息">
+    <theme description="游戏主题">{theme}</theme>
+    <background description="游戏背景">{background}</background>
+    <personality description="游戏NPC的灵魂">{personality}</personality>
+    <character description="游戏NPC的设定">{character}</character>
+    <dream_true description="游戏NPC的真实愿望">{dream_true}</dream_true>
+    <dream_fake description="游戏NPC的表面愿望">{dream_fake}</dream_fake>
+    <condition_true description="游戏NPC达成真实愿望的条件">{condition_true}</condition_true>
+    <condition_fake description="游戏NPC达成表面愿望的条件">{condition_fake}</condition_fake>
+</game_information>"""
+
+RESPONSE_CONSTRAINTS = """<response_constraints>
+1. Use CHINESE to answer!
+2. Return the result in the format of `format_instructions`!
+</response_constraints>"""
+
+
+def canonicalize(value) -> str:
+    """把输入值转换为稳定的文本：dict / list 按键排序序列化，字符串去掉首尾空白"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return str(value).strip()
+
+
+def canonical_inputs(inputs: dict) -> dict:
+    return {key: canonicalize(value) for key, value in inputs.items()}
+
+
+def story_prompt(system_prompt: str, task: str, output_parser):
+    """组装情景类提示词
+
+    消息顺序为 system_prompt → game_information → task（阶段相关的故事进展、任务与约束）
+    → format_instructions → response_constraints。前两部分在同一局游戏的所有情景与结局中
+    逐字节相同，使服务端的提示词缓存可以命中；阶段相关的内容都放在其后。
+    """
+    messages = []
+    if system_prompt:
+        messages.append(SystemMessagePromptTemplate.from_template(system_prompt))
+
+    human_template = '\n\n'.join([
+        GAME_INFORMATION,
+        textwrap.dedent(task).strip(),
+        '<format_instructions>{format_instructions}</format_instructions>',
+        RESPONSE_CONSTRAINTS,
+    ])
+    messages.append(HumanMessagePromptTemplate.from_template(human_template))
+
+    chat_prompt = ChatPromptTemplate.from_messages(messages).partial(
+        format_instructions=output_parser.get_format_instructions()
+    )
+    return RunnableLambda(canonical_inputs) | chat_prompt
+
+
+def shared_prefix(messages) -> str:
+    """提示词中的共享前缀（system_prompt 与 game_information），同一局游戏内各阶段相同"""
+    text = '\n'.join(str(message.content) for message in messages)
+    end = text.find('</game_information>')
+    return text if end == -1 else text[:end]
+
+
+def prefix_key(messages) -> str:
+    """共享前缀的哈希"""
+    return hashlib.sha256(shared_prefix(messages).encode('utf-8')).hexdigest()[:32]
@@ -0,0 +1,177 @@
+from langchain_core.exceptions import OutputParserException
+import asyncio
+import json
+import openai
+import os
+import random
+import time
+
+from llm.limiter import BACKGROUND, current_priority
+from llm.metrics import registry
+
+
+# --- Configuration Constants ---
+# 单次封装调用（含全部重试与对冲请求）的总时限（秒），可按阶段覆盖，如 {"Ending": 90, "SituationAOpt": 30}
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 60))
+LLM_DEADLINES = json.loads(os.getenv("LLM_DEADLINES", "{}") or "{}")
+# 可重试错误的最大重试次数；第 n 次重试前等待 [0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2^n)] 内的随机时间
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+# 对冲请求：交互请求通过准入后，超过该阶段最近耗时的分位数（流式为首 token 时间）仍未完成时，
+# 再并发发起一个相同的请求，先完成者胜出；样本数不足时不对冲
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+
+# 服务端返回这些状态码时可重试
+RETRYABLE_STATUS = (408, 409, 429)
+
+
+class LLMCallError(RuntimeError):
+    """重试耗尽、遇到不可重试的错误或超出时限后抛出"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (OutputParserException, openai.APIConnectionError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+class Race:
+    """同一次调用中并发的一组请求（原请求与对冲请求）
+
+    请求通过准入时调用 admitted()；流式请求收到首个 token 时调用 claim()，
+    首个 claim 的请求成为唯一向调用方输出增量的请求，其余请求随即被取消。
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self.leader = None
+        self.started = asyncio.Event()
+
+    def admitted(self):
+        self.started.set()
+
+    def claim(self) -> bool:
+        task = asyncio.current_task()
+        if self.leader is None:
+            self.leader = task
+            for other in self.tasks:
+                if other is not task:
+                    other.cancel()
+        return self.leader is task
+
+
+class ResiliencePolicy:
+    """LLM 调用的时限、重试与对冲策略"""
+
+    def __init__(self, deadline: float = LLM_DEADLINE, deadlines: dict = None, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX,
+                 hedge: bool = LLM_HEDGE, hedge_quantile: float = LLM_HEDGE_QUANTILE,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.deadline = deadline
+        self.deadlines = LLM_DEADLINES if deadlines is None else deadlines
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+
+    def deadline_for(self, stage: str) -> float:
+        return float(self.deadlines.get(stage, self.deadline))
+
+    def backoff(self, retry: int) -> float:
+        """第 retry 次重试（从 0 开始）前的等待时间，指数退避加 full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def hedge_delay(self, stage: str, model: str, streaming: bool):
+        """对冲请求的触发延迟，不对冲时返回 None；后台请求（推测生成、开局预生成）不对冲"""
+        if not self.hedge or current_priority() >= BACKGROUND:
+            return None
+        return registry.latency_quantile(stage, model, self.hedge_quantile,
+                                         first_token=streaming, min_samples=self.hedge_min_samples)
+
+    def _retry_or_raise(self, call, error: Exception) -> float:
+        if isinstance(error, LLMCallError):
+            raise error
+        if call.retries >= self.max_retries or not is_retryable(error):
+            raise LLMCallError(call.stage, f"{type(error).__name__}: {error}") from error
+        delay = self.backoff(call.retries)
+        call.retries += 1
+        print(f"{call.stage} 调用失败，{delay:.2f} 秒后第 {call.retries} 次重试: {type(error).__name__}: {error}")
+        return delay
+
+    async def run(self, call, attempt, streaming: bool = False):
+        """在时限内执行 attempt(race) 协程，失败时按退避重试，慢请求按需对冲"""
+        limit = self.deadline_for(call.stage)
+        try:
+            async with asyncio.timeout(limit):
+                while True:
+                    try:
+                        return await self._hedged(call, attempt, streaming)
+                    except Exception as e:
+                        await asyncio.sleep(self._retry_or_raise(call, e))
+        except TimeoutError as e:
+            raise LLMCallError(call.stage, f"超过时限 {limit:g} 秒") from e
+
+    def run_sync(self, call, attempt):
+        """同步版本：只重试，不对冲；时限只约束是否继续重试"""
+        deadline = time.monotonic() + self.deadline_for(call.stage)
+        while True:
+            try:
+                return attempt()
+            except Exception as e:
+                delay = self._retry_or_raise(call, e)
+                if time.monotonic() + delay >= deadline:
+                    raise LLMCallError(call.stage, f"超过时限 {self.deadline_for(call.stage):g} 秒") from e
+                time.sleep(delay)
+
+    async def _hedged(self, call, attempt, streaming: bool):
+        delay = self.hedge_delay(call.stage, call.model, streaming)
+        race = Race()
+        if delay is None:
+            return await attempt(race)
+
+        primary = asyncio.create_task(attempt(race))
+        race.tasks.append(primary)
+        started = asyncio.create_task(race.started.wait())
+        try:
+            # 对冲计时从通过准入开始，排队时间不计入
+            await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=delay)
+            if not primary.done() and race.leader is None:
+                call.hedges += 1
+                race.tasks.append(asyncio.create_task(attempt(race)))
+
+            # 先成功者胜出，全部失败时抛出最先出现的错误；全部被取消时没有可抛出的错误
+            pending = set(race.tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            if error is None:
+                raise LLMCallError(call.stage, "全部请求均被取消")
+            raise error
+        finally:
+            started.cancel()
+            for task in race.tasks:
+                task.cancel()
+            await asyncio.gather(started, *race.tasks, return_exceptions=True)
+
+
+# 进程内共享的默认策略
+resilience_policy = ResiliencePolicy()
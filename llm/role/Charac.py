@@ -1,11 +1,10 @@
 import os
 import asyncio
 from langchain_core.runnables import Runnable
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+from langchain.output_parsers import ResponseSchema
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
 
 
 # --- Configuration Constants ---
@@ -14,17 +13,9 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv(
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class CharacLLM:
-    def __init__(self, system_prompt: str = None):
-        self.system_prompt = system_prompt
-        
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt = self.get_prompt()
-        self.chain = self.get_chain()
-
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
+class CharacLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
 
     def get_output_parser(self):
         response_schemas = [
@@ -38,7 +29,7 @@ class CharacLLM:
             ResponseSchema(
                 name="description", description="A short description of the character", type="string"),
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
 
     def get_prompt(self):
         messages = []
@@ -83,22 +74,11 @@ class CharacLLM:
             format_instructions=self.output_parser.get_format_instructions(),
         )
 
-    def get_chain(self):
-        return self.prompt | self.llm | self.output_parser
-
     def run(self, theme: str = None, background: str = None, personality: str = None):
-        try:
-            return self.chain.invoke({"theme": theme, "background": background, "personality": personality})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return self.invoke({"theme": theme, "background": background, "personality": personality})
 
     async def arun(self, theme: str = None, background: str = None, personality: str = None):
-        try:
-            return await self.chain.ainvoke({"theme": theme, "background": background, "personality": personality})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return await self.ainvoke({"theme": theme, "background": background, "personality": personality})
 
 
 async def main():
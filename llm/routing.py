@@ -0,0 +1,180 @@
+"""按阶段的模型路由
+
+每个阶段（stage_name，如 DreamTrue、SituationC）有一条路由：主模型、备用模型与排队延迟 SLO。
+主模型默认是阶段类上的 model_name（OPENAI_MODEL_NAME / OPENAI_MODEL_NAME_SOTA），路由表只需写要改变的部分：
+
+    {"Ending": {"primary": "gpt-4.1", "fallback": "gpt-4.1-mini", "slo": 3}, "*": {"fallback": "gpt-4.1-mini"}}
+
+- 主模型的排队延迟（准入控制器中等待最久的调用已等待的时间）超过 slo 秒时，新的调用改用备用模型；
+- 主模型的调用在重试后仍失败时，用备用模型再调用一次；
+- 每条路由（阶段, 模型）记录调用次数、失败、输出不符合 schema 的次数、降级与回退次数、耗时分位数，
+  以及 record_quality() 上报的质量评分，用于按阶段权衡成本与延迟。
+
+路由表来自 LLM_ROUTES，或 LLM_ROUTES_PATH 指向的 JSON 文件；文件修改后自动重新加载，无需重启服务。
+"""
+from collections import defaultdict
+import json
+import os
+import threading
+import time
+
+from llm.limiter import get_limiter
+from llm.metrics import registry
+
+
+# --- Configuration Constants ---
+# 按阶段的路由表，"*" 为所有阶段的默认值
+LLM_ROUTES = json.loads(os.getenv("LLM_ROUTES", "{}") or "{}")
+# 路由表文件（格式同 LLM_ROUTES，优先于 LLM_ROUTES），修改后自动重新加载
+LLM_ROUTES_PATH = os.getenv("LLM_ROUTES_PATH", "")
+# 主模型排队延迟超过该秒数时改用备用模型，0 为关闭；路由中的 slo 优先
+LLM_ROUTE_SLO = float(os.getenv("LLM_ROUTE_SLO", 0))
+
+# 检查路由表文件是否修改的最小间隔（秒）
+RELOAD_INTERVAL = 1.0
+
+
+class Route:
+    """一个阶段的路由：主模型、备用模型与排队延迟 SLO（秒，0 为不按延迟降级）"""
+
+    __slots__ = ('stage', 'primary', 'fallback', 'slo')
+
+    def __init__(self, stage: str, primary: str, fallback: str = None, slo: float = 0):
+        self.stage = stage
+        self.primary = primary
+        self.fallback = fallback if fallback != primary else None
+        self.slo = slo
+
+    def to_dict(self) -> dict:
+        return {'stage': self.stage, 'primary': self.primary, 'fallback': self.fallback, 'slo': self.slo}
+
+
+class _RouteStats:
+    __slots__ = ('calls', 'errors', 'invalid', 'downgrades', 'fallbacks', 'quality_sum', 'quality_count')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.invalid = 0
+        self.downgrades = 0
+        self.fallbacks = 0
+        self.quality_sum = 0.0
+        self.quality_count = 0
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ModelRouter:
+    """进程内共享的路由表与按路由的统计"""
+
+    def __init__(self, routes: dict = None, path: str = LLM_ROUTES_PATH, slo: float = LLM_ROUTE_SLO):
+        self.path = path
+        self.slo = slo
+        self._routes = dict(LLM_ROUTES if routes is None else routes)
+        self._stats = defaultdict(_RouteStats)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+
+    def _reload(self):
+        """路由表文件修改后重新加载；文件不存在或格式错误时保留当前路由表"""
+        now = time.monotonic()
+        if not self.path or now - self._checked < RELOAD_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding='utf-8') as f:
+                routes = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载路由表 {self.path} 失败: {e}")
+            return
+        with self._lock:
+            self._routes = routes
+            self._mtime = mtime
+        print(f"已加载路由表 {self.path}: {len(routes)} 条")
+
+    def update(self, routes: dict):
+        """在运行时替换路由表（直到路由表文件再次修改）"""
+        with self._lock:
+            self._routes = dict(routes)
+
+    def route(self, stage: str, default_model: str) -> Route:
+        """阶段的路由；路由表中未写的部分取 "*" 的设置，主模型最终默认为 default_model"""
+        self._reload()
+        with self._lock:
+            config = {**self._routes.get('*', {}), **self._routes.get(stage, {})}
+        return Route(
+            stage,
+            primary=config.get('primary') or default_model,
+            fallback=config.get('fallback'),
+            slo=float(config.get('slo', self.slo)),
+        )
+
+    def select(self, route: Route) -> str:
+        """本次调用使用的模型：主模型排队超过 SLO 且备用模型排队更短时降级为备用模型"""
+        if route.fallback is None or not route.slo:
+            return route.primary
+        waited = get_limiter(route.primary).queue_latency()
+        if waited <= route.slo or get_limiter(route.fallback).queue_latency() >= waited:
+            return route.primary
+        with self._lock:
+            self._stats[(route.stage, route.fallback)].downgrades += 1
+        print(f"{route.stage}: {route.primary} 已排队 {waited:.2f} 秒（SLO {route.slo:g} 秒），改用 {route.fallback}")
+        return route.fallback
+
+    def record(self, stage: str, model: str, error: Exception = None, fallback: bool = False):
+        """记录一次经过该路由的调用（fallback 表示主模型失败后的回退调用）"""
+        with self._lock:
+            stats = self._stats[(stage, model)]
+            stats.calls += 1
+            stats.errors += error is not None
+            stats.fallbacks += fallback
+
+    def record_invalid(self, stage: str, model: str):
+        """记录一次输出不符合 schema（解析失败）的请求"""
+        with self._lock:
+            self._stats[(stage, model)].invalid += 1
+
+    def record_quality(self, stage: str, model: str, score: float):
+        """上报一次输出的质量评分（如人工或离线评测给出的 0-1 分）"""
+        with self._lock:
+            stats = self._stats[(stage, model)]
+            stats.quality_sum += score
+            stats.quality_count += 1
+
+    def stats(self) -> list:
+        """各路由（阶段, 模型）的调用、失败、降级与回退次数、耗时分位数与平均质量评分"""
+        with self._lock:
+            items = [(key, stats.to_dict()) for key, stats in self._stats.items()]
+        rows = []
+        for (stage, model), stats in sorted(items):
+            rows.append({
+                'stage': stage,
+                'model': model,
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'invalid': stats['invalid'],
+                'downgrades': stats['downgrades'],
+                'fallbacks': stats['fallbacks'],
+                'latency_p50': registry.latency_quantile(stage, model, 0.5),
+                'latency_p95': registry.latency_quantile(stage, model, 0.95),
+                'quality': stats['quality_sum'] / stats['quality_count'] if stats['quality_count'] else None,
+            })
+        return rows
+
+    def table(self) -> dict:
+        self._reload()
+        with self._lock:
+            return dict(self._routes)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# 进程内共享的路由器
+router = ModelRouter()
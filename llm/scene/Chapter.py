@@ -0,0 +1,299 @@
+from langchain.output_parsers import ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+from llm.prompting import story_prompt
+import asyncio
+import os
+import threading
+
+
+# --- Configuration Constants ---
+DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-mini")
+# 最后一章的情景描述（故事高潮）使用更强的模型
+CLIMAX_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME_SOTA", "gpt-4.1-mini")
+DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
+
+# 一章的三个步骤：情景描述、玩家的选项、选择的结果；SCENE 在一次调用中生成情景描述与选项
+SITUATION, OPTIONS, RESULT, SCENE = 'SITUATION', 'OPTIONS', 'RESULT', 'SCENE'
+
+# 章节在故事中的作用：第一章为相遇，最后一章为高潮，其余为中间章节
+OPENING, MIDDLE, CLIMAX = 'OPENING', 'MIDDLE', 'CLIMAX'
+
+STORY_PROGRESS = """
+<story_progress description="故事进展">
+    <story_summary description="更早情境的概要">{story_summary}</story_summary>
+    <prev_situation_description description="上一情境">{prev_situation_description}</prev_situation_description>
+    <prev_situation_options_choice description="上一情境的选项">{prev_situation_options_choice}</prev_situation_options_choice>
+    <prev_situation_result description="上一情境的结果">{prev_situation_result}</prev_situation_result>
+"""
+
+# 各步骤的提示词在所有章节间共享，章节相关的任务通过 {chapter_task} 传入
+PART_TEMPLATES = {
+    SITUATION: STORY_PROGRESS + """</story_progress>
+
+<task>
+{chapter_task}
+</task>
+""",
+    OPTIONS: STORY_PROGRESS + """    <current_situation_description description="当前情境">{current_situation_description}</current_situation_description>
+</story_progress>
+
+<task>
+{chapter_task}
+</task>
+""",
+    RESULT: STORY_PROGRESS + """    <current_situation_description description="当前情境">{current_situation_description}</current_situation_description>
+    <current_situation_options_choice description="当前情境的选项">{current_situation_options_choice}</current_situation_options_choice>
+</story_progress>
+
+<task>
+{chapter_task}
+</task>
+""",
+    SCENE: STORY_PROGRESS + """</story_progress>
+
+<task>
+{chapter_task}
+</task>
+""",
+}
+
+PART_SCHEMAS = {
+    SITUATION: [
+        ResponseSchema(name="description", description="Paragraph that describes the situation"),
+    ],
+    OPTIONS: [
+        ResponseSchema(name="CHOICE_A", description="One sentence description of the choice a"),
+        ResponseSchema(name="CHOICE_B", description="One sentence description of the choice b"),
+        ResponseSchema(name="CHOICE_C", description="One sentence description of the choice c"),
+    ],
+    RESULT: [
+        ResponseSchema(name="result", description="Paragragh that describes the result of the situation after the choice by the player"),
+    ],
+}
+# 情景描述在前、选项在后：描述可以边生成边流式输出，选项参考已写出的描述
+PART_SCHEMAS[SCENE] = PART_SCHEMAS[SITUATION] + PART_SCHEMAS[OPTIONS]
+
+PART_STREAM_FIELDS = {SITUATION: "description", OPTIONS: None, RESULT: "result", SCENE: "description"}
+
+# 各作用的章节在每个步骤中的任务
+CHAPTER_TASKS = {
+    (OPENING, SITUATION): """
+<goal>
+通过Player (使魔)视角，展开描述NPC与一个神秘使魔首次相遇的情境。开篇应该描述Player (使魔)的醒来 (例如：从黑暗中醒来，映入眼帘的是...)，其后NPC基于自身动机和Player (使魔)展开对话。
+NPC的动机：想要让Player (使魔)帮助自己实现愿望，向Player (使魔)描述自己知道的现状后，询问Player (使魔)的见解。
+</goal>
+<current_situation_background>
+NPC无意间触发了魔法，将player (使魔)召唤到她的世界，希望player能实现她的愿望。
+"魔法"设定: 无条件让人物获得召唤男使魔的能力。据说他能够超越时空，帮召唤者实现愿望。然而，并没有可靠的依据。
+</current_situation_background>
+<example>
+从黑暗中醒来，映入眼帘的是一幅奇幻的景象。
+巨大到无法想象的水晶洞窟中，四处都映射着七彩的光芒，眼前出现了一位少女，带着疑惑的神情。
+”你就是使魔吗？真是不可思议，看上去普普通通，凭空出现在这里。“少女向我伸出手，将我从地上拉起。
+美丽的少女，拥有异常美丽的眼睛，眼瞳中闪烁着柔和的蓝光，如同蓝宝石。
+“我说，你能实现我的愿望，对吧？”她望着我，急切地开口。“现在，我希望采集一种罕见的材料，但在这个洞窟里迷路了，你能不能帮我一把，带我离开这里？”
+...
+</example>
+<constraints>
+1. NPC不能表现出知道也绝对不能说出真实愿望 (`dream_true`)、真实条件 (`condition_true`)和表面条件 (`condition_fake`)，只能说出她计划针对表面愿望 (`dream_fake`)做什么.
+2. 不能照抄`example`，但必须学习风格.
+2. 使用有限全知视角描述故事.
+3. 至少生成200字.
+4. 基于主题(`theme`)、背景(`background`)、人物设定(`character`)、达成真实愿望的条件(`condition_true`)、达成表面愿望的条件(`condition_fake`)，描述NPC与一个神秘使魔首次相遇的情境.
+</constraints>
+""",
+    (OPENING, OPTIONS): """
+<goal>
+在NPC与Player (使魔)相遇的情境中，从Player (使魔)的角度出发，以第一人称生成可能的行动选项.
+1. CHOICE_A: 这个选项看上去应该出人意料，但其实能促进表面条件 (`condition_fake`)的实现.
+2. CHOICE_B: 这个选项看上去应该出人意料，但其实能促进真实条件 (`condition_true`)的实现.
+3. CHOICE_C: 它应该导向荒诞滑稽可笑的事件发展，不能明确地推动任何一个条件的实现。
+</goal>
+<constraints>
+1. 绝对不能照抄`condition_true`与`condition_fake`.
+2. 使用有限全知视角描述故事，Player (使魔)不知道真实愿望 (`dream_true`)、表面愿望 (`dream_fake`)、真实条件 (`condition_true`)和表面条件 (`condition_fake`)，只能得到现状 (`current_situation_description`)中NPC提供的信息.
+3. 基于当前情境(`current_situation_description`)，生成使魔的对话选项。
+4. 使魔的对话选项CHOICE_A和CHOICE_B应该以微妙但明确的方式推动NPC走向他们的愿望或条件的满足。
+</constraints>
+""",
+    (OPENING, RESULT): """
+<goal>
+根据游戏信息(`game_information`)，描述NPC听从了Player (使魔)的对话选项后的即时结果或后果.
+这个结果应该自然地由所选选项引出，并暗示其对NPC实现愿望路径的影响.
+</goal>
+<constraints>
+1. NPC设定必须符合基本人物特性.
+2. 只需包含一句话的简要特征描述.
+</constraints>
+""",
+    (MIDDLE, SITUATION): """
+<goal>
+基于游戏信息(`game_information`)，描述NPC与一位希望帮助他们的友人角色互动的场景。
+这位友人提供了一些建议或帮助。使魔在一旁观察，思考如何应对。
+</goal>
+""",
+    (MIDDLE, OPTIONS): """
+<goal>
+在NPC与友人互动的情境中，生成使魔提议的操作选项。使魔的这个操作将巧妙地支持NPC走向他们的真实愿望或其条件，即使这需要努力或风险。
+1. CHOICE_A: 这个操作应该看起来有帮助或合乎逻辑，但实际上会导致误入歧途。
+2. CHOICE_B: 这个操作将巧妙地**支持NPC走向他们的真实愿望**或其条件，即使这需要努力或风险。
+3. CHOICE_C: 它应该导致一个中立、复杂或无关紧要的结果，不能明确地推动任何一个目标的实现。
+</goal>
+""",
+    (MIDDLE, RESULT): """
+<goal>
+根据游戏信息(`game_information`)，描述NPC选择了使魔的对话选项后的即时结果或后果.
+这个结果应该自然地由所选选项引出，并暗示其对NPC实现愿望路径的影响.
+</goal>
+""",
+    (CLIMAX, SITUATION): """
+<goal>
+描述NPC与一个试图阻碍其进展的对立角色相遇的情景。
+使魔在一旁观察，思考如何应对。
+</goal>
+""",
+    (CLIMAX, OPTIONS): """
+<goal>
+在NPC与对立角色对峙的情境中，生成使魔提议的操作选项。
+使魔的这个操作将巧妙地支持NPC走向他们的真实愿望或其条件，即使这需要努力或风险。
+1. CHOICE_A: 这个操作应该看起来像一个巧妙的反击，但有隐藏的负面后果。
+2. CHOICE_B: 这个操作应该对真实路径产生明确的积极影响。
+3. CHOICE_C: 它应该导致一个混乱、意外或无关紧要的结果，不能明确解决或推动任何一个目标的实现。
+</goal>
+""",
+    (CLIMAX, RESULT): """
+<goal>
+根据游戏信息(`game_information`)，描述NPC选择了使魔的对话选项后的即时结果或后果。
+这个结果应该自然地由所选选项引出，并暗示其对NPC实现愿望路径的影响。
+</goal>
+""",
+}
+
+
+SCENE_TASK = """
+<situation_task description="第一步：情境描述 (description)">
+%s
+</situation_task>
+<options_task description="第二步：选项 (CHOICE_A / CHOICE_B / CHOICE_C)">
+%s
+</options_task>
+<scene_constraints>
+1. 先完成第一步，写出情境描述(`description`)；再基于刚写出的情境描述完成第二步.
+2. 第二步中的当前情境(`current_situation_description`)即为第一步写出的`description`.
+</scene_constraints>
+"""
+
+for _role in (OPENING, MIDDLE, CLIMAX):
+    CHAPTER_TASKS[(_role, SCENE)] = SCENE_TASK % (CHAPTER_TASKS[(_role, SITUATION)].strip(), CHAPTER_TASKS[(_role, OPTIONS)].strip())
+del _role
+
+
+def chapter_role(index: int, chapters: int) -> str:
+    if index == 0:
+        return OPENING
+    if index == chapters - 1:
+        return CLIMAX
+    return MIDDLE
+
+
+# (步骤, system_prompt) → (输出解析器, 提示词)，所有章节共享
+_shared_parts = {}
+_shared_parts_lock = threading.Lock()
+
+
+class ChapterLLM(BaseStoryLLM):
+    """第 index 章（共 chapters 章）的一个步骤：情景描述、选项或选择的结果，或一次生成情景描述与选项（SCENE）
+
+    同一步骤的提示词与解析器在所有章节间共享，只在首次使用时构造一次；章节相关的任务文本、
+    上一章的完整内容和更早章节的滚动概要作为输入传入，提示词长度不随章节数增长。
+    阶段名沿用 SituationA / SituationAOpt / SituationAResult 等，指标与按阶段的配置保持不变；SCENE 为 SituationAScene 等。
+    """
+
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
+    def __init__(self, part: str = SITUATION, index: int = 0, chapters: int = 3, system_prompt: str = None):
+        assert part in PART_TEMPLATES, f"part must be one of {list(PART_TEMPLATES)}"
+        assert 0 <= index < chapters, "index must be in [0, chapters)"
+        self.part = part
+        self.index = index
+        self.role = chapter_role(index, chapters)
+        self.stream_field = PART_STREAM_FIELDS[part]
+        if part in (SITUATION, SCENE) and self.role == CLIMAX:
+            self.model_name = CLIMAX_OPENAI_MODEL_NAME
+
+        super().__init__(system_prompt=system_prompt)
+
+    @property
+    def stage_name(self):
+        label = chr(ord('A') + self.index)
+        return f"Situation{label}" + {SITUATION: "", OPTIONS: "Opt", RESULT: "Result", SCENE: "Scene"}[self.part]
+
+    def _shared(self):
+        key = (self.part, self.system_prompt)
+        shared = _shared_parts.get(key)
+        if shared is None:
+            output_parser = StoryOutputParser.from_response_schemas(PART_SCHEMAS[self.part])
+            shared = (output_parser, story_prompt(self.system_prompt, PART_TEMPLATES[self.part], output_parser))
+            with _shared_parts_lock:
+                shared = _shared_parts.setdefault(key, shared)
+        return shared
+
+    def get_output_parser(self):
+        return self._shared()[0]
+
+    def get_prompt(self):
+        return self._shared()[1]
+
+    def inputs(self, theme: str, background: str, personality: str, character: str, dream_true: str, dream_fake: str, condition_true: str, condition_fake: str, story_summary: str = '', prev_situation_description: str = '', prev_situation_options_choice: str = '', prev_situation_result: str = '', current_situation_description: str = '', current_situation_options_choice: str = '') -> dict:
+        return {
+            "theme": theme,
+            "background": background,
+            "personality": personality,
+            "character": character,
+            "dream_true": dream_true,
+            "dream_fake": dream_fake,
+            "condition_true": condition_true,
+            "condition_fake": condition_fake,
+            "story_summary": story_summary,
+            "prev_situation_description": prev_situation_description,
+            "prev_situation_options_choice": prev_situation_options_choice,
+            "prev_situation_result": prev_situation_result,
+            "current_situation_description": current_situation_description,
+            "current_situation_options_choice": current_situation_options_choice,
+            "chapter_task": CHAPTER_TASKS[(self.role, self.part)],
+        }
+
+    def run(self, **kwargs):
+        return self.invoke(self.inputs(**kwargs))
+
+    async def arun(self, on_delta=None, **kwargs):
+        return await self.ainvoke(self.inputs(**kwargs), on_delta=on_delta)
+
+
+async def main():
+    from prompt_config import SYSTEM_PROMPT
+
+    game_information = dict(
+        theme="科幻",
+        background="未来世界",
+        personality="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
+        character="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
+        dream_true="想要实现一个能够改变世界的愿望",
+        dream_fake="想要实现一个能够改变世界的愿望",
+        condition_true="想要实现一个能够改变世界的愿望",
+        condition_fake="想要实现一个能够改变世界的愿望",
+    )
+    chapter_b_llm = ChapterLLM(SITUATION, index=1, chapters=3, system_prompt=SYSTEM_PROMPT)
+    result = await chapter_b_llm.arun(
+        **game_information,
+        prev_situation_description="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
+        prev_situation_options_choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
+        prev_situation_result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
+    )
+    print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
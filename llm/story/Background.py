@@ -1,9 +1,8 @@
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from langchain.output_parsers import ResponseSchema
 from langchain_core.runnables import Runnable
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
 
 import asyncio
 import os
@@ -14,23 +13,15 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-mini")
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class BackgroundLLM:
-    def __init__(self, system_prompt: str = None):
-        self.system_prompt = system_prompt
-        
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt = self.get_prompt()
-        self.chain = self.get_chain()
-        
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
-    
+class BackgroundLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
     def get_output_parser(self):
         response_schemas = [
             ResponseSchema(name="background", description="Paragraph that describes the background of the game.", type="string")
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
     
     def get_prompt(self):
         # 如果有system_prompt，创建system message
@@ -74,24 +65,12 @@ class BackgroundLLM:
             format_instructions=self.output_parser.get_format_instructions()
         )
         
-    def get_chain(self):
-        return self.prompt | self.llm | self.output_parser
-    
-    
     def run(self, theme: str = None):
-        try:
-            return self.chain.invoke({"theme": theme})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return self.invoke({"theme": theme})
         
     
     async def arun(self, theme: str = None):
-        try:
-            return await self.chain.ainvoke({"theme": theme})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return await self.ainvoke({"theme": theme})
 
 
 async def main():
@@ -1,9 +1,8 @@
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from langchain.output_parsers import ResponseSchema
 from langchain_core.runnables import Runnable
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
 
 import asyncio
 import os
@@ -14,28 +13,27 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME_SOTA", "gpt-4.1-mini")
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class ConditionLLM:
+class ConditionLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
     def __init__(self, type: str = 'TRUE', system_prompt: str = None):
-        self.system_prompt = system_prompt
-        
         assert type in ['TRUE', 'FAKE'], "type must be 'TRUE' or 'FAKE'"
         self.type = type.upper()
         
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt = self.get_prompt(type=self.type)
-        self.chain = self.get_chain()
+        super().__init__(system_prompt=system_prompt)
+
+    @property
+    def stage_name(self):
+        return f'Condition{self.type.title()}'
         
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
-    
     def get_output_parser(self):
         response_schemas = [
             ResponseSchema(name="condition", description="Paragraph that describes the condition of reaching the dream", type="string")
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
     
-    def get_prompt(self, type: str = 'TRUE'):
+    def get_prompt(self):
         LABELS = {
             'TRUE': "真实愿望",
             'FAKE': "表面愿望",
@@ -82,27 +80,16 @@ class ConditionLLM:
         
         return chat_prompt.partial(
             format_instructions=self.output_parser.get_format_instructions(),
-            dream_type=LABELS[type],
+            dream_type=LABELS[self.type],
         )
     
 
-    def get_chain(self):
-        return self.prompt | self.llm | self.output_parser
-    
     def run(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream: str = '想要实现一个能够改变世界的愿望'):
-        try:
-            return self.chain.invoke({"theme": theme, "background": background, "character": character, "dream": dream})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return self.invoke({"theme": theme, "background": background, "character": character, "dream": dream})
         
     
     async def arun(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream: str = '想要实现一个能够改变世界的愿望'):
-        try:
-            return await self.chain.ainvoke({"theme": theme, "background": background, "character": character, "dream": dream})
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        return await self.ainvoke({"theme": theme, "background": background, "character": character, "dream": dream})
 
 
 async def main():
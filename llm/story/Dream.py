@@ -1,9 +1,8 @@
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from langchain.output_parsers import ResponseSchema
 from langchain_core.runnables import Runnable
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
 
 import asyncio
 import os
@@ -14,26 +13,30 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME_SOTA", "gpt-4.1-mini")
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class DreamLLM:
-    def __init__(self, system_prompt: str = None):
-        self.system_prompt = system_prompt
+class DreamLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
+    def __init__(self, type: str = 'TRUE', system_prompt: str = None):
+        assert type in ['TRUE', 'FAKE'], "type must be 'TRUE' or 'FAKE'"
+        self.type = type.upper()
         
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt_true = self.get_prompt_true()
-        self.prompt_fake = self.get_prompt_fake()
-        self.chain_true = self.get_chain_true()
-        self.chain_fake = self.get_chain_fake()
+        super().__init__(system_prompt=system_prompt)
+
+    @property
+    def stage_name(self):
+        # 真实与表面梦境分别统计耗时，各自的对冲阈值与时限互不干扰
+        return f'Dream{self.type.title()}'
         
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
-    
     def get_output_parser(self):
         response_schemas = [
             ResponseSchema(name="dream", description="Paragraph that describes the dream of the NPC")
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
     
+    def get_prompt(self):
+        return self.get_prompt_true() if self.type == 'TRUE' else self.get_prompt_fake()
+
     def get_prompt_true(self):
         messages = []
         
@@ -136,42 +139,18 @@ class DreamLLM:
         )
     
     
-    def get_chain_true(self):
-        return self.prompt_true | self.llm | self.output_parser
-    
-    
-    def get_chain_fake(self):
-        return self.prompt_fake | self.llm | self.output_parser
-    
-    
-    def run(self, type: str = 'TRUE', theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream_true: str = '想要实现一个能够改变世界的愿望'):
-        assert type in ['TRUE', 'FAKE']
-        
-        try:
-            if type == 'TRUE':
-                return self.chain_true.invoke({"theme": theme, "background": background, "character": character})
-            elif type == 'FAKE':
-                return self.chain_fake.invoke({"theme": theme, "background": background, "character": character, "dream_true": dream_true})
-            else:
-                raise ValueError(f"Invalid type: {type}")
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+    def run(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream_true: str = '想要实现一个能够改变世界的愿望'):
+        return self.invoke(self._inputs(theme, background, character, dream_true))
         
     
-    async def arun(self, type: str = 'TRUE', theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream_true: str = '想要实现一个能够改变世界的愿望'):
-        assert type in ['TRUE', 'FAKE']
-        
-        try:
-            if type == 'TRUE':
-                return await self.chain_true.ainvoke({"theme": theme, "background": background, "character": character})
-            elif type == 'FAKE':
-                return await self.chain_fake.ainvoke({"theme": theme, "background": background, "character": character, "dream_true": dream_true})
-            else:
-                raise ValueError(f"Invalid type: {type}")
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+    async def arun(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。', dream_true: str = '想要实现一个能够改变世界的愿望'):
+        return await self.ainvoke(self._inputs(theme, background, character, dream_true))
+
+    def _inputs(self, theme, background, character, dream_true):
+        inputs = {"theme": theme, "background": background, "character": character}
+        if self.type == 'FAKE':
+            inputs["dream_true"] = dream_true
+        return inputs
         
 
 async def main():
@@ -197,9 +176,8 @@ async def main():
     </response_constraints>
     """
     
-    dream_llm = DreamLLM(system_prompt=SYSTEM_PROMPT)
-    result_true = await dream_llm.arun(type='TRUE')
-    result_fake = await dream_llm.arun(type='FAKE', dream_true=result_true)
+    result_true = await DreamLLM(type='TRUE', system_prompt=SYSTEM_PROMPT).arun()
+    result_fake = await DreamLLM(type='FAKE', system_prompt=SYSTEM_PROMPT).arun(dream_true=result_true['dream'])
     print('真实愿望:')
     print(result_true)
     print('表面愿望:')
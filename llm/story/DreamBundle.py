@@ -0,0 +1,100 @@
+from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain.output_parsers import ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+
+import asyncio
+import os
+
+
+# --- Configuration Constants ---
+DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME_SOTA", "gpt-4.1-mini")
+DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
+
+
+class DreamBundleLLM(BaseStoryLLM):
+    """一次结构化调用同时生成真实愿望、表面愿望及两者的达成条件
+
+    代替 DreamLLM ×2 与 ConditionLLM ×2 的四次调用；字段按依赖顺序输出，
+    后面的字段（表面愿望、条件）在同一次生成中参考前面已写出的内容。
+    """
+
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
+    def get_output_parser(self):
+        response_schemas = [
+            ResponseSchema(name="dream_true", description="Paragraph that describes the true dream of the NPC", type="string"),
+            ResponseSchema(name="dream_fake", description="Paragraph that describes the fake dream of the NPC", type="string"),
+            ResponseSchema(name="condition_true", description="Paragraph that describes the condition of reaching the true dream", type="string"),
+            ResponseSchema(name="condition_fake", description="Paragraph that describes the condition of reaching the fake dream", type="string"),
+        ]
+        return StoryOutputParser.from_response_schemas(response_schemas)
+
+    def get_prompt(self):
+        messages = []
+
+        if self.system_prompt:
+            system_template = SystemMessagePromptTemplate.from_template(self.system_prompt)
+            messages.append(system_template)
+
+        human_template = """
+        <format_instructions>{format_instructions}</format_instructions>
+
+        <task>
+        <goal>
+        基于游戏信息(`game_information`)，为NPC依次生成“真实愿望”(`dream_true`)、“表面愿望”(`dream_fake`)，以及达成两个愿望的条件(`condition_true`、`condition_fake`).
+        </goal>
+        <game_information description="游戏信息">
+            <theme description="游戏主题">{theme}</theme>
+            <background description="游戏背景">{background}</background>
+            <character description="游戏NPC">{character}</character>
+        </game_information>
+        <workflow>
+        1. dream_true: 结合输入的主题(`theme`)、背景(`background`)和人物设定(`character`)，为人物设想一个困境，这个困境是深沉和重大的，影响NPC非常看重的东西. 从困境的角度出发，采用逆向思维，思考NPC为了解决难题想怎么做. 比如说，NPC可能想改变某个通常无法改变的元素，或者从不寻常的因果关系入手解决问题. 实现它非常困难，但能彻底摆脱困境. 从人物的视角出发，用一句话描述这个愿望.
+        2. dream_fake: 思考NPC无法实现真实愿望(`dream_true`)时，会引发什么难题；采用逆向思维，思考NPC为了解决难题想采用什么独特的行动. 独特行动必须无法实现人物的真实愿望. 从人物的视角出发，将人物想要采取的独特行动用一句话描述为人物的愿望.
+        3. condition_true: 结合主题、背景、人物设定和真实愿望(`dream_true`)，采用逆向思维，思考一个有助于真实愿望实现的条件. 比如说，改变某个通常无法改变的元素，或者引发不寻常的因果关系. 这个条件必须是能渐进式地被满足的. 从人物的视角出发，用一句话描述.
+        4. condition_fake: 按照与第3步相同的方法，为表面愿望(`dream_fake`)设计一个达成条件.
+        </workflow>
+        <other_information>
+        表面愿望的定义是：NPC认为真实愿望难以实现时，妥协后希望实现的愿望，比真实愿望更容易实现，但偏离了真实愿望，显得自暴自弃。
+        例如：真实愿望是”想要让全人类幸福...“，但难以实现，妥协后的表面愿望是：”制造让全人类永远产生幸福幻觉的成瘾药物...“
+        </other_information>
+        <constraints>
+        1. 愿望使用第三人称，各至少生成200字.
+        2. 尽可能发挥想象力.
+        </constraints>
+        </task>
+
+        <response_constraints>
+        1. Use CHINESE to answer!
+        2. Return the result in the format of `format_instructions`!
+        </response_constraints>
+        """
+
+        human_message = HumanMessagePromptTemplate.from_template(human_template)
+        messages.append(human_message)
+
+        chat_prompt = ChatPromptTemplate.from_messages(messages)
+
+        return chat_prompt.partial(
+            format_instructions=self.output_parser.get_format_instructions()
+        )
+
+    def run(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。'):
+        return self.invoke({"theme": theme, "background": background, "character": character})
+
+    async def arun(self, theme: str = '科幻', background: str = '未来世界', character: str = '善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。'):
+        return await self.ainvoke({"theme": theme, "background": background, "character": character})
+
+
+async def main():
+    from prompt_config import SYSTEM_PROMPT
+
+    dream_bundle_llm = DreamBundleLLM(system_prompt=SYSTEM_PROMPT)
+    result = await dream_bundle_llm.arun()
+    print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
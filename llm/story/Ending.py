@@ -1,11 +1,11 @@
 import os
 import asyncio
 from langchain_core.runnables import Runnable
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+from llm.prompting import story_prompt
+from langchain.output_parsers import ResponseSchema
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
 
 
 # --- Configuration Constants ---
@@ -13,28 +13,25 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME_SOTA", "gpt-4.1-mini")
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class EndingLLM:
+class EndingLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+    stream_field = "ending"
+
     def __init__(self, type: str, system_prompt: str = None):
-        self.system_prompt = system_prompt
         assert type in ['NORMAL', 'FAKE', 'TRUE', 'NEITHER',
                         'PARTIAL_FAKE', 'PARTIAL_TRUE', 'MIXED']
 
         self.type = type
 
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt = self.get_prompt()
-        self.chain = self.get_chain()
-
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
+        super().__init__(system_prompt=system_prompt)
 
     def get_output_parser(self):
         response_schemas = [
             ResponseSchema(
                 name="ending", description="Paragraph that describes the ending of the story based on the game information", type="string")
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
 
     def get_prompt(self):
         prompt_tasks = {
@@ -47,131 +44,67 @@ class EndingLLM:
             "MIXED": "",
         }
 
-        prompt_template = """
-        <system>{system_prompt}</system>
-        
-        <format_instructions>{format_instructions}</format_instructions>
-        
-        <game_information>
-            <personality>{personality}</personality>
-            <character>{character}</character>
-            <dream_true>{dream_true}</dream_true>
-            <dream_fake>{dream_fake}</dream_fake>
-            <condition_true>{condition_true}</condition_true>
-            <condition_fake>{condition_fake}</condition_fake>
-            <situation_a>
-                <description>{situation_a_description}</description>
-                <options_choice>{situation_a_options_choice}</options_choice>
-                <result>{situation_a_result}</result>
-            </situation_a>
-            <situation_b>
-                <description>{situation_b_description}</description>
-                <options_choice>{situation_b_options_choice}</options_choice>
-                <result>{situation_b_result}</result>
-            </situation_b>
-            <situation_c>
-                <description>{situation_c_description}</description>
-                <options_choice>{situation_c_options_choice}</options_choice>
-                <result>{situation_c_result}</result>
-            </situation_c>
-        </game_information>
+        task = """
+        <story_progress description="故事进展">
+            <story_summary description="更早情境的概要">{story_summary}</story_summary>
+            <recent_situations description="最近情境的完整内容">
+            {situations}
+            </recent_situations>
+        </story_progress>
 
         <task>
-        基于NPC的旅程，他们的选择主要导致了{task_by_type} (累计真实愿望加成 >= 3），描述叙事的结局。
+        基于NPC的旅程，他们的选择主要导致了%s (累计真实愿望加成 >= 3），描述叙事的结局。
         结局应该反映深刻的满足感、个人成长以及与真实灵魂相符的深切满足感，即使这条道路充满挑战。
         </task>
 
         <constraints>
-        1. Based on the information in `game_information`.
-        2. Use Chinese to answer.
-        3. Return the result in the format of `format_instructions`.
+        1. Based on the information in `game_information` and `story_progress`.
         </constraints>
-        """
-
-        return PromptTemplate(
-            template=prompt_template,
-            input_variables=[
-                "personality", "character", "dream_true", "dream_fake", "condition_true", "condition_fake", "situation_a_description", "situation_a_options_choice", "situation_a_result", "situation_b_description", "situation_b_options_choice", "situation_b_result", "situation_c_description", "situation_c_options_choice", "situation_c_result"
-            ],
-            partial_variables={
-                "format_instructions": self.output_parser.get_format_instructions(),
-                "task_by_type": prompt_tasks[self.type],
-                "system_prompt": self.system_prompt,
-            },
-            validate_template=False
-        )
-
-
-    def get_chain(self):
-        return self.prompt | self.llm | self.output_parser
-
-
-    def run(self, personality: str, character: str, dream_true: str, dream_fake: str, condition_true: str, condition_fake: str, situation_a_description: str, situation_a_options_choice: str, situation_a_result: str, situation_b_description: str, situation_b_options_choice: str, situation_b_result: str, situation_c_description: str, situation_c_options_choice: str, situation_c_result: str):
-        try:
-            return self.chain.invoke({
-                "personality": personality,
-                "character": character,
-                "dream_true": dream_true,
-                "dream_fake": dream_fake,
-                "condition_true": condition_true,
-                "condition_fake": condition_fake,
-                "situation_a_description": situation_a_description,
-                "situation_a_options_choice": situation_a_options_choice,
-                "situation_a_result": situation_a_result,
-                "situation_b_description": situation_b_description,
-                "situation_b_options_choice": situation_b_options_choice,
-                "situation_b_result": situation_b_result,
-                "situation_c_description": situation_c_description,
-                "situation_c_options_choice": situation_c_options_choice,
-                "situation_c_result": situation_c_result,
-            })
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
-
-
-    async def arun(self, personality: str, character: str, dream_true: str, dream_fake: str, condition_true: str, condition_fake: str, situation_a_description: str, situation_a_options_choice: str, situation_a_result: str, situation_b_description: str, situation_b_options_choice: str, situation_b_result: str, situation_c_description: str, situation_c_options_choice: str, situation_c_result: str):
-        try:
-            return await self.chain.ainvoke({
-                "personality": personality,
-                "character": character,
-                "dream_true": dream_true,
-                "dream_fake": dream_fake,
-                "condition_true": condition_true,
-                "condition_fake": condition_fake,
-                "situation_a_description": situation_a_description,
-                "situation_a_options_choice": situation_a_options_choice,
-                "situation_a_result": situation_a_result,
-                "situation_b_description": situation_b_description,
-                "situation_b_options_choice": situation_b_options_choice,
-                "situation_b_result": situation_b_result,
-                "situation_c_description": situation_c_description,
-                "situation_c_options_choice": situation_c_options_choice,
-                "situation_c_result": situation_c_result,
-            })
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+        """ % prompt_tasks[self.type]
+
+        return story_prompt(self.system_prompt, task, self.output_parser)
+
+
+    def inputs(self, theme: str, background: str, personality: str, character: str, dream_true: str, dream_fake: str, condition_true: str, condition_fake: str, situations: str, story_summary: str = '') -> dict:
+        return {
+            "theme": theme,
+            "background": background,
+            "personality": personality,
+            "character": character,
+            "dream_true": dream_true,
+            "dream_fake": dream_fake,
+            "condition_true": condition_true,
+            "condition_fake": condition_fake,
+            "situations": situations,
+            "story_summary": story_summary,
+        }
+
+    def run(self, **kwargs):
+        return self.invoke(self.inputs(**kwargs))
+
+    async def arun(self, on_delta=None, **kwargs):
+        return await self.ainvoke(self.inputs(**kwargs), on_delta=on_delta)
 
 
 async def main():
+    from story_state import Chapter
+
     ending_llm = EndingLLM(type="NORMAL")
     result = await ending_llm.arun(
+        theme="科幻",
+        background="未来世界",
         personality="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
         character="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
         dream_true="想要实现一个能够改变世界的愿望",
         dream_fake="想要实现一个能够改变世界的愿望",
         condition_true="想要实现一个能够改变世界的愿望",
         condition_fake="想要实现一个能够改变世界的愿望",
-        situation_a_description="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
-        situation_a_options_choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
-        situation_a_result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
-        situation_b_description="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
-        situation_b_options_choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
-        situation_b_result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
-        situation_c_description="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
-        situation_c_options_choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
-        situation_c_result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
+        story_summary="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法，NPC听从了使魔的建议。",
+        situations=Chapter(
+            situation="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
+            choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
+            result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
+        ).render('C'),
     )
     print(result)
 
@@ -0,0 +1,100 @@
+from langchain.output_parsers import ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+from llm.prompting import story_prompt
+import asyncio
+import os
+
+
+# --- Configuration Constants ---
+DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-mini")
+DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_LOW", 0.1))
+# 故事记忆的目标字数
+STORY_MEMORY_CHARS = int(os.getenv("STORY_MEMORY_CHARS", 300))
+
+
+class MemoryLLM(BaseStoryLLM):
+    """故事记忆：把刚完成的一章并入此前的滚动摘要
+
+    之后的情景与结局以这份摘要代替更早章节的完整内容，提示词长度不随章节数增长。
+    提示词同样以 game_information 开头，与情景共享可缓存的前缀。
+    """
+
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
+
+    def get_output_parser(self):
+        response_schemas = [
+            ResponseSchema(name="memory", description="Summary of the whole story so far", type="string")
+        ]
+        return StoryOutputParser.from_response_schemas(response_schemas)
+
+    def get_prompt(self):
+        task = """
+        <story_progress description="故事进展">
+            <story_memory description="此前全部情境的摘要">{story_memory}</story_memory>
+            <situation_description description="刚完成的情境">{situation_description}</situation_description>
+            <situation_options_choice description="玩家的选择">{situation_options_choice}</situation_options_choice>
+            <situation_result description="选择的结果">{situation_result}</situation_result>
+        </story_progress>
+
+        <task>
+        <goal>
+        把刚完成的情境并入此前的摘要 (`story_memory`)，得到截至目前整个故事的新摘要，供之后的情境与结局参考.
+        </goal>
+        <constraints>
+        1. 保留推动故事的关键事件、出场角色、Player (使魔)的选择及其对真实愿望与表面愿望的影响，省略环境描写与对话细节.
+        2. 按时间顺序叙述，使用第三人称.
+        3. 不超过{max_chars}字.
+        </constraints>
+        </task>
+        """
+
+        return story_prompt(self.system_prompt, task, self.output_parser)
+
+    def inputs(self, theme: str, background: str, personality: str, character: str, dream_true: str, dream_fake: str, condition_true: str, condition_fake: str, situation_description: str, situation_options_choice: str, situation_result: str, story_memory: str = '') -> dict:
+        return {
+            "theme": theme,
+            "background": background,
+            "personality": personality,
+            "character": character,
+            "dream_true": dream_true,
+            "dream_fake": dream_fake,
+            "condition_true": condition_true,
+            "condition_fake": condition_fake,
+            "story_memory": story_memory,
+            "situation_description": situation_description,
+            "situation_options_choice": situation_options_choice,
+            "situation_result": situation_result,
+            "max_chars": STORY_MEMORY_CHARS,
+        }
+
+    def run(self, **kwargs):
+        return self.invoke(self.inputs(**kwargs))
+
+    async def arun(self, **kwargs):
+        return await self.ainvoke(self.inputs(**kwargs))
+
+
+async def main():
+    from prompt_config import SYSTEM_PROMPT
+
+    memory_llm = MemoryLLM(system_prompt=SYSTEM_PROMPT)
+    result = await memory_llm.arun(
+        theme="科幻",
+        background="未来世界",
+        personality="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
+        character="善良和美丽的少女，但同时具有一个正面的性格特性和高度负面的性格特性。",
+        dream_true="想要实现一个能够改变世界的愿望",
+        dream_fake="想要实现一个能够改变世界的愿望",
+        condition_true="想要实现一个能够改变世界的愿望",
+        condition_fake="想要实现一个能够改变世界的愿望",
+        situation_description="NPC在游戏中遇到了一个使魔，使魔告诉NPC一个实现愿望的方法",
+        situation_options_choice="尽管这条路充满挑战，但唯有如此你才能真正打破孤独，拥抱时间的和谐流转。",
+        situation_result="NPC选择了使魔的对话选项，使魔告诉NPC一个实现愿望的方法",
+    )
+    print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
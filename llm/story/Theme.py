@@ -2,11 +2,10 @@ import os
 import asyncio
 import random
 from langchain_core.runnables import Runnable
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+from llm.Base import BaseStoryLLM
+from llm.structured import StoryOutputParser
+from langchain.output_parsers import ResponseSchema
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv, find_dotenv
-load_dotenv(find_dotenv())
 
 
 # --- Configuration Constants ---
@@ -14,24 +13,16 @@ DEFAULT_OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-mini")
 DEFAULT_OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE_HIGH", 0.8))
 
 
-class ThemeLLM:
-    def __init__(self, system_prompt: str = None):
-        self.system_prompt = system_prompt
-
-        self.llm = self.get_llm()
-        self.output_parser = self.get_output_parser()
-        self.prompt = self.get_prompt()
-        self.chain = self.get_chain()
-
-    def get_llm(self):
-        return ChatOpenAI(model=DEFAULT_OPENAI_MODEL_NAME, temperature=DEFAULT_OPENAI_TEMPERATURE)
+class ThemeLLM(BaseStoryLLM):
+    model_name = DEFAULT_OPENAI_MODEL_NAME
+    temperature = DEFAULT_OPENAI_TEMPERATURE
 
     def get_output_parser(self):
         response_schemas = [
             ResponseSchema(
                 name="theme", description="One word that describes the theme of the game")
         ]
-        return StructuredOutputParser.from_response_schemas(response_schemas)
+        return StoryOutputParser.from_response_schemas(response_schemas)
 
     def get_prompt(self):
         prompt_template = """
@@ -59,9 +50,6 @@ class ThemeLLM:
             validate_template=False
         )
 
-    def get_chain(self):
-        return self.prompt | self.llm | self.output_parser
-
     def random_theme(self):
         '''
         Not generated by LLM, just random choice.
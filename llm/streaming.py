@@ -0,0 +1,99 @@
+import re
+
+
+class JsonFieldStream:
+    """从逐块到达的 JSON 文本中增量提取某个字符串字段的值
+
+    模型输出形如 ```json {"description": "..."} ```，feed() 每次返回该字段新增的、
+    已完成转义解码的文本；转义序列被分割在两个块之间时会等待下一个块。
+    """
+
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ''
+        self.done = False
+
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ''
+        self._pos = None
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        if self.done:
+            return ''
+
+        if self._pos is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ''
+            self._pos = match.end()
+
+        buffer = self._buffer
+        i = self._pos
+        out = []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                out.append(char)
+                i += 1
+                continue
+
+            # 转义序列
+            if i + 1 >= len(buffer):
+                break
+            escape = buffer[i + 1]
+            if escape != 'u':
+                out.append(self.ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            if i + 6 > len(buffer):
+                break
+            code = int(buffer[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # UTF-16 代理对需要等待低位部分
+                if i + 12 > len(buffer):
+                    break
+                low = int(buffer[i + 8:i + 12], 16)
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                i += 12
+            else:
+                out.append(chr(code))
+                i += 6
+
+        self._pos = i
+        delta = ''.join(out)
+        self.value += delta
+        return delta
+
+
+class DeltaForwarder:
+    """把同一字段在多次请求（重试、对冲）中的累计文本合并为发给调用方的增量流
+
+    forward(value) 与已发送的文本比较：value 以已发送的文本开头时只发送新增部分；
+    否则（重试的请求生成了不同的文本）以 on_delta(value, reset=True) 通知调用方丢弃已发送的文本，改为显示 value。
+    换用另一个模型从头生成前调用 restart()，立即清空调用方已显示的文本。
+    """
+
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+        self.sent = ''
+
+    def forward(self, value: str):
+        if not value.startswith(self.sent):
+            self.on_delta(value, reset=True)
+            self.sent = value
+        elif len(value) > len(self.sent):
+            self.on_delta(value[len(self.sent):])
+            self.sent = value
+
+    def restart(self):
+        """丢弃已发送的文本：之后的 forward() 从空文本开始发送增量"""
+        if self.sent:
+            self.on_delta('', reset=True)
+            self.sent = ''
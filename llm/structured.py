@@ -0,0 +1,65 @@
+from langchain.output_parsers import StructuredOutputParser
+import os
+import re
+
+
+# --- Configuration Constants ---
+# 结构化输出方式: json_schema 为由服务端按 JSON Schema 严格约束回复（不再在提示词中附带格式说明），
+# parser 为在提示词中附带格式说明、再从回复的 ```json 代码块中解析（适用于不支持 response_format 的服务）
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "json_schema").lower()
+
+# ResponseSchema.type 到 JSON Schema 类型的映射
+SCHEMA_TYPES = {
+    'string': 'string', 'str': 'string',
+    'integer': 'integer', 'int': 'integer',
+    'number': 'number', 'float': 'number',
+    'boolean': 'boolean', 'bool': 'boolean',
+}
+LIST_TYPE = re.compile(r'^(?:List|list|array)\[(\w+)\]$')
+
+SCHEMA_FORMAT_INSTRUCTIONS = "A JSON object whose fields are defined by the response schema."
+
+
+def schema_type(kind: str) -> dict:
+    match = LIST_TYPE.match(kind)
+    if match:
+        return {'type': 'array', 'items': schema_type(match.group(1))}
+    return {'type': SCHEMA_TYPES.get(kind.lower(), 'string')}
+
+
+class StoryOutputParser(StructuredOutputParser):
+    """由 ResponseSchema 列表定义的结构化输出
+
+    LLM_OUTPUT_MODE=json_schema 时 response_format() 返回据此生成的严格 JSON Schema，
+    回复由服务端保证是合法的 JSON，提示词中的格式说明缩减为一句话；
+    parser 模式下与 StructuredOutputParser 完全相同。两种模式的回复都由 parse() 解析。
+    """
+
+    def get_format_instructions(self, only_json: bool = False) -> str:
+        if LLM_OUTPUT_MODE == 'json_schema':
+            return SCHEMA_FORMAT_INSTRUCTIONS
+        return super().get_format_instructions(only_json)
+
+    def json_schema(self) -> dict:
+        properties = {
+            schema.name: {**schema_type(schema.type), 'description': schema.description}
+            for schema in self.response_schemas
+        }
+        return {
+            'type': 'object',
+            'properties': properties,
+            # strict 模式要求所有字段必填且不允许额外字段
+            'required': list(properties),
+            'additionalProperties': False,
+        }
+
+    def response_format(self, name: str):
+        """请求的 response_format 参数，parser 模式下为 None"""
+        if LLM_OUTPUT_MODE == 'parser':
+            return None
+        if LLM_OUTPUT_MODE != 'json_schema':
+            raise ValueError(f"Invalid LLM_OUTPUT_MODE: {LLM_OUTPUT_MODE}")
+        return {
+            'type': 'json_schema',
+            'json_schema': {'name': name, 'strict': True, 'schema': self.json_schema()},
+        }
@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import os
+import threading
+
+from background_loop import background_loop
+from llm.limiter import BACKGROUND, llm_priority
+from workflow import Workflow
+
+
+# --- Configuration Constants ---
+# 预生成开局的目标数量（0 表示关闭）
+OPENING_POOL_SIZE = int(os.getenv("OPENING_POOL_SIZE", 0))
+# 同时生成的开局数量
+OPENING_POOL_CONCURRENCY = int(os.getenv("OPENING_POOL_CONCURRENCY", 2))
+# 生成失败后的重试间隔（秒）
+OPENING_POOL_RETRY_DELAY = float(os.getenv("OPENING_POOL_RETRY_DELAY", 10))
+
+
+class OpeningPool:
+    """预生成开局池
+
+    后台持续生成完整的开局（generate_opening 的全部内容），保持池中有 size 个可用；
+    新游戏通过 take() 原子地取走一个，取走后异步补充。
+    """
+
+    def __init__(self, size: int = OPENING_POOL_SIZE, concurrency: int = OPENING_POOL_CONCURRENCY, factory=Workflow, runner=background_loop):
+        self.size = size
+        self.concurrency = max(1, concurrency)
+        self.factory = factory
+        self.runner = runner
+
+        self._ready = collections.deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._producer = None
+        self._loop = None
+        self._wakeup = None
+
+    def __len__(self):
+        return len(self._ready)
+
+    def start(self):
+        """在后台事件循环上启动生产者（重复调用无副作用）"""
+        if self.size <= 0:
+            return
+        with self._lock:
+            if self._producer is not None:
+                return
+            # 生产者常驻运行，不占用 runner 的并发名额
+            self._producer = self.runner.submit(self._produce(), bounded=False)
+
+    def take(self):
+        """取出一个已生成好的开局，池为空时返回 None"""
+        with self._lock:
+            workflow = self._ready.popleft() if self._ready else None
+        self._notify()
+        return workflow
+
+    def _notify(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _claim(self):
+        """为一个生产者预留名额，池已满时返回 False"""
+        with self._lock:
+            if len(self._ready) + self._in_flight >= self.size:
+                return False
+            self._in_flight += 1
+            return True
+
+    async def _produce(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # 预生成开局的 LLM 调用排在玩家正在等待的调用之后
+        with llm_priority(BACKGROUND):
+            await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    async def _worker(self):
+        while True:
+            if not self._claim():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            workflow = self.factory()
+            try:
+                await workflow.generate_opening()
+            except Exception as e:
+                print(f"预生成开局失败: {e}")
+                with self._lock:
+                    self._in_flight -= 1
+                await asyncio.sleep(OPENING_POOL_RETRY_DELAY)
+                continue
+
+            with self._lock:
+                self._in_flight -= 1
+                self._ready.append(workflow)
+            print(f"开局池: {len(self._ready)}/{self.size}")
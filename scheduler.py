@@ -0,0 +1,109 @@
+import asyncio
+
+
+class Stage:
+    """工作流中的一个生成阶段
+
+    name:     阶段名称
+    method:   目标对象上执行该阶段的协程方法名
+    requires: 阶段开始前必须已存在的数据字段
+    provides: 阶段完成后写入的数据字段
+    label:    展示给玩家的阶段描述
+    """
+
+    def __init__(self, name: str, method: str, requires=(), provides=(), label: str = None):
+        self.name = name
+        self.method = method
+        self.requires = tuple(requires)
+        self.provides = tuple(provides)
+        self.label = label or name
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, requires={self.requires}, provides={self.provides})"
+
+
+class StageScheduler:
+    """依赖图调度器：某个阶段的输入一旦就绪就立即启动，而不是按声明顺序串行等待"""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._validate()
+
+    def _validate(self):
+        names = set()
+        providers = {}
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            names.add(stage.name)
+            for field in stage.provides:
+                if field in providers:
+                    raise ValueError(f"Field '{field}' is provided by both '{providers[field]}' and '{stage.name}'")
+                providers[field] = stage.name
+
+    @staticmethod
+    def _has(target, field):
+        return getattr(target, field, None) is not None
+
+    def is_complete(self, target, stage: Stage):
+        """阶段的全部输出均已存在时视为已完成"""
+        return all(self._has(target, field) for field in stage.provides)
+
+    def critical_path(self):
+        """返回依赖图中最长的阶段链（按调用次数计）"""
+        providers = {field: stage for stage in self.stages for field in stage.provides}
+        longest = {}
+
+        def visit(stage):
+            if stage.name not in longest:
+                deps = {providers[f].name: providers[f] for f in stage.requires if f in providers}
+                best = max((visit(dep) for dep in deps.values()), key=len, default=[])
+                longest[stage.name] = best + [stage]
+            return longest[stage.name]
+
+        return max((visit(stage) for stage in self.stages), key=len, default=[])
+
+    async def run(self, target, on_stage_start=None, on_stage_complete=None):
+        """在 target 上执行所有未完成的阶段
+
+        on_stage_start(stage) / on_stage_complete(stage, completed, total) 为可选的同步回调。
+        已完成的阶段会被跳过；任一阶段失败时取消其余运行中的阶段并抛出原异常，
+        与它同时完成的成功阶段仍会先回调 on_stage_complete。
+        """
+        pending = [stage for stage in self.stages if not self.is_complete(target, stage)]
+        total = len(pending)
+        completed = 0
+        running = {}
+
+        try:
+            while pending or running:
+                for stage in list(pending):
+                    if all(self._has(target, field) for field in stage.requires):
+                        pending.remove(stage)
+                        if on_stage_start:
+                            on_stage_start(stage)
+                        task = asyncio.create_task(getattr(target, stage.method)())
+                        running[task] = stage
+
+                if not running:
+                    missing = sorted({f for s in pending for f in s.requires if not self._has(target, f)})
+                    raise RuntimeError(f"Unsatisfiable stage dependencies, missing: {missing}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                # 同一轮中成功的阶段先全部回调（写入检查点等），再抛出失败阶段的异常
+                error = None
+                for task in done:
+                    stage = running.pop(task)
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    completed += 1
+                    if on_stage_complete:
+                        on_stage_complete(stage, completed, total)
+                if error is not None:
+                    raise error
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+
+from story_state import StoryState, dumps, loads
+from workflow import Workflow
+
+
+# --- Configuration Constants ---
+# 会话存储后端: memory 为进程内（单进程部署），sqlite / redis 可供多个 worker 共享
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", ".cache/sessions.sqlite3")
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "redis://localhost:6379/0")
+# 会话在最后一次保存后的存活时间（秒）
+SESSION_TTL = float(os.getenv("SESSION_TTL", 24 * 3600))
+
+
+class GameSession:
+    """一局游戏的会话状态
+
+    持久化的只有 stage、story（StoryState.to_dict()）和 trace（LLM 调用记录）；
+    页面直接读取 story，Workflow 在首次访问 workflow 属性时才在同一个 StoryState 上创建，只渲染页面的请求不需要它。
+    """
+
+    def __init__(self, game_id: str, stage: str = 'initial', story: StoryState = None, workflow=None, trace: list = None):
+        self.game_id = game_id
+        self.stage = stage
+        self.trace = trace if trace is not None else []
+        self._story = story
+        self._workflow = workflow
+
+    @property
+    def story(self) -> StoryState:
+        if self._workflow is not None:
+            return self._workflow.state
+        if self._story is None:
+            self._story = StoryState()
+        return self._story
+
+    @property
+    def workflow(self):
+        if self._workflow is None:
+            # 进程在保存会话之前退出时，story 中缺少的阶段由检查点补齐
+            self._workflow = Workflow(state=self.story).attach(self.game_id)
+        return self._workflow
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.stage,
+            'story': self.story.to_dict(),
+            'trace': self.trace,
+        }
+
+    @classmethod
+    def from_dict(cls, game_id: str, value: dict):
+        return cls(game_id, stage=value['stage'], story=StoryState.from_dict(value['story'] or {}), trace=value.get('trace'))
+
+
+class SessionStore:
+    """游戏会话存储的接口"""
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+
+    def get(self, game_id: str):
+        """返回会话，不存在或已过期时返回 None"""
+        raise NotImplementedError
+
+    def save(self, game_session: GameSession):
+        """保存会话并刷新其过期时间"""
+        raise NotImplementedError
+
+    def delete(self, game_id: str):
+        raise NotImplementedError
+
+    def __contains__(self, game_id):
+        return self.get(game_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """进程内存储，直接保存 GameSession 对象，不经过序列化"""
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        super().__init__(ttl)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, game_id):
+        with self._lock:
+            entry = self._sessions.get(game_id)
+            if entry is None:
+                return None
+            expires, game_session = entry
+            if self.ttl and time.time() > expires:
+                del self._sessions[game_id]
+                return None
+            return game_session
+
+    def save(self, game_session):
+        now = time.time()
+        with self._lock:
+            self._sessions[game_session.game_id] = (now + self.ttl, game_session)
+            self._writes += 1
+            # 每 100 次写入清理一次过期会话
+            if self.ttl and self._writes % 100 == 0:
+                for game_id in [k for k, (expires, _) in self._sessions.items() if now > expires]:
+                    del self._sessions[game_id]
+
+    def delete(self, game_id):
+        with self._lock:
+            self._sessions.pop(game_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite 存储，同一台机器上的多个 worker 进程可共享"""
+
+    def __init__(self, path: str = SESSION_STORE_PATH, ttl: float = SESSION_TTL):
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS game_sessions ('
+            'game_id TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS game_sessions_expires ON game_sessions (expires)')
+        self._conn.commit()
+
+    def get(self, game_id):
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM game_sessions WHERE game_id = ?', (game_id,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if self.ttl and time.time() > expires:
+            self.delete(game_id)
+            return None
+        return GameSession.from_dict(game_id, loads(value))
+
+    def save(self, game_session):
+        now = time.time()
+        value = dumps(game_session.to_dict())
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO game_sessions (game_id, value, expires) VALUES (?, ?, ?)',
+                (game_session.game_id, value, now + self.ttl),
+            )
+            self._writes += 1
+            # 每 100 次写入清理一次过期会话
+            if self.ttl and self._writes % 100 == 0:
+                self._conn.execute('DELETE FROM game_sessions WHERE expires < ?', (now,))
+            self._conn.commit()
+
+    def delete(self, game_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM game_sessions WHERE game_id = ?', (game_id,))
+            self._conn.commit()
+
+
+class RedisSessionStore(SessionStore):
+    """Redis 存储（或任何兼容 Redis 协议的服务），过期由服务端负责，可供多台机器共享
+
+    需要安装可选依赖 redis (pip install redis)。
+    """
+
+    KEY_PREFIX = 'dream_game:session:'
+
+    def __init__(self, url: str = SESSION_STORE_URL, ttl: float = SESSION_TTL, client=None):
+        super().__init__(ttl)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError('SESSION_STORE=redis 需要安装 redis: pip install redis') from e
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def get(self, game_id):
+        value = self._client.get(self.KEY_PREFIX + game_id)
+        if value is None:
+            return None
+        return GameSession.from_dict(game_id, loads(value))
+
+    def save(self, game_session):
+        value = dumps(game_session.to_dict())
+        ttl = int(self.ttl) if self.ttl else None
+        self._client.set(self.KEY_PREFIX + game_session.game_id, value, ex=ttl)
+
+    def delete(self, game_id):
+        self._client.delete(self.KEY_PREFIX + game_id)
+
+
+def get_session_store(backend: str = SESSION_STORE) -> SessionStore:
+    """按 SESSION_STORE 配置创建会话存储"""
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    if backend == 'redis':
+        return RedisSessionStore()
+    raise ValueError(f"Invalid SESSION_STORE: {backend}")
@@ -0,0 +1,96 @@
+import asyncio
+import concurrent.futures
+import os
+
+from llm.limiter import BACKGROUND, llm_priority
+
+
+# 每个情景预生成的分支数（0 表示关闭推测生成，最多 3 个）。
+# 每个分支约等于一次 结果 + 下一情景 + 选项（第 C 章为 结果 + 结局）的 token 开销。
+SPECULATIVE_BRANCHES = int(os.getenv("SPECULATIVE_BRANCHES", 0))
+
+CHOICES = ['CHOICE_A', 'CHOICE_B', 'CHOICE_C']
+
+
+class BranchSpeculator:
+    """在玩家阅读情景时，于 Workflow 副本上并发预生成各选项的后续分支
+
+    玩家做出选择后通过 commit() 采纳对应分支，其余分支被取消。
+    分支结果通过 concurrent.futures.Future 传递，run() 与 commit() 可以处于不同的事件循环。
+    """
+
+    def __init__(self, workflow, stage: str, max_branches: int = SPECULATIVE_BRANCHES):
+        assert stage in workflow.state.labels()
+        self.stage = stage
+        self.choices = CHOICES[:max(0, min(max_branches, len(CHOICES)))]
+        self.branches = {choice: concurrent.futures.Future() for choice in self.choices}
+
+        self._workflow = workflow
+        self._loop = None
+        self._tasks = {}
+
+    async def run(self):
+        """并发生成所有分支"""
+        self._loop = asyncio.get_running_loop()
+        # 推测分支的 LLM 调用排在玩家正在等待的调用之后
+        with llm_priority(BACKGROUND):
+            for choice in self.choices:
+                if not self.branches[choice].cancelled():
+                    self._tasks[choice] = asyncio.create_task(self._run_branch(choice))
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run_branch(self, choice: str):
+        future = self.branches[choice]
+        branch = self._workflow.fork()
+        try:
+            await branch.advance(self.stage, choice)
+        except asyncio.CancelledError:
+            branch.cancel_memory()
+            future.cancel()
+            raise
+        except Exception as e:
+            print(f"推测分支 {self.stage}/{choice} 生成失败: {e}")
+            if not future.cancelled():
+                future.set_exception(e)
+        else:
+            if not future.cancelled():
+                future.set_result(branch)
+
+    def discard(self, keep: str = None):
+        """取消除 keep 以外的所有分支，已生成完的分支停止其仍在后台生成的故事记忆"""
+        finished = []
+        for choice, future in self.branches.items():
+            if choice != keep and not future.cancel() and future.exception() is None:
+                finished.append(future.result())
+        if self._loop is not None and not self._loop.is_closed():
+            cancels = [task.cancel for choice, task in self._tasks.items() if choice != keep and not task.done()]
+            cancels += [branch.cancel_memory for branch in finished]
+            for cancel in cancels:
+                try:
+                    self._loop.call_soon_threadsafe(cancel)
+                except RuntimeError:
+                    # 事件循环已随全部分支结束而关闭
+                    pass
+
+    async def commit(self, workflow, choice: str) -> bool:
+        """采纳玩家所选的分支
+
+        若该分支未被预生成或生成失败则返回 False，由调用方走常规生成路径。
+        """
+        if self._loop is None:
+            # run() 仍在排队等待执行名额，等待它可能与调用方互相占用名额而死锁
+            self.discard()
+            return False
+
+        self.discard(keep=choice)
+        future = self.branches.get(choice)
+        if future is None:
+            return False
+
+        try:
+            branch = await asyncio.wrap_future(future)
+        except (Exception, concurrent.futures.CancelledError):
+            return False
+
+        workflow.adopt(branch)
+        return True
@@ -69,4 +69,55 @@ function showChoicesWithDelay(delay = 1000) {
             choicesContainer.style.transform = 'translateY(0)';
         }, delay);
     }
-} 
\ No newline at end of file
+} 
+/**
+ * 流式打字机效果：追加服务器实时推送的文本片段
+ * @param {string} elementId - 目标元素的ID
+ * @returns {{write: function(string), section: function(), clear: function(), end: function()}}
+ *   write 追加文本，section 开始新的一段，clear 清除当前段已写入的文本，end 结束并移除光标
+ */
+function streamTypewriter(elementId) {
+    const element = document.getElementById(elementId);
+    if (!element) {
+        console.error('Element not found:', elementId);
+        return { write() {}, section() {}, clear() {}, end() {} };
+    }
+    
+    element.classList.add('typing');
+    
+    const cursor = document.createElement('span');
+    cursor.className = 'typewriter-cursor';
+    cursor.innerHTML = '|';
+    element.appendChild(cursor);
+    
+    // 当前段已插入的节点，clear() 时移除
+    let segment = [];
+    
+    return {
+        write(text) {
+            // 处理换行符
+            text.split('\n').forEach((line, i) => {
+                if (i > 0) {
+                    segment.push(element.insertBefore(document.createElement('br'), cursor));
+                }
+                if (line) {
+                    segment.push(element.insertBefore(document.createTextNode(line), cursor));
+                }
+            });
+            element.scrollTop = element.scrollHeight;
+        },
+        section() {
+            segment = [];
+        },
+        clear() {
+            segment.forEach(node => node.remove());
+            segment = [];
+        },
+        end() {
+            element.classList.remove('typing');
+            if (cursor.parentNode) {
+                cursor.parentNode.removeChild(cursor);
+            }
+        }
+    };
+}
@@ -0,0 +1,259 @@
+"""一局游戏的故事数据
+
+StoryState 是故事数据唯一的存放处：Workflow、Flask 会话与 Streamlit 页面都读写同一个对象，
+不再各自复制一份。每个情景是一条 Chapter 记录（默认 A/B/C 三章），同时保留 situation_a_options 等平铺字段名，
+检查点、会话存储和批量生成的输出仍使用平铺的字典格式。
+"""
+import os
+
+import orjson
+
+from llm.limiter import text_tokens
+
+
+# --- Configuration Constants ---
+# 情景与结局提示词中故事进展（完整的最近章节 + 更早章节的概要）的 token 预算
+STORY_CONTEXT_TOKENS = int(os.getenv("STORY_CONTEXT_TOKENS", 800))
+
+# 网页与 Streamlit 页面使用的章节；Workflow 可以生成最多 26 章（A-Z）
+CHAPTERS = ('A', 'B', 'C')
+MAX_CHAPTERS = 26
+
+OPENING_FIELDS = (
+    'personality', 'theme', 'background', 'character',
+    'dream_true', 'dream_fake', 'condition_true', 'condition_fake',
+)
+
+# Chapter 属性 → 平铺字段名的后缀
+CHAPTER_ATTRS = (
+    ('situation', ''), ('options', '_options'), ('choice', '_options_choice'), ('result', '_result'),
+    ('memory', '_memory'),
+)
+
+
+def chapter_label(index: int) -> str:
+    """第 index 章（从 0 开始）的名称：A、B、C……"""
+    return chr(ord('A') + index)
+
+
+def chapter_index(label: str) -> int:
+    return ord(label.upper()) - ord('A')
+
+
+def chapter_fields(index: int) -> tuple:
+    """第 index 章的平铺字段名：情景描述、选项、选择、结果、故事记忆"""
+    prefix = f'situation_{chapter_label(index).lower()}'
+    return tuple(prefix + suffix for _, suffix in CHAPTER_ATTRS)
+
+
+def story_fields(chapters: int = len(CHAPTERS)) -> tuple:
+    """chapters 章故事的全部平铺字段，按生成顺序排列"""
+    fields = list(OPENING_FIELDS)
+    for index in range(chapters):
+        fields.extend(chapter_fields(index))
+    fields.append('ending')
+    return tuple(fields)
+
+
+# 默认三章故事的全部平铺字段
+DATA_FIELDS = story_fields()
+
+# 平铺字段名 → (章节序号, Chapter 属性)
+_CHAPTER_FIELDS = {
+    field: (index, attr)
+    for index in range(MAX_CHAPTERS)
+    for field, (attr, _) in zip(chapter_fields(index), CHAPTER_ATTRS)
+}
+
+
+class Chapter:
+    """一个情景：描述、选项、玩家的选择与选择的结果
+
+    memory 是截至本章的故事记忆（MemoryLLM 对第一章到本章的滚动摘要），由 Workflow 在后台生成。
+    """
+
+    __slots__ = ('situation', 'options', 'choice', 'result', 'memory')
+
+    def __init__(self, situation=None, options=None, choice=None, result=None, memory=None):
+        self.situation = situation
+        self.options = options
+        self.choice = choice
+        self.result = result
+        self.memory = memory
+
+    def copy(self):
+        return Chapter(self.situation, self.options, self.choice, self.result, self.memory)
+
+    def summary(self, label: str) -> str:
+        """一行概要：只保留玩家的选择与结果，不含完整的情景描述"""
+        return f"情境{label}：{self.choice or ''} → {self.result or ''}"
+
+    def render(self, label: str) -> str:
+        """完整内容，以 XML 形式放入结局等提示词"""
+        tag = f'situation_{label.lower()}'
+        return (
+            f"<{tag}>\n"
+            f"    <description>{self.situation or ''}</description>\n"
+            f"    <options_choice>{self.choice or ''}</options_choice>\n"
+            f"    <result>{self.result or ''}</result>\n"
+            f"</{tag}>"
+        )
+
+
+class ChapterField:
+    """StoryState 上的平铺字段（如 situation_b_options），读写第 index 个情景的对应属性"""
+
+    __slots__ = ('index', 'name')
+
+    def __init__(self, index: int, name: str):
+        self.index = index
+        self.name = name
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        return getattr(state.chapters[self.index], self.name)
+
+    def __set__(self, state, value):
+        setattr(state.chapters[self.index], self.name, value)
+
+
+class StoryState:
+    """一局游戏的全部故事数据"""
+
+    __slots__ = (
+        'personality', 'theme', 'background', 'character',
+        'dream_true', 'dream_fake', 'condition_true', 'condition_fake',
+        'chapters', 'ending',
+    )
+
+    situation_a = ChapterField(0, 'situation')
+    situation_a_options = ChapterField(0, 'options')
+    situation_a_options_choice = ChapterField(0, 'choice')
+    situation_a_result = ChapterField(0, 'result')
+    situation_a_memory = ChapterField(0, 'memory')
+    situation_b = ChapterField(1, 'situation')
+    situation_b_options = ChapterField(1, 'options')
+    situation_b_options_choice = ChapterField(1, 'choice')
+    situation_b_result = ChapterField(1, 'result')
+    situation_b_memory = ChapterField(1, 'memory')
+    situation_c = ChapterField(2, 'situation')
+    situation_c_options = ChapterField(2, 'options')
+    situation_c_options_choice = ChapterField(2, 'choice')
+    situation_c_result = ChapterField(2, 'result')
+    situation_c_memory = ChapterField(2, 'memory')
+
+    def __init__(self, chapters: int = len(CHAPTERS)):
+        if not 1 <= chapters <= MAX_CHAPTERS:
+            raise ValueError(f"chapters must be between 1 and {MAX_CHAPTERS}")
+        for field in self.__slots__:
+            setattr(self, field, None)
+        self.chapters = [Chapter() for _ in range(chapters)]
+
+    def chapter(self, stage: str) -> Chapter:
+        """情景 'A' / 'B' / 'C'…… 对应的记录"""
+        return self.chapters[chapter_index(stage)]
+
+    def labels(self) -> tuple:
+        return tuple(chapter_label(index) for index in range(len(self.chapters)))
+
+    def fields(self) -> tuple:
+        """本局故事的全部平铺字段"""
+        return story_fields(len(self.chapters))
+
+    def get(self, field: str):
+        """按平铺字段名读取，也适用于第四章之后的 situation_d 等字段"""
+        if field in _CHAPTER_FIELDS:
+            index, attr = _CHAPTER_FIELDS[field]
+            return getattr(self.chapters[index], attr)
+        return getattr(self, field)
+
+    def set(self, field: str, value):
+        if field in _CHAPTER_FIELDS:
+            index, attr = _CHAPTER_FIELDS[field]
+            setattr(self.chapters[index], attr, value)
+        else:
+            setattr(self, field, value)
+
+    def summary(self, end: int, budget: int = STORY_CONTEXT_TOKENS) -> str:
+        """第 0 到 end 章（不含）的概要
+
+        以最近一份故事记忆开头（它已概括了更早的全部章节），其后尚无记忆的章节各一行（选择与结果）；
+        超出 budget（token）时丢弃最早的部分，但至少保留最近的一行。
+        """
+        lines = []
+        used = 0
+        for index in reversed(range(end)):
+            chapter = self.chapters[index]
+            line = chapter.memory or chapter.summary(chapter_label(index))
+            cost = text_tokens(line)
+            if lines and used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+            if chapter.memory:
+                break
+        return '\n'.join(reversed(lines))
+
+    def context(self, end: int, budget: int = STORY_CONTEXT_TOKENS, full: int = None) -> tuple:
+        """token 预算内第 0 到 end 章（不含）的故事进展：(更早章节的概要, 完整传入的章节序号)
+
+        full 为 None 时在预算内尽可能多地完整传入最近的章节（至少一章）；情景提示词只有“上一章”一个位置，
+        传入 full=1。其余章节由 summary() 用剩余的预算概括。
+        """
+        used = 0
+        count = 0
+        while count < end and (full is None or count < full):
+            index = end - count - 1
+            cost = text_tokens(self.chapters[index].render(chapter_label(index)))
+            if full is None and count and used + cost > budget:
+                break
+            used += cost
+            count += 1
+        return self.summary(end - count, max(budget - used, 0)), list(range(end - count, end))
+
+    def reset_from(self, field: str):
+        """清空 field 及故事中在它之后生成的全部字段"""
+        fields = self.fields()
+        for name in fields[fields.index(field):]:
+            self.set(name, None)
+
+    def copy(self):
+        """复制一份可独立修改的故事数据；字段值本身在生成后不再修改，不做深拷贝"""
+        state = StoryState.__new__(StoryState)
+        for field in self.__slots__:
+            setattr(state, field, getattr(self, field))
+        state.chapters = [chapter.copy() for chapter in self.chapters]
+        return state
+
+    def to_dict(self) -> dict:
+        """平铺的字段字典，与检查点和会话存储中的格式一致"""
+        return {field: self.get(field) for field in self.fields()}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """由 to_dict() 的结果重建；章节数由字典中出现的 situation_* 字段决定，空字典为默认的三章"""
+        chapters = 0
+        while chapters < MAX_CHAPTERS and chapter_fields(chapters)[0] in data:
+            chapters += 1
+        state = cls(chapters or len(CHAPTERS))
+        for field in state.fields():
+            state.set(field, data.get(field))
+        return state
+
+    def __eq__(self, other):
+        return isinstance(other, StoryState) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        filled = [field for field in self.fields() if self.get(field) is not None]
+        return f"StoryState({', '.join(filled)})"
+
+
+def dumps(value) -> bytes:
+    """序列化会话等数据（orjson，UTF-8 编码的紧凑 JSON）"""
+    return orjson.dumps(value)
+
+
+def loads(value):
+    """反序列化 dumps() 的结果，也接受旧版本写入的 str"""
+    return orjson.loads(value)
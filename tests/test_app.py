@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import app
+from checkpoint_store import SQLiteCheckpointStore
+from session_store import GameSession
+from story_state import StoryState
+from workflow import Workflow
+
+
+@pytest.mark.parametrize('handler', [
+    lambda game_id: app.generate_initial_content(game_id),
+    lambda game_id: app.handle_choice_async(game_id, 'CHOICE_A', 'A'),
+    lambda game_id: app.generate_stage_options(game_id, 'C'),
+])
+def test_expired_session_emits_error(monkeypatch, handler):
+    """会话已过期或被淘汰时，后台任务向该局游戏的房间发送 error，而不是在后台循环中抛出 AttributeError"""
+    events = []
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: events.append((event, to)))
+    asyncio.run(handler('expired'))
+    assert events == [('error', 'expired')]
+
+
+class SceneStub(Workflow):
+    async def generate_situation(self, index=0, on_delta=None):
+        self.state.chapters[index].situation = '情景 C'
+
+    async def generate_situation_options(self, index=0):
+        self.state.chapters[index].options = {'CHOICE_A': '选项一'}
+
+
+def test_stage_c_options_are_checkpointed(monkeypatch, tmp_path):
+    """单独生成的第 C 章情景与选项同样写入检查点，崩溃后恢复时不会丢失"""
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: None)
+    store = SQLiteCheckpointStore(str(tmp_path / 'checkpoints.sqlite3'))
+    workflow = SceneStub().attach('stage-c', store)
+    app.game_sessions.save(GameSession('stage-c', workflow=workflow))
+    try:
+        asyncio.run(app.generate_stage_options('stage-c', 'C'))
+    finally:
+        app.game_sessions.delete('stage-c')
+    saved = store.load('stage-c')
+    assert (saved['situation_c'], saved['situation_c_options']) == ('情景 C', {'CHOICE_A': '选项一'})
+
+
+class AdvanceStub(Workflow):
+    async def advance(self, stage, choice, on_delta=None):
+        pass
+
+
+def finished_story(chapters):
+    state = StoryState(chapters)
+    for index, chapter in enumerate(state.chapters):
+        chapter.situation = f'情景 {index}'
+        chapter.options = {'CHOICE_A': '选项一'}
+        chapter.choice = '选项一'
+        chapter.result = f'结果 {index}'
+    state.ending = '结局'
+    return state
+
+
+@pytest.fixture
+def four_chapters():
+    workflow = AdvanceStub(state=finished_story(4))
+    app.game_sessions.save(GameSession('four', workflow=workflow))
+    yield 'four'
+    app.game_sessions.delete('four')
+
+
+@pytest.mark.parametrize('stage, redirect', [('C', '/game/choice_d'), ('D', '/game/ending')])
+def test_choice_redirects_by_chapter_count(monkeypatch, four_chapters, stage, redirect):
+    """选择后跳转到下一章的选择页，最后一章之后跳转到结局，与本局的章节数一致"""
+    events = []
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data, to=None: events.append((event, data)))
+    asyncio.run(app.handle_choice_async(four_chapters, 'CHOICE_A', stage))
+    assert events == [('choice_processed', {'redirect': redirect})]
+
+
+def test_pages_follow_chapter_count(four_chapters):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['game_id'] = four_chapters
+
+    page = client.get('/game/choice_d').get_data(as_text=True)
+    assert '"choice_d"' in page and '<span>4</span>' in page
+    assert client.get('/game/choice_e').status_code == 302
+    assert client.get('/navigate/forward?current_stage=choice_c').headers['Location'].startswith('/game/choice_d')
+    assert client.get('/navigate/forward?current_stage=choice_d').headers['Location'].startswith('/game/ending')
+    ending = client.get('/game/ending').get_data(as_text=True)
+    assert '第四章' in ending and '结果 3' in ending
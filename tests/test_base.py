@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from langchain.output_parsers import ResponseSchema
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.prompts import ChatPromptTemplate
+
+import llm.Base
+from llm.Base import BaseStoryLLM
+from llm.resilience import ResiliencePolicy
+from llm.routing import router
+from llm.story.Dream import DreamLLM
+from llm.structured import StoryOutputParser
+
+
+class StreamingModel(BaseChatModel):
+    """按顺序回放预设的流式回复；回复带有异常时，在已输出的块之后抛出"""
+
+    replies: list
+
+    @property
+    def _llm_type(self):
+        return 'test-streaming'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks, error = self.replies.pop(0)
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        if error is not None:
+            raise error
+
+
+class DescriptionLLM(BaseStoryLLM):
+    stream_field = 'description'
+
+    def get_output_parser(self):
+        return StoryOutputParser.from_response_schemas([ResponseSchema(name='description', description='', type='string')])
+
+    def get_prompt(self):
+        return ChatPromptTemplate.from_messages([('human', '{text}')])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    models = {}
+    monkeypatch.setattr(llm.Base, 'get_chat_model', lambda name, temperature: models[name])
+    monkeypatch.setattr(llm.Base, 'get_response_cache', lambda: None)
+    monkeypatch.setattr(llm.Base, 'resilience_policy', ResiliencePolicy(max_retries=2, backoff_base=0.001, hedge=False))
+    return models
+
+
+def received(deltas):
+    text = ''
+    for delta, reset in deltas:
+        text = delta if reset else text + delta
+    return text
+
+
+def test_retry_after_partial_stream_replaces_text(model):
+    """连接在流式输出中途断开后重试，调用方最终显示的是重试生成的文本，而不是两次生成的拼接"""
+    model[DescriptionLLM.model_name] = StreamingModel(replies=[
+        (['{"description": "月光洒在古老的石阶上，', '她停下'], ConnectionError('reset by peer')),
+        (['{"description": "风里带着潮湿的雨意，', '远处传来钟声。"}'], None),
+    ])
+    deltas = []
+    result = asyncio.run(DescriptionLLM().ainvoke({'text': 'x'}, on_delta=lambda text, reset=False: deltas.append((text, reset))))
+    assert result['description'] == '风里带着潮湿的雨意，远处传来钟声。'
+    assert received(deltas) == result['description']
+
+
+@pytest.fixture
+def fallback():
+    routes = router.table()
+    router.update({'Description': {'fallback': 'fallback-model'}})
+    yield 'fallback-model'
+    router.update(routes)
+
+
+def test_fallback_clears_partial_stream(model, fallback):
+    """主模型重试耗尽后改用备用模型，调用方先清空主模型已输出的文本，不会与备用模型的输出拼接"""
+    broken = (['{"description": "月光洒在古老的石阶上，', '她停下'], ConnectionError('reset by peer'))
+    model[DescriptionLLM.model_name] = StreamingModel(replies=[broken] * 3)
+    model[fallback] = StreamingModel(replies=[(['{"description": "月光洒在', '湖面上。"}'], None)])
+    deltas = []
+    result = asyncio.run(DescriptionLLM().ainvoke({'text': 'x'}, on_delta=lambda text, reset=False: deltas.append((text, reset))))
+    assert result['description'] == '月光洒在湖面上。'
+    assert received(deltas) == result['description']
+    assert ('', True) in deltas
+
+
+def test_dream_types_are_separate_stages():
+    """真实与表面梦境各自作为一个阶段统计耗时，对冲阈值与时限互不干扰"""
+    dream_true, dream_fake = DreamLLM(type='TRUE'), DreamLLM(type='FAKE')
+    assert (dream_true.stage_name, dream_fake.stage_name) == ('DreamTrue', 'DreamFake')
+    assert 'dream_true' not in dream_true.prompt.input_variables
+    assert 'dream_true' in dream_fake.prompt.input_variables
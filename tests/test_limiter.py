@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from llm import limiter
+from llm.limiter import BACKGROUND, INTERACTIVE, AdmissionController
+
+
+async def _queue(controller, order, name, priority, tokens=1):
+    grant = await controller.acquire(tokens, priority)
+    order.append(name)
+    controller.release(grant)
+
+
+def test_priority_ordering():
+    """并发名额释放后，交互请求先于后台请求放行，同一优先级先到先得"""
+    async def main():
+        controller = AdmissionController('test', max_concurrency=1)
+        order = []
+        held = await controller.acquire(1, INTERACTIVE)
+        tasks = []
+        for name, priority in [('bg1', BACKGROUND), ('ia1', INTERACTIVE), ('bg2', BACKGROUND), ('ia2', INTERACTIVE)]:
+            tasks.append(asyncio.create_task(_queue(controller, order, name, priority)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        assert order == []
+        assert controller.stats()['queue_depth'] == {'interactive': 2, 'background': 2}
+
+        controller.release(held)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ['ia1', 'ia2', 'bg1', 'bg2']
+
+
+@pytest.fixture
+def short_window(monkeypatch):
+    monkeypatch.setattr(limiter, 'RATE_WINDOW', 0.2)
+
+
+def test_rpm_waits_for_window(short_window):
+    async def main():
+        controller = AdmissionController('test', rpm=2)
+        started = time.monotonic()
+        for _ in range(2):
+            controller.release(await controller.acquire(1))
+        assert time.monotonic() - started < 0.1
+        controller.release(await controller.acquire(1))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.18
+
+
+def test_tpm_waits_for_window(short_window):
+    async def main():
+        controller = AdmissionController('test', tpm=100)
+        started = time.monotonic()
+        controller.release(await controller.acquire(60))
+        controller.release(await controller.acquire(60))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.18
+
+
+def test_tpm_uses_recorded_usage(short_window):
+    """以实际用量修正预算后，后续调用不必等待窗口过期"""
+    class Message:
+        usage_metadata = {'total_tokens': 10}
+
+    async def main():
+        controller = AdmissionController('test', tpm=100)
+        async with controller.admit(80) as grant:
+            grant.record(Message())
+        started = time.monotonic()
+        controller.release(await controller.acquire(80))
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) < 0.1
+
+
+def test_cancel_while_queued():
+    """排队中被取消的调用不占用队首，后面的调用照常放行"""
+    async def main():
+        controller = AdmissionController('test', max_concurrency=1)
+        order = []
+        held = await controller.acquire(1)
+        first = asyncio.create_task(_queue(controller, order, 'first', INTERACTIVE))
+        second = asyncio.create_task(_queue(controller, order, 'second', BACKGROUND))
+        await asyncio.sleep(0.01)
+        assert controller.queue_latency() > 0
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert controller.stats()['queue_depth']['interactive'] == 0
+
+        controller.release(held)
+        await asyncio.wait_for(second, 1)
+        assert controller.queue_latency() == 0
+        assert controller.stats()['in_flight'] == 0
+        return order
+
+    assert asyncio.run(main()) == ['second']
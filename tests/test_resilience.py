@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm.resilience import LLMCallError, ResiliencePolicy
+
+
+def make_call():
+    return SimpleNamespace(stage='Test', model='test', retries=0, hedges=0)
+
+
+def flaky(errors, result='ok'):
+    """前 len(errors) 次依次抛出 errors 中的异常，之后返回 result"""
+    errors = list(errors)
+
+    async def attempt(race):
+        if errors:
+            raise errors.pop(0)
+        return result
+    return attempt
+
+
+def test_retries_retryable_errors():
+    policy = ResiliencePolicy(max_retries=2, backoff_base=0.001, hedge=False)
+    call = make_call()
+    assert asyncio.run(policy.run(call, flaky([ConnectionError(), TimeoutError()]))) == 'ok'
+    assert call.retries == 2
+
+
+def test_gives_up_after_max_retries():
+    policy = ResiliencePolicy(max_retries=1, backoff_base=0.001, hedge=False)
+    with pytest.raises(LLMCallError, match='ConnectionError'):
+        asyncio.run(policy.run(make_call(), flaky([ConnectionError(), ConnectionError()])))
+
+
+def test_does_not_retry_other_errors():
+    policy = ResiliencePolicy(max_retries=2, backoff_base=0.001, hedge=False)
+    call = make_call()
+    with pytest.raises(LLMCallError, match='ValueError'):
+        asyncio.run(policy.run(call, flaky([ValueError('bad')])))
+    assert call.retries == 0
+
+
+def test_deadline():
+    policy = ResiliencePolicy(deadline=0.05, hedge=False)
+
+    async def slow(race):
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMCallError, match='超过时限'):
+        asyncio.run(policy.run(make_call(), slow))
+
+
+def test_run_sync_retries():
+    policy = ResiliencePolicy(max_retries=1, backoff_base=0.001, hedge=False)
+    errors = [ConnectionError()]
+
+    def attempt():
+        if errors:
+            raise errors.pop()
+        return 'ok'
+
+    assert policy.run_sync(make_call(), attempt) == 'ok'
+
+
+def test_hedged_requests_all_cancelled():
+    """原请求与对冲请求全部被取消时抛出 LLMCallError，而不是 raise None 引起的 TypeError"""
+    policy = ResiliencePolicy(max_retries=2, hedge=False)
+    policy.hedge_delay = lambda stage, model, streaming: 0
+
+    async def cancelled(race):
+        raise asyncio.CancelledError
+
+    call = make_call()
+    with pytest.raises(LLMCallError, match='全部请求均被取消'):
+        asyncio.run(policy.run(call, cancelled))
+    assert call.retries == 0
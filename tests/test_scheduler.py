@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from scheduler import Stage, StageScheduler
+
+
+class Target:
+    """记录各阶段开始、完成与被取消的测试对象"""
+
+    def __init__(self, **values):
+        self.a = self.b = self.c = self.d = None
+        for field, value in values.items():
+            setattr(self, field, value)
+        self.started = []
+        self.cancelled = []
+
+    async def _stage(self, field, delay=0.01):
+        self.started.append(field)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(field)
+            raise
+        setattr(self, field, field.upper())
+
+    async def make_a(self):
+        await self._stage('a')
+
+    async def make_b(self):
+        await self._stage('b')
+
+    async def make_c(self):
+        await self._stage('c')
+
+    async def make_d(self):
+        await self._stage('d', delay=10)
+
+    async def fail(self):
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def make_b_now(self):
+        self.b = 'B'
+
+    async def fail_now(self):
+        raise ValueError('boom')
+
+
+STAGES = [
+    Stage('a', 'make_a', provides=('a',)),
+    Stage('b', 'make_b', requires=('a',), provides=('b',)),
+    Stage('c', 'make_c', requires=('a',), provides=('c',)),
+    Stage('d', 'make_d', requires=('b', 'c'), provides=('d',)),
+]
+
+
+def test_runs_stages_when_inputs_are_ready():
+    target = Target()
+    stages = STAGES[:3]
+    completed = []
+    asyncio.run(StageScheduler(stages).run(target, on_stage_complete=lambda stage, n, total: completed.append(stage.name)))
+    assert (target.a, target.b, target.c) == ('A', 'B', 'C')
+    assert completed[0] == 'a' and sorted(completed[1:]) == ['b', 'c']
+
+
+def test_skips_completed_stages():
+    target = Target(a='saved')
+    asyncio.run(StageScheduler(STAGES[:2]).run(target))
+    assert target.started == ['b']
+    assert target.a == 'saved'
+
+
+def test_failing_stage_cancels_siblings():
+    target = Target(a='A')
+    stages = [
+        Stage('fail', 'fail', requires=('a',), provides=('b',)),
+        Stage('d', 'make_d', requires=('a',), provides=('d',)),
+    ]
+    with pytest.raises(ValueError, match='boom'):
+        asyncio.run(asyncio.wait_for(StageScheduler(stages).run(target), 1))
+    assert target.cancelled == ['d']
+    assert target.d is None
+
+
+def test_stages_finishing_with_a_failure_are_reported():
+    """与失败阶段同一轮完成的成功阶段仍回调 on_stage_complete，之后才抛出异常"""
+    target = Target(a='A')
+    stages = [
+        Stage('fail', 'fail_now', requires=('a',), provides=('c',)),
+        Stage('b', 'make_b_now', requires=('a',), provides=('b',)),
+    ]
+    completed = []
+    with pytest.raises(ValueError, match='boom'):
+        asyncio.run(StageScheduler(stages).run(target, on_stage_complete=lambda stage, n, total: completed.append(stage.name)))
+    assert completed == ['b']
+
+
+def test_missing_inputs_raise():
+    with pytest.raises(RuntimeError, match=r"missing: \['a'\]"):
+        asyncio.run(StageScheduler(STAGES[1:3]).run(Target()))
+
+
+def test_duplicate_provider_is_rejected():
+    with pytest.raises(ValueError):
+        StageScheduler([Stage('x', 'make_a', provides=('a',)), Stage('y', 'make_b', provides=('a',))])
+
+
+def test_critical_path():
+    path = StageScheduler(STAGES).critical_path()
+    assert [stage.name for stage in path] in (['a', 'b', 'd'], ['a', 'c', 'd'])
@@ -0,0 +1,80 @@
+from llm.limiter import text_tokens
+from story_state import Chapter, StoryState, chapter_label, dumps, loads
+
+
+def make_state(chapters=4, memories=()):
+    state = StoryState(chapters)
+    for index in range(chapters):
+        label = chapter_label(index)
+        state.chapters[index] = Chapter(
+            situation=f'情景{label}' * 20,
+            options={'CHOICE_A': '甲', 'CHOICE_B': '乙', 'CHOICE_C': '丙'},
+            choice=f'选择{label}',
+            result=f'结果{label}',
+            memory=f'记忆{label}' if index in memories else None,
+        )
+    return state
+
+
+def test_summary_lines_without_memory():
+    state = make_state()
+    assert state.summary(3).splitlines() == ['情境A：选择A → 结果A', '情境B：选择B → 结果B', '情境C：选择C → 结果C']
+
+
+def test_summary_starts_from_latest_memory():
+    """最近一份记忆已概括更早的章节，其后没有记忆的章节各一行"""
+    state = make_state(memories=(0, 1))
+    assert state.summary(4).splitlines() == ['记忆B', '情境C：选择C → 结果C', '情境D：选择D → 结果D']
+
+
+def test_summary_drops_earliest_lines_over_budget():
+    state = make_state()
+    line = state.chapters[0].summary('A')
+    assert state.summary(3, budget=2 * text_tokens(line)).splitlines() == ['情境B：选择B → 结果B', '情境C：选择C → 结果C']
+    # 预算不足一行时仍保留最近的一行
+    assert state.summary(3, budget=0).splitlines() == ['情境C：选择C → 结果C']
+
+
+def test_context_full_chapters():
+    state = make_state(memories=(0,))
+    summary, recent = state.context(3, full=1)
+    assert recent == [2]
+    assert summary.splitlines() == ['记忆A', '情境B：选择B → 结果B']
+
+
+def test_context_fills_budget_with_recent_chapters():
+    state = make_state()
+    rendered = text_tokens(state.chapters[0].render('A'))
+    summary, recent = state.context(4, budget=2 * rendered + 5)
+    assert recent == [2, 3]
+    # 剩余预算只够一行概要
+    assert summary.splitlines() == ['情境B：选择B → 结果B']
+
+
+def test_context_keeps_last_chapter_over_budget():
+    state = make_state()
+    summary, recent = state.context(4, budget=0)
+    assert recent == [3]
+    assert summary.splitlines() == ['情境C：选择C → 结果C']
+
+
+def test_context_of_first_chapter_is_empty():
+    assert make_state().context(0) == ('', [])
+
+
+def test_flat_fields_match_chapters():
+    """每个平铺字段（含 situation_*_memory）都可以作为属性读写，与 get()/set() 一致"""
+    state = make_state(chapters=3, memories=(0,))
+    for field in state.fields():
+        assert getattr(state, field) == state.get(field)
+    state.situation_b_memory = '记忆B'
+    assert state.chapters[1].memory == '记忆B'
+
+
+def test_dumps_round_trip():
+    state = make_state(chapters=3, memories=(0,))
+    payload = dumps(state.to_dict())
+    assert isinstance(payload, bytes)
+    assert StoryState.from_dict(loads(payload)) == state
+    # 旧版本写入的 str 也能读取
+    assert loads(payload.decode('utf-8')) == state.to_dict()
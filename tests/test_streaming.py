@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from llm.streaming import DeltaForwarder, JsonFieldStream
+
+TEXT = '第一行\n"引号" \\ 反斜杠\t制表 中 \U0001F600 结束'
+RAW = '```json\n' + json.dumps({'description': TEXT, 'other': 'x'}, ensure_ascii=True) + '\n```'
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7])
+def test_escapes_split_across_chunks(size):
+    stream = JsonFieldStream('description')
+    deltas = [stream.feed(RAW[i:i + size]) for i in range(0, len(RAW), size)]
+    assert ''.join(deltas) == TEXT
+    assert stream.value == TEXT
+    assert stream.done
+
+
+def test_waits_for_key_split_across_chunks():
+    stream = JsonFieldStream('description')
+    assert stream.feed('{"descr') == ''
+    assert stream.feed('iption": "你') == '你'
+    assert stream.feed('好"') == '好'
+    assert stream.done
+
+
+def test_stops_at_closing_quote():
+    stream = JsonFieldStream('description')
+    stream.feed('{"description": "完整", "description": "第二个"}')
+    assert stream.feed('更多') == ''
+    assert stream.value == '完整'
+
+
+def test_ignores_other_fields():
+    stream = JsonFieldStream('result')
+    assert stream.feed('{"description": "不输出", ') == ''
+    assert stream.feed('"result": "输出"}') == '输出'
+
+
+class Sink:
+    """记录 on_delta 调用，并按 reset 还原调用方看到的文本"""
+
+    def __init__(self):
+        self.calls = []
+        self.text = ''
+
+    def __call__(self, text, reset=False):
+        self.calls.append((text, reset))
+        self.text = text if reset else self.text + text
+
+
+def test_forwarder_sends_only_new_text():
+    sink = Sink()
+    forwarder = DeltaForwarder(sink)
+    for value in ['风里', '风里带着', '风里带着', '风里带着雨意']:
+        forwarder.forward(value)
+    assert sink.calls == [('风里', False), ('带着', False), ('雨意', False)]
+
+
+def test_forwarder_resets_when_retry_diverges():
+    """重试从头生成不同的文本时，调用方看到的是新文本而不是旧前缀拼接新后缀"""
+    sink = Sink()
+    forwarder = DeltaForwarder(sink)
+    forwarder.forward('月光洒在古老的石阶上，她停下')
+    # 重试的请求从头开始：先是旧文本的前缀，然后分叉
+    for value in ['月', '风里带着', '风里带着潮湿的雨意，远处传来钟声。']:
+        forwarder.forward(value)
+    assert sink.text == '风里带着潮湿的雨意，远处传来钟声。'
+    assert sink.calls[1] == ('月', True)
+
+
+def test_forwarder_continues_identical_retry():
+    sink = Sink()
+    forwarder = DeltaForwarder(sink)
+    forwarder.forward('相同的开头')
+    forwarder.forward('相同的')
+    forwarder.forward('相同的开头和结尾')
+    assert sink.text == '相同的开头和结尾'
+
+
+def test_forwarder_restart_clears_sent_text():
+    sink = Sink()
+    forwarder = DeltaForwarder(sink)
+    forwarder.restart()
+    assert sink.calls == []
+    forwarder.forward('月光洒在')
+    forwarder.restart()
+    # 新的生成与旧文本开头相同也从头发送
+    forwarder.forward('月光')
+    assert sink.calls[1:] == [('', True), ('月光', False)]
+    assert sink.text == '月光'
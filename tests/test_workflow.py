@@ -0,0 +1,191 @@
+import asyncio
+
+import pytest
+
+from checkpoint_store import SQLiteCheckpointStore
+from story_state import StoryState, chapter_label
+from workflow import Workflow
+
+OPTIONS = {'CHOICE_A': '选项一', 'CHOICE_B': '选项二', 'CHOICE_C': '选项三'}
+
+
+class MemoryStub:
+    """代替 MemoryLLM：记录每次调用的输入；设置了 gate 时等待它打开后才返回"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = None
+
+    async def arun(self, **inputs):
+        self.calls.append(inputs)
+        if self.gate is not None:
+            await self.gate.wait()
+        return {'memory': f"记忆：{inputs['situation_options_choice']}"}
+
+
+class EndingStub:
+    def __init__(self):
+        self.calls = []
+
+    async def arun(self, on_delta=None, **inputs):
+        self.calls.append(inputs)
+        return {'ending': '结局'}
+
+
+class StubWorkflow(Workflow):
+    """不调用模型的 Workflow：各步骤写入由章节与玩家选择决定的固定文本，记忆与结局经由桩对象生成"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memory_llm = MemoryStub()
+        self.ending_llm = EndingStub()
+
+    async def make_choice(self, index, choice, on_delta=None):
+        chapter = self.state.chapters[index]
+        chapter.choice = chapter.options[choice]
+        chapter.result = f'{chapter_label(index)} 的结果：{chapter.choice}'
+
+    async def generate_situation(self, index=0, on_delta=None):
+        # 足够长，使结局的故事进展只能完整传入最后一章，更早的章节以记忆概括
+        self.state.chapters[index].situation = f'情景 {chapter_label(index)}（{self.state.chapters[index - 1].choice}）' * 200
+
+    async def generate_situation_options(self, index=0):
+        self.state.chapters[index].options = dict(OPTIONS)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteCheckpointStore(str(tmp_path / 'checkpoints.sqlite3'))
+
+
+def opened_state():
+    state = StoryState()
+    for field in ('personality', 'theme', 'background', 'character',
+                  'dream_true', 'dream_fake', 'condition_true', 'condition_fake'):
+        state.set(field, field)
+    state.situation_a = '情景 A'
+    state.situation_a_options = dict(OPTIONS)
+    return state
+
+
+def test_rechoose_then_rehydrate(store):
+    """重新选择后，检查点中旧选择之后的数据被清空，从会话数据与检查点恢复时不会回来"""
+    async def main():
+        workflow = StubWorkflow(state=opened_state()).attach('game', store)
+        for stage in ('A', 'B', 'C'):
+            await workflow.advance(stage, 'CHOICE_A')
+        assert workflow.ending == '结局'
+
+        await workflow.advance('A', 'CHOICE_B')
+        return workflow
+
+    workflow = asyncio.run(main())
+    assert workflow.situation_a_options_choice == '选项二'
+    assert workflow.situation_b.startswith('情景 B（选项二）')
+    assert workflow.situation_b_result is None
+
+    session_data = workflow.get_all_data()
+    rehydrated = Workflow(state=StoryState.from_dict(session_data)).attach('game', store)
+    assert rehydrated.get_all_data() == session_data
+    assert rehydrated.situation_b_result is None
+    assert rehydrated.situation_c is None
+    assert rehydrated.ending is None
+    assert store.load('game')['situation_c'] is None
+
+
+def test_reset_from_without_checkpoints():
+    workflow = Workflow(state=opened_state())
+    workflow.reset_from('situation_a')
+    assert workflow.situation_a is None and workflow.situation_a_options is None
+    assert workflow.theme == 'theme'
+
+
+def test_story_fields_are_readable():
+    workflow = Workflow(state=opened_state())
+    workflow.situation_a_memory = '记忆'
+    assert workflow.situation_a_memory == workflow.state.chapters[0].memory == '记忆'
+    for field in workflow.state.fields():
+        assert getattr(workflow, field) == workflow.state.get(field)
+
+
+def test_advance_does_not_wait_for_memory(store):
+    """advance() 不等待本章的故事记忆；下一章的记忆与结局在用到它时才等待"""
+    async def main():
+        workflow = StubWorkflow(state=opened_state()).attach('memory', store)
+        memory = workflow.memory_llm
+        memory.gate = asyncio.Event()
+
+        await asyncio.wait_for(workflow.advance('A', 'CHOICE_A'), 1)
+        assert workflow.situation_b is not None
+        assert workflow.situation_a_memory is None
+
+        await asyncio.wait_for(workflow.advance('B', 'CHOICE_B'), 1)
+        # B 的记忆等待 A 的记忆，尚未调用模型
+        assert len(memory.calls) == 1
+
+        memory.gate.set()
+        await workflow.advance('C', 'CHOICE_C')
+        return workflow
+
+    workflow = asyncio.run(main())
+    memory, ending = workflow.memory_llm, workflow.ending_llm
+    assert memory.calls[1]['story_memory'] == '记忆：选项一'
+    assert workflow.situation_b_memory == '记忆：选项二'
+    assert ending.calls[0]['story_summary'] == '记忆：选项二'
+    saved = store.load('memory')
+    assert (saved['situation_a_memory'], saved['situation_b_memory']) == ('记忆：选项一', '记忆：选项二')
+
+
+def test_memory_starts_after_next_chapter():
+    """本章的记忆在下一章生成后才开始，不与玩家等待的调用争抢并发名额"""
+    class SlowOptions(StubWorkflow):
+        async def generate_situation_options(self, index=0):
+            await asyncio.sleep(0.01)
+            self.memory_started = len(self.memory_llm.calls)
+            await super().generate_situation_options(index)
+
+    async def main():
+        workflow = SlowOptions(state=opened_state())
+        await workflow.advance('A', 'CHOICE_A')
+        await workflow.wait_memory(0)
+        return workflow
+
+    workflow = asyncio.run(main())
+    assert workflow.memory_started == 0
+    assert workflow.situation_a_memory == '记忆：选项一'
+
+
+def test_rebuilt_workflow_waits_for_memory(store):
+    """同一局游戏在下一个请求中重建的 Workflow 等待上一个请求启动的记忆任务并取回其结果"""
+    async def main():
+        first = StubWorkflow(state=opened_state()).attach('rebuilt', store)
+        memory = first.memory_llm
+        memory.gate = asyncio.Event()
+        await first.advance('A', 'CHOICE_A')
+
+        second = StubWorkflow(state=StoryState.from_dict(first.get_all_data())).attach('rebuilt', store)
+        second.memory_llm = memory
+        await second.advance('B', 'CHOICE_A')
+        memory.gate.set()
+        await second.wait_memory(1)
+        return second, memory
+
+    second, memory = asyncio.run(main())
+    assert second.situation_a_memory == '记忆：选项一'
+    assert memory.calls[1]['story_memory'] == '记忆：选项一'
+    assert store.load('rebuilt')['situation_b_memory'] == second.situation_b_memory == '记忆：选项一'
+
+
+def test_rechoose_cancels_pending_memory(store):
+    async def main():
+        workflow = StubWorkflow(state=opened_state()).attach('rechoose', store)
+        workflow.memory_llm.gate = asyncio.Event()
+        await workflow.advance('A', 'CHOICE_A')
+        await workflow.advance('A', 'CHOICE_B')
+        workflow.memory_llm.gate.set()
+        await workflow.wait_memory(0)
+        return workflow
+
+    workflow = asyncio.run(main())
+    assert workflow.situation_a_memory == '记忆：选项二'
+    assert store.load('rechoose')['situation_a_memory'] == '记忆：选项二'
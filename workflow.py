@@ -1,86 +1,166 @@
-from llm.role.Charac import CharacLLM
-from llm.story.Background import BackgroundLLM
-from llm.story.Dream import DreamLLM
-from llm.story.Condition import ConditionLLM
-from llm.story.Theme import ThemeLLM
-from llm.role.Personality import PersonalityLLM
-from llm.scene.SituationA import SituationALLM
-from llm.scene.SituationAOpt import SituationAOptLLM
-from llm.scene.SituationAResult import SituationAResultLLM
-from llm.scene.SituationB import SituationBLLM
-from llm.scene.SituationBOpt import SituationBOptLLM
-from llm.scene.SituationBResult import SituationBResultLLM
-from llm.scene.SituationC import SituationCLLM
-from llm.scene.SituationCOpt import SituationCOptLLM
-from llm.scene.SituationCResult import SituationCResultLLM
-from llm.story.Ending import EndingLLM
+import llm
+from checkpoint_store import get_checkpoint_store
+from llm.limiter import BACKGROUND, llm_priority
 from prompt_config import SYSTEM_PROMPT
+from scheduler import Stage, StageScheduler
+from story_state import (
+    CHAPTERS, DATA_FIELDS, OPENING_FIELDS, StoryState, chapter_fields, chapter_index, chapter_label,
+)
 import asyncio
+import os
 import random
 
 
+# --- Configuration Constants ---
+# 每章结果生成后在后台更新故事记忆（滚动摘要），之后的情景与结局以它代替更早章节的完整内容
+STORY_MEMORY = os.getenv("STORY_MEMORY", "true").lower() in ("1", "true", "yes")
+# 开局用一次 DreamBundleLLM 调用生成两个愿望与两个条件，代替四次调用
+DREAM_BUNDLE = os.getenv("DREAM_BUNDLE", "false").lower() in ("1", "true", "yes")
+# 每章的情景描述与选项由一次流式调用生成（描述先输出，选项在后），代替两次调用
+FUSED_SCENE = os.getenv("FUSED_SCENE", "false").lower() in ("1", "true", "yes")
+
+# 正在后台生成的故事记忆：game_id → {章节序号: 任务}。网页服务可能在每个请求中为同一局游戏重建 Workflow，
+# 新的 Workflow 由此找到上一个请求启动、尚未完成的记忆任务
+_memory_tasks = {}
+
+# 愿望与条件：分四次调用生成，或由 DreamBundleLLM 一次生成
+DREAM_STAGES = [
+    Stage('dream_true', 'generate_dream_true',
+          requires=('theme', 'background', 'character'),
+          provides=('dream_true',), label='真实梦境'),
+    Stage('dream_fake', 'generate_dream_fake',
+          requires=('theme', 'background', 'character', 'dream_true'),
+          provides=('dream_fake',), label='表面梦境'),
+    Stage('condition_true', 'generate_condition_true',
+          requires=('theme', 'background', 'character', 'dream_true'),
+          provides=('condition_true',), label='真实条件'),
+    Stage('condition_fake', 'generate_condition_fake',
+          requires=('theme', 'background', 'character', 'dream_fake'),
+          provides=('condition_fake',), label='表面条件'),
+]
+DREAM_BUNDLE_STAGES = [
+    Stage('dream_bundle', 'generate_dream_bundle',
+          requires=('theme', 'background', 'character'),
+          provides=('dream_true', 'dream_fake', 'condition_true', 'condition_fake'), label='愿望与条件'),
+]
+
+# 第一个情景与选项：分两次调用生成，或由一次 SCENE 调用生成
+SITUATION_STAGES = [
+    Stage('situation_a', 'generate_situation',
+          requires=OPENING_FIELDS,
+          provides=('situation_a',), label='第一个情景'),
+    Stage('situation_a_options', 'generate_situation_options',
+          requires=('situation_a',),
+          provides=('situation_a_options',), label='选项'),
+]
+SCENE_STAGES = [
+    Stage('situation_a_scene', 'generate_scene',
+          requires=OPENING_FIELDS,
+          provides=('situation_a', 'situation_a_options'), label='第一个情景与选项'),
+]
+
+# 开局阶段依赖图：每个阶段在其输入全部就绪后立即启动
+OPENING_STAGES = [
+    Stage('personality', 'generate_personality', provides=('personality',), label='灵魂'),
+    Stage('theme', 'generate_theme', provides=('theme',), label='主题'),
+    Stage('background', 'generate_background',
+          requires=('theme',),
+          provides=('background',), label='背景故事'),
+    Stage('character', 'generate_character',
+          requires=('theme', 'background', 'personality'),
+          provides=('character',), label='角色'),
+    *(DREAM_BUNDLE_STAGES if DREAM_BUNDLE else DREAM_STAGES),
+    *(SCENE_STAGES if FUSED_SCENE else SITUATION_STAGES),
+]
+
+
+class SharedLLM:
+    """Workflow 上的 LLM 属性：首次访问时才构造，相同配置的实例由所有 Workflow 共享"""
+
+    def __init__(self, class_name: str, **kwargs):
+        self.class_name = class_name
+        self.kwargs = kwargs
+
+    def __get__(self, workflow, owner=None):
+        if workflow is None:
+            return self
+        return llm.shared_llm(self.class_name, system_prompt=SYSTEM_PROMPT, **self.kwargs)
+
+
+class StoryField:
+    """Workflow 上的故事字段（如 workflow.theme），读写 workflow.state 中的同名字段"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, workflow, owner=None):
+        if workflow is None:
+            return self
+        return getattr(workflow.state, self.name)
+
+    def __set__(self, workflow, value):
+        setattr(workflow.state, self.name, value)
+
+
 class Workflow:
-    def __init__(self, verbose: bool = False):
+    __slots__ = ('verbose', 'game_id', 'checkpoints', 'state', '_memory_tasks')
+
+    # 各阶段的 LLM 封装，Workflow 实例本身只保存故事数据
+    charac_llm = SharedLLM('CharacLLM')
+    background_llm = SharedLLM('BackgroundLLM')
+    dream_llm_true = SharedLLM('DreamLLM', type='TRUE')
+    dream_llm_fake = SharedLLM('DreamLLM', type='FAKE')
+    dream_bundle_llm = SharedLLM('DreamBundleLLM')
+    condition_llm_true = SharedLLM('ConditionLLM', type='TRUE')
+    condition_llm_fake = SharedLLM('ConditionLLM', type='FAKE')
+    theme_llm = SharedLLM('ThemeLLM')
+    personality_llm = SharedLLM('PersonalityLLM')
+    ending_llm = SharedLLM('EndingLLM', type='NORMAL')
+    memory_llm = SharedLLM('MemoryLLM')
+
+    def __init__(self, verbose: bool = False, state: StoryState = None, chapters: int = len(CHAPTERS)):
         # Configuration
         self.verbose = verbose
-        
-        # 初始化所有LLM实例
-        self.charac_llm = CharacLLM(system_prompt=SYSTEM_PROMPT)
-        self.background_llm = BackgroundLLM(system_prompt=SYSTEM_PROMPT)
-        self.dream_llm = DreamLLM(system_prompt=SYSTEM_PROMPT)
-        self.condition_llm_true = ConditionLLM(system_prompt=SYSTEM_PROMPT, type='TRUE')
-        self.condition_llm_fake = ConditionLLM(system_prompt=SYSTEM_PROMPT, type='FAKE')
-        self.theme_llm = ThemeLLM(system_prompt=SYSTEM_PROMPT)
-        self.personality_llm = PersonalityLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_a_llm = SituationALLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_a_opt_llm = SituationAOptLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_a_result_llm = SituationAResultLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_b_llm = SituationBLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_b_opt_llm = SituationBOptLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_b_result_llm = SituationBResultLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_c_llm = SituationCLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_c_opt_llm = SituationCOptLLM(system_prompt=SYSTEM_PROMPT)
-        self.situation_c_result_llm = SituationCResultLLM(system_prompt=SYSTEM_PROMPT)
-        self.ending_llm = EndingLLM(system_prompt=SYSTEM_PROMPT, type="NORMAL")
-        # 存储各种生成的数据
-        self.personality = None
-        self.theme = None
-        self.background = None
-        self.character = None
-        self.dream_true = None
-        self.dream_fake = None
-        self.condition_true = None
-        self.condition_fake = None
-        self.situation_a = None
-        self.situation_a_options = None
-        self.situation_a_options_choice = None
-        self.situation_a_result = None
-        self.situation_b = None
-        self.situation_b_options = None
-        self.situation_b_options_choice = None
-        self.situation_b_result = None
-        self.situation_c = None
-        self.situation_c_options = None
-        self.situation_c_options_choice = None
-        self.situation_c_result = None
-        self.ending = None
+        # 绑定的游戏与检查点存储，见 attach()
+        self.game_id = None
+        self.checkpoints = None
+        # 故事数据，workflow.theme 等字段都读写这里
+        self.state = state if state is not None else StoryState(chapters)
+        # 未绑定游戏时（如推测分支）在后台生成的故事记忆，见 remember()
+        self._memory_tasks = {}
 
-    async def generate_personality_and_theme(self):
-        """并行生成灵魂和主题"""
-        print("生成灵魂和主题...")
-        tasks = [
-            self.personality_llm.arun(),
-            self.theme_llm.arun(),
-        ]
-        personality_result, theme_result = await asyncio.gather(*tasks)
-        
+    @staticmethod
+    def _field_delta(on_delta, field: str):
+        """将 on_delta(field, text, reset=False) 绑定到具体字段，供 LLM 流式回调使用"""
+        if on_delta is None:
+            return None
+        return lambda text, reset=False: on_delta(field, text, reset=reset)
+
+    async def generate_personality(self):
+        """生成灵魂"""
+        print("生成灵魂...")
+        personality_result = await self.personality_llm.arun()
         self.personality = personality_result['personality']
-        self.theme = theme_result['theme']
         
         if self.verbose:
             print(f"灵魂: {personality_result}")
+
+    async def generate_theme(self):
+        """生成主题"""
+        print("生成主题...")
+        theme_result = await self.theme_llm.arun()
+        self.theme = theme_result['theme']
+        
+        if self.verbose:
             print(f"主题: {theme_result}")
 
+    async def generate_personality_and_theme(self):
+        """并行生成灵魂和主题"""
+        await asyncio.gather(
+            self.generate_personality(),
+            self.generate_theme(),
+        )
+
     async def generate_background(self):
         """生成背景故事"""
         print("生成背景故事...")
@@ -103,11 +183,10 @@ class Workflow:
         if self.verbose:
             print(f"角色: {character_result}")
 
-    async def generate_dreams(self):
-        """生成真实和表面梦境"""
+    async def generate_dream_true(self):
+        """生成真实梦境"""
         print("生成真实梦境...")
-        dream_true_result = await self.dream_llm.arun(
-            type='TRUE', 
+        dream_true_result = await self.dream_llm_true.arun(
             theme=self.theme, 
             background=self.background, 
             character=self.character
@@ -117,9 +196,10 @@ class Workflow:
         if self.verbose:
             print(f"真实梦境: {dream_true_result}")
 
+    async def generate_dream_fake(self):
+        """生成表面梦境"""
         print("生成表面梦境...")
-        dream_fake_result = await self.dream_llm.arun(
-            type='FAKE', 
+        dream_fake_result = await self.dream_llm_fake.arun(
             theme=self.theme, 
             background=self.background, 
             character=self.character, 
@@ -130,313 +210,431 @@ class Workflow:
         if self.verbose:
             print(f"表面梦境: {dream_fake_result}")
 
-    async def generate_conditions(self):
-        """并行生成真实和表面条件"""
-        print("生成条件...")
-        tasks = [
-            self.condition_llm_true.arun(
-                theme=self.theme, 
-                background=self.background, 
-                character=self.character, 
-                dream=self.dream_true
-            ),
-            self.condition_llm_fake.arun(
-                theme=self.theme, 
-                background=self.background, 
-                character=self.character, 
-                dream=self.dream_fake
-            ),
-        ]
-        condition_true_result, condition_fake_result = await asyncio.gather(*tasks)
-        
+    async def generate_dreams(self):
+        """生成真实和表面梦境"""
+        await self.generate_dream_true()
+        await self.generate_dream_fake()
+
+    async def generate_condition_true(self):
+        """生成真实条件"""
+        print("生成真实条件...")
+        condition_true_result = await self.condition_llm_true.arun(
+            theme=self.theme, 
+            background=self.background, 
+            character=self.character, 
+            dream=self.dream_true
+        )
         self.condition_true = condition_true_result['condition']
-        self.condition_fake = condition_fake_result['condition']
         
         if self.verbose:
             print(f"真实条件: {condition_true_result}")
-            print(f"表面条件: {condition_fake_result}")
 
-    async def generate_situation(self):
-        """生成情景 A 描述"""
-        print("生成情景 A...")
-        situation_result = await self.situation_a_llm.arun(
-            theme=self.theme,
-            personality=self.personality,
-            background=self.background,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
+    async def generate_condition_fake(self):
+        """生成表面条件"""
+        print("生成表面条件...")
+        condition_fake_result = await self.condition_llm_fake.arun(
+            theme=self.theme, 
+            background=self.background, 
+            character=self.character, 
+            dream=self.dream_fake
         )
-        self.situation_a = situation_result['description']
+        self.condition_fake = condition_fake_result['condition']
         
         if self.verbose:
-            print(f"情景 A: {situation_result}")
+            print(f"表面条件: {condition_fake_result}")
 
-    async def generate_situation_options(self):
-        """生成情景 A 选项"""
-        print("生成情景 A 选项...")
-        situation_options_result = await self.situation_a_opt_llm.arun(
-            personality=self.personality,
+    async def generate_dream_bundle(self):
+        """一次调用生成真实和表面梦境，以及两者的条件"""
+        print("生成梦境与条件...")
+        bundle_result = await self.dream_bundle_llm.arun(
             theme=self.theme,
             background=self.background,
             character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            current_situation_description=self.situation_a,
         )
-        self.situation_a_options = situation_options_result
-        
-        if self.verbose:
-            print(f"情景 A 选项: {situation_options_result}")
+        self.dream_true = bundle_result['dream_true']
+        self.dream_fake = bundle_result['dream_fake']
+        self.condition_true = bundle_result['condition_true']
+        self.condition_fake = bundle_result['condition_fake']
 
-
-    async def make_choice_for_situation(self, choice: str):
-        """情景 A 玩家做出选择"""
-        assert choice in ['CHOICE_A', 'CHOICE_B', 'CHOICE_C']
-        print(f"情景 A 玩家选择...")
-        self.situation_a_options_choice = self.situation_a_options[choice]
         if self.verbose:
-            print(f"选择: {self.situation_a_options_choice}")
-        
-        print("生成情景 A 结果...")
-        situation_result_result = await self.situation_a_result_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            current_situation_description=self.situation_a,
-            current_situation_options_choice=self.situation_a_options_choice,
+            print(f"梦境与条件: {bundle_result}")
+
+    async def generate_conditions(self):
+        """并行生成真实和表面条件"""
+        await asyncio.gather(
+            self.generate_condition_true(),
+            self.generate_condition_fake(),
         )
-        
-        self.situation_a_result = situation_result_result['result']
-        if self.verbose:
-            print(f"情景 A 结果: {self.situation_a_result}")
 
+    def game_information(self) -> dict:
+        """所有情景与结局共用的游戏信息"""
+        return {field: getattr(self.state, field) for field in OPENING_FIELDS}
 
-    async def generate_situation_b(self):
-        """生成情景 B 描述"""
-        print("生成情景 B...")
-        situation_b_result = await self.situation_b_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_a,
-            prev_situation_options_choice=self.situation_a_options_choice,
-            prev_situation_result=self.situation_a_result,
-        )
-        self.situation_b = situation_b_result['description']
-        if self.verbose:
-            print(f"情景 B: {situation_b_result}")
+    def chapter_llm(self, part: str, index: int):
+        """第 index 章某一步骤（SITUATION / OPTIONS / RESULT）的 LLM 封装，同一配置在进程内共享"""
+        return llm.shared_llm('ChapterLLM', system_prompt=SYSTEM_PROMPT,
+                              part=part, index=index, chapters=len(self.state.chapters))
 
+    def chapter_context(self, index: int) -> dict:
+        """第 index 章的故事进展：上一章的完整内容与更早章节的概要，总长度在 STORY_CONTEXT_TOKENS 以内
 
-    async def generate_situation_b_options(self):
-        """生成情景 B 选项"""
-        print("生成情景 B 选项...")
-        situation_b_options_result = await self.situation_b_opt_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_a,
-            prev_situation_options_choice=self.situation_a_options_choice,
-            prev_situation_result=self.situation_a_result,
-            current_situation_description=self.situation_b,
-        )
-        self.situation_b_options = situation_b_options_result
-        if self.verbose:
-            print(f"情景 B 选项: {situation_b_options_result}")
+        不等待仍在后台生成的故事记忆，尚无记忆的章节以“选择 → 结果”概要代替。
+        """
+        if index == 0:
+            return {}
+        story_summary, _ = self.state.context(index, full=1)
+        prev = self.state.chapters[index - 1]
+        return {
+            'story_summary': story_summary,
+            'prev_situation_description': prev.situation,
+            'prev_situation_options_choice': prev.choice,
+            'prev_situation_result': prev.result,
+        }
 
-    
-    async def make_choice_for_situation_b(self, choice: str):
-        """情景 B 玩家做出选择"""
-        assert choice in ['CHOICE_A', 'CHOICE_B', 'CHOICE_C']
-        
-        print(f"情景 B 玩家选择...")
-        self.situation_b_options_choice = self.situation_b_options[choice]
-        if self.verbose:
-            print(f"选择: {self.situation_b_options_choice}")
-            
-        print("生成情景 B 结果...")
-        situation_b_result_result = await self.situation_b_result_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_a,
-            prev_situation_options_choice=self.situation_a_options_choice,
-            prev_situation_result=self.situation_a_result,
-            current_situation_description=self.situation_b,
-            current_situation_options_choice=self.situation_b_options_choice,
+    async def generate_situation(self, index: int = 0, on_delta=None):
+        """生成第 index 章（默认情景 A）的情景描述"""
+        label = chapter_label(index)
+        print(f"生成情景 {label}...")
+        situation_result = await self.chapter_llm('SITUATION', index).arun(
+            **self.game_information(),
+            **self.chapter_context(index),
+            on_delta=self._field_delta(on_delta, chapter_fields(index)[0]),
         )
-        self.situation_b_result = situation_b_result_result['result']
-        if self.verbose:
-            print(f"情景 B 结果: {self.situation_b_result}")
+        self.state.chapters[index].situation = situation_result['description']
 
+        if self.verbose:
+            print(f"情景 {label}: {situation_result}")
 
-    async def generate_situation_c(self):
-        """生成情景 C 描述"""
-        print("生成情景 C...")
-        situation_c_result = await self.situation_c_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_b,
-            prev_situation_options_choice=self.situation_b_options_choice,
-            prev_situation_result=self.situation_b_result,
+    async def generate_situation_options(self, index: int = 0):
+        """生成第 index 章（默认情景 A）的选项"""
+        label = chapter_label(index)
+        chapter = self.state.chapters[index]
+        print(f"生成情景 {label} 选项...")
+        situation_options_result = await self.chapter_llm('OPTIONS', index).arun(
+            **self.game_information(),
+            **self.chapter_context(index),
+            current_situation_description=chapter.situation,
         )
-        self.situation_c = situation_c_result['description']
+        chapter.options = situation_options_result
+
         if self.verbose:
-            print(f"情景 C: {situation_c_result}")
-    
-    async def generate_situation_c_options(self):
-        """生成情景 C 选项"""
-        print("生成情景 C 选项...")
-        situation_c_options_result = await self.situation_c_opt_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_b,
-            prev_situation_options_choice=self.situation_b_options_choice,
-            prev_situation_result=self.situation_b_result,
-            current_situation_description=self.situation_c,
+            print(f"情景 {label} 选项: {situation_options_result}")
+
+    async def generate_scene(self, index: int = 0, on_delta=None):
+        """一次调用生成第 index 章（默认情景 A）的情景描述与选项；描述先流式输出，选项在其后"""
+        label = chapter_label(index)
+        chapter = self.state.chapters[index]
+        print(f"生成情景 {label} 与选项...")
+        scene_result = await self.chapter_llm('SCENE', index).arun(
+            **self.game_information(),
+            **self.chapter_context(index),
+            on_delta=self._field_delta(on_delta, chapter_fields(index)[0]),
         )
-        self.situation_c_options = situation_c_options_result
+        chapter.situation = scene_result['description']
+        chapter.options = {choice: scene_result[choice] for choice in ('CHOICE_A', 'CHOICE_B', 'CHOICE_C')}
+
         if self.verbose:
-            print(f"情景 C 选项: {situation_c_options_result}")
-    
-    
-    async def make_choice_for_situation_c(self, choice: str):
-        """情景 C 玩家做出选择"""
+            print(f"情景 {label} 与选项: {scene_result}")
+
+    async def make_choice(self, index: int, choice: str, on_delta=None):
+        """玩家在第 index 章做出选择，生成选择的结果"""
         assert choice in ['CHOICE_A', 'CHOICE_B', 'CHOICE_C']
-        
-        print(f"情景 C 玩家选择...")
-        self.situation_c_options_choice = self.situation_c_options[choice]
+        label = chapter_label(index)
+        chapter = self.state.chapters[index]
+        print(f"情景 {label} 玩家选择...")
+        chapter.choice = chapter.options[choice]
         if self.verbose:
-            print(f"选择: {self.situation_c_options_choice}")
-            
-        print("生成情景 C 结果...")
-        situation_c_result_result = await self.situation_c_result_llm.arun(
-            theme=self.theme,
-            background=self.background,
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            prev_situation_description=self.situation_b,
-            prev_situation_options_choice=self.situation_b_options_choice,
-            prev_situation_result=self.situation_b_result,
-            current_situation_description=self.situation_c,
-            current_situation_options_choice=self.situation_c_options_choice,
+            print(f"选择: {chapter.choice}")
+
+        print(f"生成情景 {label} 结果...")
+        situation_result_result = await self.chapter_llm('RESULT', index).arun(
+            **self.game_information(),
+            **self.chapter_context(index),
+            current_situation_description=chapter.situation,
+            current_situation_options_choice=chapter.choice,
+            on_delta=self._field_delta(on_delta, chapter_fields(index)[3]),
         )
-        self.situation_c_result = situation_c_result_result['result']
+        chapter.result = situation_result_result['result']
+        if self.verbose:
+            print(f"情景 {label} 结果: {chapter.result}")
+
+    async def summarize_chapter(self, index: int):
+        """把第 index 章并入故事记忆（后台优先级），返回新的记忆
+
+        先等待上一章仍在生成的记忆。失败时返回 None 且不记录，之后的提示词退回逐章的“选择 → 结果”概要。
+        """
+        label = chapter_label(index)
+        if index:
+            await self.wait_memory(index - 1)
+        chapter = self.state.chapters[index]
+        choice, result = chapter.choice, chapter.result
+        print(f"更新故事记忆 {label}...")
+        try:
+            with llm_priority(BACKGROUND):
+                memory_result = await self.memory_llm.arun(
+                    **self.game_information(),
+                    story_memory=self.state.summary(index),
+                    situation_description=chapter.situation,
+                    situation_options_choice=choice,
+                    situation_result=result,
+                )
+        except Exception as e:
+            print(f"更新故事记忆 {label} 失败: {e}")
+            return None
+        memory = memory_result['memory']
+        self._store_memory(index, choice, result, memory)
         if self.verbose:
-            print(f"情景 C 结果: {self.situation_c_result}")
+            print(f"故事记忆 {label}: {memory}")
+        return memory
+
+    def _store_memory(self, index: int, choice: str, result: str, memory: str):
+        """把依据 (choice, result) 生成的记忆写入当前的故事数据与检查点；该章已被重新选择时丢弃"""
+        chapter = self.state.chapters[index]
+        if (chapter.choice, chapter.result) != (choice, result):
+            return
+        chapter.memory = memory
+        self.checkpoint(chapter_fields(index)[4])
+
+    def _pending_memories(self, create: bool = False) -> dict:
+        """本局在后台生成的故事记忆任务（章节序号 → 任务）；绑定游戏时由同一局的所有 Workflow 共享"""
+        if self.game_id is None:
+            return self._memory_tasks
+        if create:
+            return _memory_tasks.setdefault(self.game_id, {})
+        return _memory_tasks.get(self.game_id, {})
+
+    def remember(self, index: int, source=None):
+        """在后台把第 index 章并入故事记忆，不等待其完成；用到它的 summarize_chapter() 与 generate_ending() 会等待
+
+        source 为另一个 Workflow（推测分支或被采纳的分支）上生成同一记忆的任务，此时只等待它的结果，不再调用模型。
+        """
+        tasks = self._pending_memories(create=True)
+        if index in tasks and not tasks[index].done():
+            return
+        task = asyncio.ensure_future(self._remember(index, source))
+        tasks[index] = task
+        game_id = self.game_id
 
-    async def generate_ending(self):
-        """生成结局"""
+        def forget(_):
+            if tasks.get(index) is task:
+                del tasks[index]
+            if not tasks and game_id is not None and _memory_tasks.get(game_id) is tasks:
+                del _memory_tasks[game_id]
+
+        task.add_done_callback(forget)
+
+    async def _remember(self, index: int, source=None):
+        """remember() 的后台任务，返回 (选择, 结果, 记忆)；记忆已写入完成时的故事数据"""
+        if source is None:
+            chapter = self.state.chapters[index]
+            choice, result = chapter.choice, chapter.result
+            return choice, result, await self.summarize_chapter(index)
+
+        await asyncio.wait({source})
+        outcome = None if source.cancelled() else source.result()
+        if outcome is not None and outcome[2] is not None:
+            self._store_memory(index, *outcome)
+        return outcome
+
+    async def wait_memory(self, index: int):
+        """等待第 index 章仍在后台生成的故事记忆
+
+        记忆可能由同一局游戏上一个请求的 Workflow 生成，写入的是那个 Workflow 的故事数据：
+        此时从任务结果取回，任务已结束时从检查点取回。
+        """
+        chapter = self.state.chapters[index]
+        task = self._pending_memories().get(index)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            await asyncio.wait({task})
+            outcome = None if task.cancelled() else task.result()
+            if chapter.memory is None and outcome is not None and outcome[2] is not None:
+                self._store_memory(index, *outcome)
+        if chapter.memory is None and self.checkpoints is not None and self.game_id is not None:
+            chapter.memory = self.checkpoints.load(self.game_id).get(chapter_fields(index)[4])
+
+    def cancel_memory(self, index: int = 0):
+        """取消第 index 章及之后仍在后台生成的故事记忆"""
+        tasks = self._pending_memories()
+        for task_index, task in list(tasks.items()):
+            if task_index >= index:
+                task.cancel()
+                del tasks[task_index]
+
+    async def generate_ending(self, on_delta=None):
+        """生成结局
+
+        在 STORY_CONTEXT_TOKENS 预算内完整传入最近的章节（至少最后一章），更早的章节以故事记忆概括。
+        """
         print("生成结局...")
+        chapters = len(self.state.chapters)
+        if STORY_MEMORY:
+            for index in range(chapters - 1):
+                await self.wait_memory(index)
+        story_summary, recent = self.state.context(chapters)
+        situations = '\n'.join(self.state.chapters[index].render(chapter_label(index)) for index in recent)
+
         ending_result = await self.ending_llm.arun(
-            personality=self.personality,
-            character=self.character,
-            dream_true=self.dream_true,
-            dream_fake=self.dream_fake,
-            condition_true=self.condition_true,
-            condition_fake=self.condition_fake,
-            situation_a_description=self.situation_a,
-            situation_a_options_choice=self.situation_a_options_choice,
-            situation_a_result=self.situation_a_result,
-            situation_b_description=self.situation_b,
-            situation_b_options_choice=self.situation_b_options_choice,
-            situation_b_result=self.situation_b_result,
-            situation_c_description=self.situation_c,
-            situation_c_options_choice=self.situation_c_options_choice,
-            situation_c_result=self.situation_c_result,
+            **self.game_information(),
+            story_summary=story_summary,
+            situations=situations,
+            on_delta=self._field_delta(on_delta, 'ending'),
         )
         self.ending = ending_result['ending']
         if self.verbose:
             print(f"结局: {ending_result}")
 
+    async def generate_opening(self, on_stage_start=None, on_stage_complete=None):
+        """按依赖图生成开局内容（灵魂、主题……情景 A 选项），互不依赖的阶段并发执行
+
+        已有数据的阶段会被跳过，每个阶段完成时写入检查点。verbose 时先打印依赖图的关键路径，
+        即必须串行执行的阶段链，它决定了开局的最短耗时。
+        """
+        def stage_complete(stage, completed, total):
+            self.checkpoint(*stage.provides)
+            if on_stage_complete:
+                on_stage_complete(stage, completed, total)
+
+        scheduler = StageScheduler(OPENING_STAGES)
+        if self.verbose:
+            print(f"开局关键路径: {' → '.join(stage.label for stage in scheduler.critical_path())}")
+        await scheduler.run(self, on_stage_start=on_stage_start, on_stage_complete=stage_complete)
+
+    async def advance(self, stage: str, choice: str, on_delta=None):
+        """玩家在情景 stage（'A'、'B'……）做出选择后，生成直到下一次需要玩家选择（或结局）的全部内容
+
+        on_delta(field, text, reset=False) 可选，用于接收结果、情景和结局文本的流式增量；
+        reset 为 True 时（重试或回退生成了不同的文本）调用方应丢弃该字段已收到的文本，改为显示 text。
+        与已记录的选择相同时（如从检查点恢复后重试）跳过已完成的步骤；
+        选择不同时丢弃该选择之后的全部数据重新生成。每个步骤完成时写入检查点。
+        本章的故事记忆在下一章生成后由 remember() 在后台生成，advance() 不等待它，玩家阅读时它继续执行。
+        """
+        if stage not in self.state.labels():
+            raise ValueError(f"Invalid stage: {stage}")
+        index = chapter_index(stage)
+        chapter = self.state.chapters[index]
+        _, _, choice_field, result_field, _ = chapter_fields(index)
+        if chapter.choice != chapter.options[choice]:
+            self.reset_from(choice_field)
+
+        if chapter.result is None:
+            await self.make_choice(index, choice, on_delta=on_delta)
+            self.checkpoint(choice_field, result_field)
+        if index + 1 == len(self.state.chapters):
+            # 最后一章不需要记忆：结局总是完整传入最后一章
+            if self.ending is None:
+                await self.generate_ending(on_delta=on_delta)
+                self.checkpoint('ending')
+            return
+
+        following = self.state.chapters[index + 1]
+        situation_field, options_field = chapter_fields(index + 1)[:2]
+        if FUSED_SCENE and following.situation is None and following.options is None:
+            await self.generate_scene(index + 1, on_delta=on_delta)
+            self.checkpoint(situation_field, options_field)
+        if following.situation is None:
+            await self.generate_situation(index + 1, on_delta=on_delta)
+            self.checkpoint(situation_field)
+        if following.options is None:
+            await self.generate_situation_options(index + 1)
+            self.checkpoint(options_field)
+        # 下一章的提示词只用到更早章节的记忆，本章的记忆在它生成后才开始，不与玩家等待的调用争抢并发名额
+        if STORY_MEMORY and chapter.memory is None:
+            self.remember(index)
+
+    def reset_from(self, field: str):
+        """清空 field 及故事中在它之后生成的全部字段
+
+        检查点中的这些字段同样写为空，否则 attach() 会把旧的选择之后的数据恢复回来；
+        被清空的章节仍在后台生成的故事记忆一并取消。
+        """
+        fields = self.state.fields()
+        cleared = fields[fields.index(field):]
+        for index in range(len(self.state.chapters)):
+            if chapter_fields(index)[4] in cleared:
+                self.cancel_memory(index)
+                break
+        self.state.reset_from(field)
+        self.checkpoint(*cleared)
+
+    def fork(self):
+        """复制当前故事数据得到一个分支；分支不写检查点，仍在生成的故事记忆完成后也写入分支"""
+        branch = Workflow(verbose=self.verbose, state=self.state.copy())
+        for index, task in self._running_memories().items():
+            branch.remember(index, source=task)
+        return branch
+
+    def adopt(self, branch):
+        """采纳分支上生成的故事数据"""
+        self.state = branch.state.copy()
+        self.checkpoint(*self.state.fields())
+        for index, task in branch._running_memories().items():
+            self.remember(index, source=task)
+
+    def _running_memories(self) -> dict:
+        """当前事件循环中仍在生成的故事记忆任务"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return {}
+        return {index: task for index, task in self._pending_memories().items()
+                if not task.done() and task.get_loop() is loop}
+
+    def attach(self, game_id: str, checkpoints=None):
+        """绑定到一局游戏：检查点中有而当前为空的字段被恢复，当前与检查点不同的字段写入检查点
+
+        checkpoints 默认为 CHECKPOINT_STORE 配置的存储，为 None（CHECKPOINT_STORE=none）时只记录 game_id。
+        """
+        self.game_id = game_id
+        self.checkpoints = checkpoints if checkpoints is not None else get_checkpoint_store()
+        if self.checkpoints is None:
+            return self
+
+        saved = self.checkpoints.load(game_id)
+        changed = {}
+        for field in self.state.fields():
+            value = self.state.get(field)
+            if value is None:
+                self.state.set(field, saved.get(field))
+            elif saved.get(field) != value:
+                changed[field] = value
+        self.checkpoints.save(game_id, changed)
+        return self
+
+    def checkpoint(self, *fields):
+        """把指定字段写入检查点（未绑定游戏时忽略）"""
+        if self.checkpoints is None or self.game_id is None:
+            return
+        self.checkpoints.save(self.game_id, {field: self.state.get(field) for field in fields})
+
+    @classmethod
+    async def resume(cls, game_id: str, checkpoints=None, verbose: bool = False, chapters: int = len(CHAPTERS),
+                     on_stage_start=None, on_stage_complete=None):
+        """由检查点恢复一局游戏，并只补齐开局中尚未完成的阶段"""
+        workflow = cls(verbose=verbose, chapters=chapters).attach(game_id, checkpoints)
+        await workflow.generate_opening(on_stage_start=on_stage_start, on_stage_complete=on_stage_complete)
+        return workflow
+
+    @classmethod
+    def from_data(cls, data: dict, verbose: bool = False):
+        """由 get_all_data() 的结果重建 Workflow"""
+        return cls(verbose=verbose, state=StoryState.from_dict(data))
+
     async def play(self):
         """执行完整的生成流程"""
-        await self.generate_personality_and_theme()
-        await self.generate_background()
-        await self.generate_character()
-        await self.generate_dreams()
-        await self.generate_conditions()
-        
-        await self.generate_situation()
-        await self.generate_situation_options()
-        await self.make_choice_for_situation(f'CHOICE_{random.choice(["A", "B", "C"])}')
-        
-        await self.generate_situation_b()
-        await self.generate_situation_b_options()
-        await self.make_choice_for_situation_b(f'CHOICE_{random.choice(["A", "B", "C"])}')
-        
-        await self.generate_situation_c()
-        await self.generate_situation_c_options()
-        await self.make_choice_for_situation_c(f'CHOICE_{random.choice(["A", "B", "C"])}')
-        
-        await self.generate_ending()
+        await self.generate_opening()
+        for stage in self.state.labels():
+            await self.advance(stage, f'CHOICE_{random.choice(["A", "B", "C"])}')
 
 
     def get_all_data(self):
         """获取所有生成的数据"""
-        return {
-            'personality': self.personality,
-            'theme': self.theme,
-            'background': self.background,
-            'character': self.character,
-            'dream_true': self.dream_true,
-            'dream_fake': self.dream_fake,
-            'condition_true': self.condition_true,
-            'condition_fake': self.condition_fake,
-            'situation_a': self.situation_a,
-            'situation_a_options': self.situation_a_options,
-            'situation_a_options_choice': self.situation_a_options_choice,
-            'situation_a_result': self.situation_a_result,
-            'situation_b': self.situation_b,
-            'situation_b_options': self.situation_b_options,
-            'situation_b_options_choice': self.situation_b_options_choice,
-            'situation_b_result': self.situation_b_result,
-            'situation_c': self.situation_c,
-            'situation_c_options': self.situation_c_options,
-            'situation_c_options_choice': self.situation_c_options_choice,
-            'situation_c_result': self.situation_c_result,
-            'ending': self.ending,
-        }
+        return self.state.to_dict()
+
+
+# 故事字段都委托给 StoryState，Workflow 本身不保存故事数据
+for _field in DATA_FIELDS:
+    setattr(Workflow, _field, StoryField(_field))
+del _field
 
 
 async def main():